@@ -0,0 +1,160 @@
+# Live avg_rating and ratings_count of Work and BookEdition, recomputed
+# from the Rating table (bulk_load takes them from the books CSV, and
+# nothing else changes them). One pass over Rating gives every edition's
+# count and sum; a work's are the totals over its editions. Rows whose
+# values did not change are not written.
+
+import itertools
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+
+from bookrating import response_cache, stamps
+from bookrating.models import (AggregateWatermark, BookEdition, Rating,
+                               RatingChange, Work)
+
+FIELDS = ["avg_rating", "ratings_count"]
+
+# rating rows fetched per database round trip
+CHUNK_ROWS = 100_000
+
+# rows per bulk_update statement
+BATCH_SIZE = 2_000
+
+# works recomputed per query by recompute_changed (keeps the id lists
+# below the database's parameter limit)
+CHUNK_SIZE = 5_000
+
+CENT = Decimal("0.01")
+
+
+def average(total, count):
+    """Mean rating rounded like the DecimalField stores it; 0 when unrated."""
+    if not count:
+        return Decimal("0.00")
+    return (Decimal(total) / count).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _totals(ratings, editions):
+    """
+    ({edition_id: (count, sum)}, {work_id: (count, sum)}) for `ratings`,
+    whose editions are all in the `editions` queryset. The rows are read in
+    one sequential scan and grouped with numpy: SQLite runs a GROUP BY
+    edition by walking the edition index and fetching each rating row from
+    the table at random, which is about three times slower.
+    """
+    flat = itertools.chain.from_iterable(
+        ratings.order_by().values_list("edition_id", "rating")
+        .iterator(chunk_size=CHUNK_ROWS))
+    pairs = np.fromiter(flat, dtype=np.int64).reshape(-1, 2)
+    edition_ids, inverse = np.unique(pairs[:, 0], return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(edition_ids))
+    sums = np.bincount(inverse, weights=pairs[:, 1],
+                       minlength=len(edition_ids)).astype(np.int64)
+
+    work_of = dict(editions.values_list("id", "work_id"))
+    work_ids, inverse = np.unique(
+        np.array([work_of[edition] for edition in edition_ids.tolist()],
+                 dtype=np.int64), return_inverse=True)
+    work_counts = np.bincount(inverse, weights=counts,
+                              minlength=len(work_ids)).astype(np.int64)
+    work_sums = np.bincount(inverse, weights=sums,
+                            minlength=len(work_ids)).astype(np.int64)
+    return (
+        dict(zip(edition_ids.tolist(), zip(counts.tolist(), sums.tolist()))),
+        dict(zip(work_ids.tolist(), zip(work_counts.tolist(),
+                                        work_sums.tolist()))),
+    )
+
+
+def _refresh(queryset, totals):
+    """
+    Set avg_rating and ratings_count of every row in `queryset` from
+    `totals` (rows missing from it have no ratings); returns the ids of
+    the rows that changed.
+    """
+    model = queryset.model
+    changed = []
+    for pk, avg_rating, ratings_count in queryset.values_list("id", *FIELDS):
+        count, total = totals.get(pk, (0, 0))
+        new_avg = average(total, count)
+        if (new_avg, count) != (avg_rating, ratings_count):
+            changed.append(model(id=pk, avg_rating=new_avg, ratings_count=count))
+    model.objects.bulk_update(changed, FIELDS, batch_size=BATCH_SIZE)
+    return [row.id for row in changed]
+
+
+def _advance(last_change_id):
+    """Move the watermark to `last_change_id` and drop the log up to it."""
+    watermark = AggregateWatermark.objects.first() or AggregateWatermark()
+    if last_change_id > watermark.last_change_id:
+        watermark.last_change_id = last_change_id
+    watermark.save()
+    RatingChange.objects.filter(id__lte=last_change_id).delete()
+
+
+def recompute():
+    """
+    Recompute every work and edition; returns (works changed, editions
+    changed).
+    """
+    with transaction.atomic():
+        # everything logged so far is covered by this pass
+        last = RatingChange.objects.aggregate(last=Max("id"))["last"] or 0
+        editions = BookEdition.objects.all()
+        edition_totals, work_totals = _totals(Rating.objects.all(), editions)
+        works = _refresh(Work.objects.all(), work_totals)
+        edition_ids = _refresh(editions, edition_totals)
+        stamps.touch(works, edition_ids)
+        if works or edition_ids:
+            # averages show in also_loved lists and top_rated_by_author
+            response_cache.clear()
+        _advance(last)
+    return len(works), len(edition_ids)
+
+
+def recompute_changed():
+    """
+    Recompute the works logged in RatingChange since the watermark, and
+    their editions; returns (works changed, editions changed).
+    """
+    with transaction.atomic():
+        watermark = AggregateWatermark.objects.first()
+        since = watermark.last_change_id if watermark else 0
+        changes = list(RatingChange.objects.filter(id__gt=since)
+                       .values_list("id", "work_id"))
+        if not changes:
+            return 0, 0
+        work_ids = sorted({work_id for _, work_id in changes})
+        works_changed = editions_changed = 0
+        for start in range(0, len(work_ids), CHUNK_SIZE):
+            chunk = work_ids[start:start + CHUNK_SIZE]
+            editions = BookEdition.objects.filter(work_id__in=chunk)
+            edition_totals, work_totals = _totals(
+                Rating.objects.filter(work_id__in=chunk), editions)
+            works = _refresh(Work.objects.filter(id__in=chunk), work_totals)
+            edition_ids = _refresh(editions, edition_totals)
+            stamps.touch(works, edition_ids)
+            works_changed += len(works)
+            editions_changed += len(edition_ids)
+        if works_changed or editions_changed:
+            response_cache.clear()
+        _advance(max(change_id for change_id, _ in changes))
+    return works_changed, editions_changed
+
+
+def log_change(old, new):
+    """
+    Log the works a rating write touched, given (user_id, work_id, rating)
+    before and after it (None for a create or a delete).
+    """
+    log_works(change[1] for change in (old, new) if change is not None)
+
+
+def log_works(work_ids):
+    """Log works whose ratings changed without a single rating write."""
+    work_ids = {work_id for work_id in work_ids if work_id is not None}
+    RatingChange.objects.bulk_create(
+        [RatingChange(work_id=work_id) for work_id in sorted(work_ids)])
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BookratingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookrating'
+
+    def ready(self):
+        from bookrating import signals  # noqa: F401  (connects the receivers)
+        from bookrating import bulk_sql  # noqa: F401  (SQLite batch sizes)
@@ -0,0 +1,328 @@
+# Benchmark scenarios for the loader and the API, used by the benchmark
+# management command. Results are plain dicts so they can be saved as JSON
+# and compared between commits.
+
+import csv
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+
+from bookrating import minhash, response_cache
+from bookrating.models import (Work, BookEdition, Author, Rating, WorkCoLove,
+                               WorkMinHash)
+from bookrating.renderers import ORJSONRenderer
+from bookrating.serializers import (
+    BookEditionSerializer, BookEditionValuesSerializer, RatingSerializer,
+    RatingValuesSerializer, WorkListSerializer, WorkListValuesSerializer)
+
+# seed_synthetic arguments for each dataset size
+DATASETS = {
+    "small": {"works": 1_000, "authors": 500, "users": 2_000,
+              "ratings": 50_000},
+    "medium": {"works": 10_000, "authors": 5_000, "users": 20_000,
+               "ratings": 500_000},
+    "large": {"works": 10_000, "authors": 5_000, "users": 53_424,
+              "ratings": 6_000_000},
+}
+
+BOOK_COLUMNS = ["book_id", "work_id", "isbn", "isbn13", "authors",
+                "original_publication_year", "original_title", "title",
+                "language_code", "average_rating", "ratings_count",
+                "work_ratings_count"]
+
+
+def write_csvs(directory):
+    """Dump the current catalogue and ratings as goodbooks-style CSVs."""
+    directory = Path(directory)
+    authors = {}
+    for work_id, name in (Work.authors.through.objects
+                          .order_by("id").values_list("work_id", "author__name")):
+        authors.setdefault(work_id, []).append(name)
+
+    books_path = directory / "books.csv"
+    with open(books_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(BOOK_COLUMNS)
+        editions = (BookEdition.objects.order_by("id").values_list(
+            "id", "work_id", "isbn", "isbn13", "language_code",
+            "avg_rating", "ratings_count", "work__title",
+            "work__original_year", "work__ratings_count"))
+        for (book_id, work_id, isbn, isbn13, language, avg, count, title,
+             year, work_count) in editions.iterator():
+            writer.writerow([book_id, work_id, isbn or "", isbn13 or "",
+                             ", ".join(authors.get(work_id, [])), year or "",
+                             title, title, language or "", avg, count,
+                             work_count])
+
+    ratings_path = directory / "ratings.csv"
+    with open(ratings_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["user_id", "rating", "book_id"])
+        writer.writerows(Rating.objects.order_by("id").values_list(
+            "user_id", "rating", "edition_id").iterator(chunk_size=50_000))
+    return books_path, ratings_path
+
+
+def _reset_peak_rss():
+    """
+    Reset this process's peak RSS to its current RSS; returns whether the
+    platform allows it (Linux does, through /proc/self/clear_refs).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _peak_rss_since_reset_mb():
+    """Peak RSS in MB since _reset_peak_rss(), from /proc/self/status."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def measure_load(load, rows):
+    """
+    Run load() once and report its throughput and the peak RSS during it
+    (tracemalloc would slow the loader down too much to time it). The peak
+    is reset before the load, so seeding the data does not count; where it
+    cannot be reset it is None, rather than the whole process's peak.
+    """
+    tracked = _reset_peak_rss()
+    start = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - start
+    peak = _peak_rss_since_reset_mb() if tracked else None
+    return {"rows": rows, "seconds": round(elapsed, 3),
+            "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+            "peak_rss_mb": round(peak, 1) if peak is not None else None}
+
+
+def api_targets():
+    """
+    URLs to time for each API action, aimed at the heaviest case:
+    the most-rated work and the author with the most works.
+    """
+    work = Work.objects.order_by("-ratings_count", "id").first()
+    author = (Author.objects.annotate(n=Count("works"))
+              .order_by("-n", "id").first())
+    if work is None or author is None:
+        raise ValueError("The benchmark database has no works or authors")
+    return {
+        "work-list": reverse("work-list"),
+        "work-detail": reverse("work-detail", args=[work.pk]),
+        "ratings": reverse("work-ratings", args=[work.pk]),
+        "also_loved": reverse("work-also-loved", args=[work.pk]),
+        "also_loved_approx": (reverse("work-also-loved", args=[work.pk])
+                              + "?approx=1"),
+        "top_rated_by_author": (reverse("work-top-rated-by-author")
+                                + f"?author={author.name}&min_rating=3.5"),
+        "author-works": reverse("author-works", args=[author.pk]),
+    }
+
+
+# api_targets actions served from the response cache on a repeat; the
+# benchmark also times their cache hits, as separate "<name> (cached)" rows
+CACHED_ACTIONS = ("ratings", "also_loved", "also_loved_approx",
+                  "top_rated_by_author")
+
+
+def measure_endpoint(client, url, repeat, cached=False):
+    """
+    Latency percentiles over `repeat` GETs of `url`, plus the query count
+    and peak Python memory of one extra request. The response cache is
+    invalidated before each request, so every one does the work; with
+    `cached`, it is filled once and every request is a hit instead.
+    """
+    if cached:
+        client.get(url)
+    timings = []
+    for _ in range(repeat):
+        if not cached:
+            response_cache.clear()
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise ValueError(f"GET {url} returned {response.status_code}")
+
+    if not cached:
+        response_cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        response = client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    ms = np.array(timings) * 1000
+    return {"url": url,
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "queries": len(queries),
+            "peak_kb": round(peak / 1024),
+            "bytes": len(response.content)}
+
+
+def minhash_recall(works=50, k=10):
+    """
+    Recall@k of the MinHash/LSH estimate behind also_loved?approx=1 against
+    the exact top k by Jaccard similarity (from the WorkCoLove counts),
+    averaged over the `works` most rated works, with the mean time per
+    query of each method.
+    """
+    fans = dict(WorkMinHash.objects.values_list("work_id", "fans"))
+    targets = list(Work.objects.filter(id__in=list(fans))
+                   .order_by("-ratings_count", "id")
+                   .values_list("id", flat=True)[:works])
+    recalls, exact_s, approx_s = [], 0.0, 0.0
+    for work_id in targets:
+        start = time.perf_counter()
+        shared = WorkCoLove.objects.filter(work_id=work_id).values_list(
+            "other_work_id", "five_star_count")
+        jaccard = {other: count / (fans[work_id] + fans[other] - count)
+                   for other, count in shared}
+        exact = sorted(jaccard, key=lambda w: (-jaccard[w], w))[:k]
+        exact_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx = [w for w, *_ in minhash.similar_works(work_id, k)]
+        approx_s += time.perf_counter() - start
+        if exact:
+            recalls.append(len(set(exact) & set(approx)) / len(exact))
+    return {"k": k, "works": len(targets),
+            "recall": round(float(np.mean(recalls)), 4) if recalls else None,
+            "exact_ms": round(exact_s / max(len(targets), 1) * 1000, 3),
+            "approx_ms": round(approx_s / max(len(targets), 1) * 1000, 3)}
+
+
+def join_cost(works=20, repeat=5):
+    """
+    Mean ms per query of the per-work Rating lookups the derived tables are
+    built from (a work's 5-star fans and its rating histogram), filtered
+    through BookEdition as before Rating.work existed and on Rating.work
+    itself, over the `works` most rated works.
+    """
+    targets = list(Work.objects.order_by("-ratings_count", "id")
+                   .values_list("id", flat=True)[:works])
+    queries = {
+        "fans": lambda lookup: Rating.objects.filter(
+            rating=5, **lookup).values_list("user_id", flat=True),
+        "histogram": lambda lookup: Rating.objects.filter(
+            **lookup).order_by().values("rating").annotate(n=Count("id")),
+    }
+    results = {}
+    for name, query in queries.items():
+        row = {}
+        for label, field in (("join_ms", "edition__work_id"),
+                             ("column_ms", "work_id")):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for work_id in targets:
+                    list(query({field: work_id}))
+            elapsed = time.perf_counter() - start
+            row[label] = round(
+                elapsed / max(repeat * len(targets), 1) * 1000, 3)
+        results[name] = row
+    return results
+
+
+def serialization_throughput(rows=1_000, repeat=3):
+    """
+    Rows per second from query to JSON bytes for a `rows`-long page of each
+    fast list endpoint: through its ModelSerializer and JSONRenderer, and
+    through its values_list serializer and ORJSONRenderer.
+    """
+    context = {"request": RequestFactory().get("/")}
+    cases = {
+        "works": (WorkListSerializer,
+                  lambda: Work.objects.prefetch_related("authors"),
+                  WorkListValuesSerializer, Work.objects.all()),
+        "editions": (BookEditionSerializer, BookEdition.objects.all,
+                     BookEditionValuesSerializer, BookEdition.objects.all()),
+        "ratings": (RatingSerializer, Rating.objects.all,
+                    RatingValuesSerializer, Rating.objects.all()),
+    }
+    results = {}
+    for name, (model_serializer, objects, fast_serializer, queryset) in \
+            cases.items():
+        def model_path():
+            return JSONRenderer().render(model_serializer(
+                objects()[:rows], many=True, context=context).data)
+
+        def fast_path():
+            return ORJSONRenderer().render(fast_serializer(
+                queryset.values_list(*fast_serializer.columns())[:rows],
+                context=context).data)
+
+        row = {"rows": rows}
+        for label, render in (("model", model_path), ("values", fast_path)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                render()
+            elapsed = (time.perf_counter() - start) / repeat
+            row[f"{label}_rows_per_sec"] = round(rows / elapsed, 1)
+        row["speedup"] = round(
+            row["values_rows_per_sec"] / row["model_rows_per_sec"], 2)
+        results[name] = row
+    return results
+
+
+def find_regressions(results, baseline, threshold, min_delta_ms=1.0,
+                     memory_threshold=None):
+    """
+    Compare two result dicts and describe every metric that got worse by
+    more than `threshold` (a fraction, e.g. 0.2 for 20%). Latencies must
+    also have grown by min_delta_ms, so timer noise on very fast actions
+    is not reported. Query counts may not grow at all, and neither may
+    MinHash recall drop by more than `threshold`. The loaders' peak RSS and
+    the actions' peak memory may not grow by more than `memory_threshold`
+    (`threshold` when None).
+    """
+    if memory_threshold is None:
+        memory_threshold = threshold
+    problems = []
+    for name, old in baseline.get("loader", {}).items():
+        new = results.get("loader", {}).get(name)
+        if new and old.get("rows_per_sec") and new["rows_per_sec"] is not None \
+                and new["rows_per_sec"] < old["rows_per_sec"] / (1 + threshold):
+            problems.append(
+                f"loader {name}: {new['rows_per_sec']:,.0f} rows/sec, "
+                f"was {old['rows_per_sec']:,.0f}")
+        if new and old.get("peak_rss_mb") and new.get("peak_rss_mb") \
+                and new["peak_rss_mb"] > old["peak_rss_mb"] * (1 + memory_threshold):
+            problems.append(
+                f"loader {name} peak_rss_mb: {new['peak_rss_mb']:,.1f}, "
+                f"was {old['peak_rss_mb']:,.1f}")
+    for name, old in baseline.get("api", {}).items():
+        new = results.get("api", {}).get(name)
+        if not new:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if new[metric] > old[metric] * (1 + threshold) \
+                    and new[metric] - old[metric] >= min_delta_ms:
+                problems.append(
+                    f"{name} {metric}: {new[metric]:.2f}, was {old[metric]:.2f}")
+        if old.get("peak_kb") and new.get("peak_kb") is not None \
+                and new["peak_kb"] > old["peak_kb"] * (1 + memory_threshold):
+            problems.append(
+                f"{name} peak_kb: {new['peak_kb']:,}, was {old['peak_kb']:,}")
+        if new["queries"] > old["queries"]:
+            problems.append(
+                f"{name} queries: {new['queries']}, was {old['queries']}")
+    old = (baseline.get("minhash") or {}).get("recall")
+    new = (results.get("minhash") or {}).get("recall")
+    if old and new is not None and new < old / (1 + threshold):
+        problems.append(f"minhash recall: {new:.3f}, was {old:.3f}")
+    return problems
@@ -0,0 +1,37 @@
+# Raw INSERT helpers for the bulk commands, where building a model
+# instance per row would cost more than the insert itself.
+
+import sqlite3
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models.constants import OnConflict
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def use_sqlite_variable_limit(sender, connection, **kwargs):
+    """
+    Let bulk_create batch up to the variables this SQLite build allows
+    (250,000 since 3.32) rather than Django's fixed 999, which split a
+    5,000-row batch into dozens of INSERTs.
+    """
+    if connection.vendor == "sqlite" and hasattr(connection.connection,
+                                                 "getlimit"):
+        connection.features.max_query_params = connection.connection.getlimit(
+            sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+
+
+def insert_ignore_sql(model, field_names):
+    """
+    INSERT .. ON CONFLICT DO NOTHING for `model` in the backend's dialect,
+    with one %s placeholder per field, for use with cursor.executemany.
+    """
+    ops = connection.ops
+    fields = [model._meta.get_field(name) for name in field_names]
+    columns = ", ".join(ops.quote_name(f.column) for f in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    suffix = ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+    return (f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} "
+            f"{ops.quote_name(model._meta.db_table)} ({columns}) "
+            f"VALUES ({placeholders}) {suffix}").strip()
@@ -0,0 +1,103 @@
+# Maintenance of the WorkCoLove table behind WorkViewSet.also_loved.
+# A user is a "fan" of a work when they gave 5 stars to any of its editions;
+# WorkCoLove(work, other_work).five_star_count counts the users who are fans
+# of both works, stored once in each direction.
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from bookrating.models import Rating, WorkCoLove
+
+FANS_TABLE = "colove_fans"
+
+
+WORKS_TABLE = "colove_works"
+
+
+def rebuild(work_ids=None):
+    """
+    Recompute the table from Rating with set-based SQL: collect the
+    distinct (user, work) fan pairs in a temporary table, then self-join it
+    on user and count per pair of works. With `work_ids`, only the pairs
+    involving those works are recomputed, from the fan pairs of their fans.
+    Returns the number of rows written.
+    """
+    colove = WorkCoLove._meta.db_table
+    rating = Rating._meta.db_table
+    qn = connection.ops.quote_name
+    fans, works = qn(FANS_TABLE), qn(WORKS_TABLE)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {fans}")
+        if work_ids is None:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {fans} AS "
+                f"SELECT DISTINCT user_id, work_id FROM {qn(rating)} "
+                f"WHERE rating = 5")
+            cursor.execute(f"DELETE FROM {qn(colove)}")
+            involving = ""
+        else:
+            cursor.execute(f"DROP TABLE IF EXISTS {works}")
+            cursor.execute(f"CREATE TEMPORARY TABLE {works} "
+                           f"(work_id INTEGER PRIMARY KEY)")
+            cursor.executemany(f"INSERT INTO {works} (work_id) VALUES (%s)",
+                               [(work_id,) for work_id in sorted(work_ids)])
+            listed = f"(SELECT work_id FROM {works})"
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {fans} AS "
+                f"SELECT DISTINCT user_id, work_id FROM {qn(rating)} "
+                f"WHERE rating = 5 AND user_id IN ("
+                f"SELECT user_id FROM {qn(rating)} "
+                f"WHERE rating = 5 AND work_id IN {listed})")
+            cursor.execute(
+                f"DELETE FROM {qn(colove)} WHERE work_id IN {listed} "
+                f"OR other_work_id IN {listed}")
+            involving = (f"WHERE a.work_id IN {listed} "
+                         f"OR b.work_id IN {listed} ")
+        cursor.execute(
+            f"CREATE INDEX {qn(FANS_TABLE + '_user')} "
+            f"ON {fans} (user_id, work_id)")
+        cursor.execute(
+            f"INSERT INTO {qn(colove)} (work_id, other_work_id, five_star_count) "
+            f"SELECT a.work_id, b.work_id, COUNT(*) "
+            f"FROM {fans} a JOIN {fans} b "
+            f"ON b.user_id = a.user_id AND b.work_id <> a.work_id "
+            f"{involving}"
+            f"GROUP BY a.work_id, b.work_id")
+        written = cursor.rowcount
+        cursor.execute(f"DROP TABLE {fans}")
+        if work_ids is not None:
+            cursor.execute(f"DROP TABLE {works}")
+    return written
+
+
+def is_fan(user_id, work_id):
+    return Rating.objects.filter(
+        user_id=user_id, work_id=work_id, rating=5).exists()
+
+
+def apply_fan_change(user_id, work_id, became_fan):
+    """
+    Adjust the counts between work_id and every other work the user is a
+    fan of, after the user started (or stopped) being a fan of work_id;
+    returns those other works.
+    """
+    others = list(
+        Rating.objects.filter(user_id=user_id, rating=5)
+        .exclude(work_id=work_id)
+        .values_list("work_id", flat=True).distinct())
+    if not others:
+        return others
+    delta = 1 if became_fan else -1
+    with transaction.atomic():
+        if became_fan:
+            WorkCoLove.objects.bulk_create(
+                [WorkCoLove(work_id=a, other_work_id=b, five_star_count=0)
+                 for other in others
+                 for a, b in ((work_id, other), (other, work_id))],
+                ignore_conflicts=True)
+        pairs = (WorkCoLove.objects.filter(work_id=work_id, other_work_id__in=others)
+                 | WorkCoLove.objects.filter(other_work_id=work_id, work_id__in=others))
+        pairs.update(five_star_count=F("five_star_count") + delta)
+        if not became_fan:
+            pairs.filter(five_star_count=0).delete()
+    return others
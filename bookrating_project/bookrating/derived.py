@@ -0,0 +1,48 @@
+# Tables derived from Rating that model signals keep up to date on single
+# writes. Bulk inserts bypass the signals, so the bulk commands call
+# refresh() for the works and raters they loaded, or rebuild_all().
+
+from bookrating import (colove, minhash, neighbours, rating_stats,
+                        response_cache, stamps)
+from bookrating.models import BookEdition, Work
+
+
+def rebuild_all():
+    """Rebuild every derived table; returns {table: rows written}."""
+    return {
+        "also-loved pairs": colove.rebuild(),
+        "MinHash signatures": minhash.rebuild(),
+        "rating histograms": rating_stats.rebuild(),
+        # too slow to rebuild here; build_neighbours picks these up
+        "stale raters": neighbours.mark_all_stale(),
+        "work version stamps": stamps.touch_all(),
+    }
+
+
+def refresh(work_ids, user_ids, edition_ids=()):
+    """
+    Bring the derived tables up to date after bulk writes to the ratings of
+    `work_ids` and of the works of `edition_ids`, by `user_ids`; returns
+    {table: rows written}. Falls back to rebuild_all() when the writes
+    touched most works, which it does faster.
+    """
+    work_ids = set(work_ids)
+    edition_ids = sorted(edition_ids)
+    for start in range(0, len(edition_ids), stamps.CHUNK_SIZE):
+        work_ids.update(BookEdition.objects.filter(
+            id__in=edition_ids[start:start + stamps.CHUNK_SIZE])
+            .values_list("work_id", flat=True))
+    work_ids = sorted(work_ids)
+    if len(work_ids) * 2 > Work.objects.count():
+        return rebuild_all()
+    rebuilt = {
+        "also-loved pairs": colove.rebuild(work_ids),
+        "MinHash signatures": minhash.rebuild(work_ids),
+        "rating histograms": rating_stats.rebuild(work_ids),
+    }
+    neighbours.mark_stale(user_ids)
+    stamps.touch(work_ids)
+    # the also_loved lists of the works co-loved with these change as well
+    response_cache.clear()
+    return {**rebuilt, "stale raters": len(user_ids),
+            "work version stamps": len(work_ids)}
@@ -1,6 +1,6 @@
 
 import factory
-from bookrating.models import Work, Author, BookEdition
+from bookrating.models import Work, Author, BookEdition, Rating
 
 
 class WorkFactory(factory.django.DjangoModelFactory):
@@ -32,3 +32,11 @@ class BookEditionFactory(factory.django.DjangoModelFactory):
     language_code = "en"
     avg_rating = 4.0
     ratings_count = 100
+
+
+class RatingFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Rating
+    user_id = factory.Sequence(lambda n: n + 1)
+    edition = factory.SubFactory(BookEditionFactory)
+    rating = 5
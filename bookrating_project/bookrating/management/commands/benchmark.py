@@ -0,0 +1,185 @@
+import json
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from bookrating import response_cache
+from bookrating.benchmarks import (CACHED_ACTIONS, DATASETS, api_targets,
+                                   find_regressions, join_cost,
+                                   measure_endpoint, measure_load,
+                                   minhash_recall, serialization_throughput,
+                                   write_csvs)
+from bookrating.management.commands.bulk_load import _peak_rss_mb
+from bookrating.management.commands.loader import reset_tables
+from bookrating.models import BookEdition, Rating
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Benchmark bulk_load and the main API actions on a synthetic "
+            "dataset in a throwaway test database, optionally failing on "
+            "regressions against an earlier JSON result")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size", choices=list(DATASETS), default="small",
+            help="Synthetic dataset to generate (default small)")
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="Timed requests per API action (default 20)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--output", type=Path, default=None,
+            help="Write the results to this JSON file")
+        parser.add_argument(
+            "--baseline", type=Path, default=None,
+            help="Earlier --output file to compare against")
+        parser.add_argument(
+            "--threshold", type=float, default=0.2,
+            help="Allowed slowdown against --baseline as a fraction "
+                 "(default 0.2 = 20%%)")
+        parser.add_argument(
+            "--memory-threshold", type=float, default=None,
+            help="Allowed growth of peak memory against --baseline as a "
+                 "fraction (default --threshold)")
+        parser.add_argument(
+            "--min-delta-ms", type=float, default=1.0,
+            help="Ignore latency increases smaller than this (default 1.0)")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive")
+        baseline = None
+        if options["baseline"]:
+            try:
+                baseline = json.loads(options["baseline"].read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline: {e}")
+
+        # never touch the configured database: benchmark in a test copy
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = self.run_benchmarks(options)
+        finally:
+            # the shared response cache holds the test copy's responses
+            response_cache.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+        if options["output"]:
+            options["output"].write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            problems = find_regressions(results, baseline, options["threshold"],
+                                        options["min_delta_ms"],
+                                        options["memory_threshold"])
+            if problems:
+                raise CommandError(
+                    "Performance regressions against the baseline:\n  "
+                    + "\n  ".join(problems))
+            self.stdout.write(self.style.SUCCESS(
+                f"No regressions beyond {options['threshold']:.0%} "
+                f"against {options['baseline']}."))
+
+    def run_benchmarks(self, options):
+        size = options["size"]
+        quiet = StringIO()
+        dataset = [f"--{key}={value}" for key, value in DATASETS[size].items()]
+        self.stdout.write(f"Seeding {size} dataset...")
+        call_command("seed_synthetic", *dataset, f"--seed={options['seed']}",
+                     stdout=quiet)
+
+        # reload the seeded data through bulk_load to time the loader
+        loader = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            books_csv, ratings_csv = write_csvs(tmp)
+            books, ratings = BookEdition.objects.count(), Rating.objects.count()
+            reset_tables()
+            self.stdout.write("Timing bulk_load...")
+            loader["books"] = measure_load(lambda: call_command(
+                "bulk_load", "--books", str(books_csv), "--set-based",
+                stdout=quiet), books)
+            loader["ratings"] = measure_load(lambda: call_command(
+                "bulk_load", "--ratings", str(ratings_csv), "--stream",
+                "--fast", stdout=quiet), ratings)
+
+        self.stdout.write("Timing API actions...")
+        client = APIClient()
+        api = {}
+        for name, url in api_targets().items():
+            api[name] = measure_endpoint(client, url, options["repeat"])
+            if name in CACHED_ACTIONS:
+                api[f"{name} (cached)"] = measure_endpoint(
+                    client, url, options["repeat"], cached=True)
+        self.stdout.write("Comparing approximate also_loved with exact...")
+        approx = minhash_recall()
+        self.stdout.write("Timing per-work Rating queries...")
+        joins = join_cost()
+        self.stdout.write("Timing list serialization...")
+        serialization = serialization_throughput()
+
+        return {
+            "size": size,
+            "dataset": DATASETS[size],
+            "seed": options["seed"],
+            "repeat": options["repeat"],
+            "commit": _git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "loader": loader,
+            "api": api,
+            "minhash": approx,
+            "join_cost": joins,
+            "serialization": serialization,
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+
+    def report(self, results):
+        for name, row in results["loader"].items():
+            peak = row["peak_rss_mb"]
+            peak = f"{peak:>8,.1f} MB" if peak is not None else "     n/a"
+            self.stdout.write(
+                f"bulk_load {name:<8} {row['rows']:>10,} rows "
+                f"{row['rows_per_sec']:>12,.0f} rows/sec peak RSS {peak}")
+        self.stdout.write(
+            f"{'action':<30}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}"
+            f"{'peak KB':>10}{'bytes':>11}")
+        for name, row in results["api"].items():
+            self.stdout.write(
+                f"{name:<30}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                f"{row['queries']:>9}{row['peak_kb']:>10,}{row['bytes']:>11,}")
+        approx = results["minhash"]
+        self.stdout.write(
+            f"also_loved?approx=1 recall@{approx['k']} {approx['recall']} over "
+            f"{approx['works']} works ({approx['approx_ms']:.2f} ms per query, "
+            f"exact {approx['exact_ms']:.2f} ms)")
+        for name, row in results["join_cost"].items():
+            self.stdout.write(
+                f"per-work {name:<10} {row['column_ms']:>8.2f} ms on Rating.work, "
+                f"{row['join_ms']:>8.2f} ms through BookEdition")
+        for name, row in results["serialization"].items():
+            self.stdout.write(
+                f"{row['rows']:,} {name:<9} {row['values_rows_per_sec']:>12,.0f} "
+                f"rows/sec from values_list + orjson, "
+                f"{row['model_rows_per_sec']:>10,.0f} through the "
+                f"ModelSerializer ({row['speedup']:.1f}x)")
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookrating import neighbours
+from bookrating.models import UserNeighbour
+
+
+class Command(BaseCommand):
+    help = ("Precompute each user's most similar raters (cosine and Pearson) "
+            "behind /api/users/<user_id>/similar/. After the first build "
+            "only users whose ratings changed are recomputed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Recompute every user, not only those whose ratings changed")
+        parser.add_argument("--k", type=int, default=20,
+                            help="Neighbours kept per user and metric (default 20)")
+        parser.add_argument(
+            "--min-common", type=int, default=5,
+            help="Co-rated works two users need to be neighbours (default 5)")
+
+    def handle(self, *args, **options):
+        if options["k"] < 1 or options["min_common"] < 1:
+            raise CommandError("--k and --min-common must be positive")
+        full = options["full"] or not UserNeighbour.objects.exists()
+        start = time.perf_counter()
+
+        def progress(done, total):
+            self.stdout.write(f"{done:,} of {total:,} users "
+                              f"({time.perf_counter() - start:.0f}s)")
+
+        users = neighbours.build(options["k"], options["min_common"],
+                                 stale_only=not full, progress=progress)
+        what = "all" if full else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed neighbours of {users:,} {what} users in "
+            f"{time.perf_counter() - start:.1f}s."))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookrating import response_cache
+from bookrating.recommender import (ITEM_COSINE, artifact_dir, item_cosine,
+                                    save_artifact, user_work_matrix)
+
+
+class Command(BaseCommand):
+    help = ("Build the item-item cosine similarity artifact behind "
+            "also_loved?algo=cosine from the 5-star ratings")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top-k", type=int, default=100,
+            help="Neighbours kept per work (default 100)")
+        parser.add_argument(
+            "--min-rating", type=int, default=5,
+            help="Ratings at or above this count as loving a work (default 5)")
+
+    def handle(self, *args, **options):
+        top_k = options["top_k"]
+        if top_k < 1:
+            raise CommandError("--top-k must be positive")
+
+        start = time.perf_counter()
+        matrix, user_ids, work_ids = user_work_matrix(
+            min_rating=options["min_rating"], binary=True)
+        self.stdout.write(
+            f"Built a {matrix.shape[0]:,} x {matrix.shape[1]:,} matrix with "
+            f"{matrix.nnz:,} entries in {time.perf_counter() - start:.1f}s.")
+
+        start = time.perf_counter()
+        arrays = item_cosine(matrix, work_ids, top_k)
+        save_artifact(ITEM_COSINE, arrays, top_k=top_k,
+                      min_rating=options["min_rating"], users=len(user_ids),
+                      works=len(work_ids), entries=matrix.nnz)
+        response_cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved {len(arrays['neighbours']):,} neighbours to "
+            f"{artifact_dir(ITEM_COSINE)} in "
+            f"{time.perf_counter() - start:.1f}s."))
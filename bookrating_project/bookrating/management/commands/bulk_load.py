@@ -1,9 +1,28 @@
 import csv
+import itertools
+import multiprocessing
+import queue
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from decimal import Decimal
 from pathlib import Path
 from datetime import datetime
 
 from django.core.management.base import BaseCommand, CommandError
-from bookrating.models import Work, BookEdition, Author, Rating, WorkAuthor
+from django.db import IntegrityError, connection, transaction
+from bookrating import derived
+from bookrating.bulk_sql import insert_ignore_sql
+from bookrating.models import (Work, BookEdition, Author, Rating, WorkAuthor,
+                               LoadCheckpoint)
+from bookrating.ratings_csv import (iter_batches, parse_range, split_ranges,
+                                    file_digest)
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 
 def parse_date(s: str | None):
@@ -23,6 +42,66 @@ def _parse_year(s):
         return None
 
 
+# rows per bulk_create call
+BATCH_SIZE = 5_000
+# batches per transaction in streaming mode
+COMMIT_EVERY = 20
+# SQLite page cache for --fast, in KiB
+FAST_CACHE_KB = 512 * 1024
+# unindexed temp table that --fast stages ratings in
+FAST_STAGING_TABLE = "bulk_load_staged_rating"
+
+
+def _work_fields(row):
+    return {
+        "title": (row["original_title"] or row["title"]).strip(),
+        "original_year": _parse_year(row["original_publication_year"]),
+        "avg_rating": float(row["average_rating"] or 0),
+        "ratings_count": int(row["work_ratings_count"] or 0),
+    }
+
+
+def _edition_fields(row):
+    return {
+        "isbn": row["isbn"] or None,
+        "isbn13": row["isbn13"] or None,
+        "language_code": row["language_code"] or None,
+        "ratings_count": int(row["ratings_count"] or 0),
+        "avg_rating": float(row["average_rating"] or 0),
+    }
+
+
+def _author_names(row):
+    return [n for n in (n.strip() for n in row["authors"].split(",")) if n]
+
+
+# fields --sync compares and updates on existing rows
+SYNC_WORK_FIELDS = ["title", "original_year", "avg_rating", "ratings_count"]
+SYNC_EDITION_FIELDS = ["work_id", "isbn", "isbn13", "language_code",
+                       "ratings_count", "avg_rating"]
+
+
+def _comparable(value):
+    # CSV floats vs stored Decimal(3, 2)
+    if isinstance(value, (float, Decimal)):
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    return value
+
+
+def _changed_fields(current, incoming, fields):
+    return tuple(f for f in fields
+                 if _comparable(current[f]) != _comparable(incoming[f]))
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
 class Command(BaseCommand):
     help = "Bulk load book and ratings data from CSV files"
 
@@ -33,6 +112,47 @@ class Command(BaseCommand):
         parser.add_argument(
             "--ratings", type=str, help="Path to ratings data CSV", default=None
         )
+        parser.add_argument(
+            "--set-based", action="store_true",
+            help="Load books with a fixed number of queries and batched "
+                 "bulk_create instead of per-row get_or_create")
+        parser.add_argument(
+            "--sync", action="store_true",
+            help="Like --set-based, but also update existing works and "
+                 "editions whose CSV values (e.g. avg_rating, ratings_count) "
+                 "have changed, using batched bulk_update")
+        parser.add_argument(
+            "--stream", action="store_true",
+            help="Load ratings in constant memory, leaving duplicate "
+                 "removal to the unique_user_edition_rating constraint")
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE,
+            help=f"Rows per bulk_create call (default {BATCH_SIZE})")
+        parser.add_argument(
+            "--commit-every", type=int, default=COMMIT_EVERY,
+            help=f"Batches per transaction with --stream (default {COMMIT_EVERY})")
+        parser.add_argument(
+            "--on-conflict", choices=["ignore", "update"], default="ignore",
+            help="With --stream, keep the existing rating for a (user, edition) "
+                 "pair (ignore) or overwrite it with the file's value (update)")
+        parser.add_argument(
+            "--workers", type=int, default=0,
+            help="With --stream, parse the ratings file in N worker processes "
+                 "while this process writes to the database")
+        parser.add_argument(
+            "--fast", action="store_true",
+            help="SQLite only: WAL with synchronous=OFF, a large page cache "
+                 "and one transaction, staging ratings in an unindexed table "
+                 "and rebuilding indexes at the end. Duplicate ratings roll "
+                 "the whole load back.")
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="With --stream, continue from the last batch committed for "
+                 "this ratings file instead of starting from the first row")
+        parser.add_argument(
+            "--full-refresh", action="store_true",
+            help="Rebuild every derived table after loading, instead of "
+                 "only the rows of the works and raters the load touched")
 
     def handle(self, *args, **options):
         books_path = options["books"]
@@ -41,24 +161,185 @@ class Command(BaseCommand):
         if not books_path and not ratings_path:
             raise CommandError(
                 "You must provide at least one of --books or --ratings")
+        if options["batch_size"] < 1 or options["commit_every"] < 1:
+            raise CommandError(
+                "--batch-size and --commit-every must be positive")
+        if options["workers"] < 0:
+            raise CommandError("--workers cannot be negative")
+        if options["workers"] and not options["stream"]:
+            raise CommandError("--workers requires --stream")
+        if options["resume"] and not options["stream"]:
+            raise CommandError("--resume requires --stream")
+        if options["resume"] and (options["workers"] or options["fast"]):
+            raise CommandError(
+                "--resume cannot be combined with --workers or --fast, which "
+                "do not commit the file in order")
+        if options["fast"] and ratings_path and not options["stream"]:
+            raise CommandError("--fast loads ratings through --stream; add it")
+        if options["fast"] and options["on_conflict"] == "update":
+            raise CommandError(
+                "--fast cannot be combined with --on-conflict update, which "
+                "needs the unique index that staged ratings bypass")
+        self.batch_size = options["batch_size"]
+        self.fast = options["fast"]
+        self.full_refresh = options["full_refresh"]
+        self.start_tracking()
+
+        with self.fast_load() if self.fast else nullcontext():
+            self.load(books_path, ratings_path, options)
+        # bulk writes bypass the Rating signals that maintain derived tables;
+        # --sync can also move editions between works
+        if ratings_path or options["sync"]:
+            self.refresh_derived_tables()
+
+        peak = _peak_rss_mb()
+        if peak is not None:
+            self.stdout.write(f"Peak RSS: {peak:,.1f} MB")
 
+        self.stdout.write(self.style.SUCCESS("Bulk loading completed."))
+
+    def load(self, books_path, ratings_path, options):
         if books_path:
             path = Path(books_path)
             if not path.exists():
                 raise CommandError(f"Books file not found: {path}")
             self.stdout.write(f"Loading books from: {path}")
-            self.load_books(path)
+            start = time.perf_counter()
+            if options["set_based"] or options["sync"]:
+                rows = self.load_books_set_based(path, sync=options["sync"])
+            else:
+                rows = self.load_books(path)
+            self.report_rate("books", rows, time.perf_counter() - start)
 
         if ratings_path:
             path = Path(ratings_path)
             if not path.exists():
                 raise CommandError(f"Ratings file not found: {path}")
             self.stdout.write(f"Loading ratings from: {path}")
-            self.load_ratings(path)
+            start = time.perf_counter()
+            if options["stream"]:
+                rows = self.load_ratings_streaming(
+                    path, options["commit_every"], options["on_conflict"],
+                    options["workers"], options["resume"])
+            else:
+                rows = self.load_ratings(path)
+            self.report_rate("ratings", rows, time.perf_counter() - start)
 
-        self.stdout.write(self.style.SUCCESS("Bulk loading completed."))
+    def start_tracking(self):
+        # what the load writes, so only those rows of the derived tables
+        # are refreshed afterwards
+        self.rated_editions, self.rated_users = set(), set()
+        self.moved_work_ids = set()
+
+    def track(self, batch):
+        """Record the raters and editions of (user_id, edition_id, rating)s."""
+        if batch:
+            users, editions, _ = zip(*batch)
+            self.rated_users.update(users)
+            self.rated_editions.update(editions)
+
+    def refresh_derived_tables(self):
+        start = time.perf_counter()
+        if self.full_refresh:
+            rebuilt = derived.rebuild_all()
+        elif self.rated_editions or self.moved_work_ids:
+            rebuilt = derived.refresh(self.moved_work_ids, self.rated_users,
+                                      edition_ids=self.rated_editions)
+        else:
+            self.stdout.write("No ratings changed; the derived tables are "
+                              "up to date.")
+            return
+        self.stdout.write(
+            "Refreshed " + ", ".join(f"{rows:,} {table}"
+                                     for table, rows in rebuilt.items())
+            + f" in {time.perf_counter() - start:.1f}s.")
+
+    @contextmanager
+    def fast_load(self):
+        """
+        Run the whole load in one SQLite transaction with relaxed durability.
+        unique_user_edition_rating is part of the table definition in SQLite
+        and cannot be dropped, so ratings are written to an unindexed temp
+        table and moved across in one sorted INSERT at the end, with the
+        explicit Rating indexes dropped and rebuilt around it. A duplicate
+        pair fails that INSERT and rolls the whole load back.
+        """
+        if connection.vendor != "sqlite":
+            raise CommandError("--fast is only supported on SQLite")
+
+        # journal_mode cannot change inside a transaction, so set it first
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.execute(f"PRAGMA cache_size=-{FAST_CACHE_KB}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+
+        table = Rating._meta.db_table
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # explicit indexes only; sqlite_autoindex_* have no sql
+                cursor.execute(
+                    "SELECT name, sql FROM sqlite_master "
+                    "WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+                    [table])
+                indexes = cursor.fetchall()
+                for name, _ in indexes:
+                    cursor.execute(f'DROP INDEX "{name}"')
+                cursor.execute(
+                    f"CREATE TEMP TABLE {FAST_STAGING_TABLE} "
+                    "(user_id integer, edition_id integer, rating integer)")
+            self.stdout.write(
+                f"Fast mode: dropped {len(indexes)} indexes on {table}.")
+
+            yield
+
+            start = time.perf_counter()
+            edition_table = BookEdition._meta.db_table
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    # work_id comes from the edition; an unknown edition
+                    # leaves it NULL and fails the INSERT
+                    cursor.execute(
+                        f'INSERT INTO "{table}" (user_id, edition_id, work_id, rating) '
+                        f"SELECT s.user_id, s.edition_id, e.work_id, s.rating "
+                        f"FROM {FAST_STAGING_TABLE} s "
+                        f'LEFT JOIN "{edition_table}" e ON e.id = s.edition_id '
+                        f"ORDER BY s.user_id, s.edition_id")
+                    inserted = cursor.rowcount
+            except IntegrityError:
+                duplicates = self.count_duplicate_ratings()
+                if not duplicates:
+                    raise CommandError(
+                        "Some ratings refer to editions that do not exist; "
+                        "the load was rolled back.")
+                raise CommandError(
+                    f"{duplicates:,} (user_id, edition) "
+                    f"pairs are rated more than once; the load was rolled back.")
+            with connection.cursor() as cursor:
+                for _, sql in indexes:
+                    cursor.execute(sql)
+                cursor.execute(f"DROP TABLE {FAST_STAGING_TABLE}")
+            self.stdout.write(
+                f"Inserted {inserted:,} ratings and rebuilt {len(indexes)} "
+                f"indexes in {time.perf_counter() - start:.2f}s.")
+
+    def count_duplicate_ratings(self):
+        """Pairs rated more than once across existing and staged ratings."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM ("
+                f"SELECT 1 FROM (SELECT user_id, edition_id FROM {FAST_STAGING_TABLE} "
+                f'UNION ALL SELECT user_id, edition_id FROM "{Rating._meta.db_table}") '
+                f"GROUP BY user_id, edition_id HAVING COUNT(*) > 1)")
+            return cursor.fetchone()[0]
+
+    def report_rate(self, label, rows, elapsed):
+        rate = rows / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            f"Loaded {rows:,} {label} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
 
     def load_books(self, path):
+        i = 0
         with open(path, newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f)
             for i, row in enumerate(reader, start=1):
@@ -66,40 +347,167 @@ class Command(BaseCommand):
                 # Work
                 work, _ = Work.objects.get_or_create(
                     id=int(row["work_id"]),
-                    defaults={
-                        "title": (row["original_title"] or row["title"]).strip(),
-                        "original_year": _parse_year(row["original_publication_year"]),
-                        "avg_rating": float(row["average_rating"] or 0),
-                        "ratings_count": int(row["work_ratings_count"] or 0),
-                    },
+                    defaults=_work_fields(row),
                 )
 
                 # Edition
                 BookEdition.objects.get_or_create(
                     id=int(row["book_id"]),
-                    defaults={
-                        "work": work,
-                        "isbn": row["isbn"] or None,
-                        "isbn13": row["isbn13"] or None,
-                        "language_code": row["language_code"] or None,
-                        "ratings_count": int(row["ratings_count"] or 0),
-                        "avg_rating": float(row["average_rating"] or 0),
-                    },
+                    defaults={"work": work, **_edition_fields(row)},
                 )
 
                 # Authors
-                for name in (n.strip() for n in row["authors"].split(",")):
-                    if not name:
-                        continue
+                for name in _author_names(row):
                     author, _ = Author.objects.get_or_create(name=name)
                     work.authors.add(author)
                     # also add into WorkAuthor junction table
                     WorkAuthor.objects.get_or_create(work=work, author=author)
+        return i
+
+    def load_books_set_based(self, path, sync=False):
+        """
+        Same result as load_books, but existing ids are read once per table
+        and new rows are written with batched bulk_create (new author names
+        with one executemany), so the number of queries does not grow with
+        the number of CSV rows, up to --batch-size new rows per table.
+
+        With sync, existing works and editions are diffed against the CSV
+        and only their changed fields are written, via bulk_update.
+        """
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        self.load_book_rows(rows, sync)
+        return len(rows)
+
+    def load_book_rows(self, rows, sync=False):
+        """load_books_set_based for already parsed CSV rows."""
+        with transaction.atomic():
+            # existing keys (or rows, to diff against), one query per table
+            if sync:
+                current_works = {w["id"]: w for w in
+                                 Work.objects.values("id", *SYNC_WORK_FIELDS)}
+                current_editions = {e["id"]: e for e in BookEdition.objects
+                                    .values("id", *SYNC_EDITION_FIELDS)}
+                work_ids, edition_ids = current_works, current_editions
+            else:
+                work_ids = set(Work.objects.values_list("id", flat=True))
+                edition_ids = set(
+                    BookEdition.objects.values_list("id", flat=True))
+            author_ids = dict(Author.objects.values_list("name", "id"))
+            work_author_pairs = set(
+                WorkAuthor.objects.values_list("work_id", "author_id"))
+
+            # first row for an id wins, as with get_or_create(defaults=...)
+            new_works, new_editions, new_names = {}, {}, {}
+            for row in rows:
+                work_id = int(row["work_id"])
+                book_id = int(row["book_id"])
+                if work_id not in work_ids and work_id not in new_works:
+                    new_works[work_id] = Work(id=work_id, **_work_fields(row))
+                if book_id not in edition_ids and book_id not in new_editions:
+                    new_editions[book_id] = BookEdition(
+                        id=book_id, work_id=work_id, **_edition_fields(row))
+                for name in _author_names(row):
+                    if name not in author_ids:
+                        new_names.setdefault(name, None)
+
+            Work.objects.bulk_create(
+                new_works.values(), batch_size=self.batch_size)
+            BookEdition.objects.bulk_create(
+                new_editions.values(), batch_size=self.batch_size)
+            if new_names:
+                # one field per row: bulk_create would stop at 500 rows
+                with connection.cursor() as cursor:
+                    cursor.executemany(insert_ignore_sql(Author, ["name"]),
+                                       [(name,) for name in new_names])
+                author_ids = dict(Author.objects.values_list("name", "id"))
+
+            # WorkAuthor rows in CSV order, skipping links already present
+            new_links = []
+            for row in rows:
+                work_id = int(row["work_id"])
+                for name in _author_names(row):
+                    key = (work_id, author_ids[name])
+                    if key not in work_author_pairs:
+                        work_author_pairs.add(key)
+                        new_links.append(
+                            WorkAuthor(work_id=key[0], author_id=key[1]))
+            WorkAuthor.objects.bulk_create(new_links, batch_size=self.batch_size)
+
+            if sync:
+                incoming_works, incoming_editions = {}, {}
+                for row in rows:
+                    work_id = int(row["work_id"])
+                    book_id = int(row["book_id"])
+                    incoming_works.setdefault(work_id, _work_fields(row))
+                    incoming_editions.setdefault(
+                        book_id, {"work_id": work_id, **_edition_fields(row)})
+                self.sync_existing(
+                    Work, current_works, incoming_works, SYNC_WORK_FIELDS,
+                    inserted=len(new_works))
+                self.sync_existing(
+                    BookEdition, current_editions, incoming_editions,
+                    SYNC_EDITION_FIELDS, inserted=len(new_editions))
+                self.move_ratings(current_editions, incoming_editions)
+
+    def move_ratings(self, current, incoming):
+        """
+        Point the ratings of editions that moved to another work at their
+        new work (Rating.work copies the edition's), one UPDATE per new work
+        and chunk. The derived tables of both works, and the raters', are
+        refreshed after the load.
+        """
+        moved = defaultdict(list)
+        for pk, values in incoming.items():
+            if pk in current and current[pk]["work_id"] != values["work_id"]:
+                moved[values["work_id"]].append(pk)
+                self.moved_work_ids.update(
+                    (current[pk]["work_id"], values["work_id"]))
+        for work_id, edition_ids in moved.items():
+            for start in range(0, len(edition_ids), self.batch_size):
+                ratings = Rating.objects.filter(
+                    edition_id__in=edition_ids[start:start + self.batch_size])
+                self.rated_users.update(
+                    ratings.values_list("user_id", flat=True).distinct())
+                ratings.update(work_id=work_id)
+        if moved:
+            self.stdout.write(
+                f"Moved the ratings of {sum(map(len, moved.values())):,} "
+                f"editions to their new works.")
+
+    def sync_existing(self, model, current, incoming, fields, inserted):
+        """
+        Write only the changed fields of rows in both `current` and
+        `incoming` (dicts of id -> field values). Rows are grouped by which
+        fields changed so each bulk_update sets just those columns.
+        """
+        by_fields = defaultdict(list)
+        unchanged = 0
+        for pk, values in incoming.items():
+            if pk not in current:
+                continue
+            changed = _changed_fields(current[pk], values, fields)
+            if not changed:
+                unchanged += 1
+                continue
+            by_fields[changed].append(
+                model(id=pk, **{f: values[f] for f in changed}))
+
+        for changed, objs in by_fields.items():
+            model.objects.bulk_update(
+                objs, [model._meta.get_field(f).name for f in changed],
+                batch_size=self.batch_size)
+
+        updated = sum(len(objs) for objs in by_fields.values())
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural.capitalize()}: {inserted:,} "
+            f"inserted, {updated:,} updated, {unchanged:,} unchanged.")
 
     def load_ratings(self, path):
-        BATCH, BATCH_SIZE = [], 5_000
+        BATCH = []
         seen_pairs = set()
         skipped_duplicates = 0
+        rows = 0
 
         def flush_batch():
             if BATCH:
@@ -113,6 +521,7 @@ class Command(BaseCommand):
 
         with open(path, newline="", encoding="utf-8") as f:
             for row in csv.DictReader(f):
+                rows += 1
                 user_id = int(row["user_id"])
                 edition_id = int(row["book_id"])
                 key = (user_id, edition_id)
@@ -122,6 +531,8 @@ class Command(BaseCommand):
                     continue
 
                 seen_pairs.add(key)
+                self.rated_users.add(user_id)
+                self.rated_editions.add(edition_id)
                 BATCH.append(
                     Rating(
                         user_id=user_id,
@@ -129,8 +540,151 @@ class Command(BaseCommand):
                         rating=int(row["rating"]),
                     )
                 )
-                if len(BATCH) >= BATCH_SIZE:
+                if len(BATCH) >= self.batch_size:
                     flush_batch()
         flush_batch()
         self.stdout.write(
             f"Skipped {skipped_duplicates} duplicate ratings in input file.")
+        return rows
+
+    def load_ratings_streaming(self, path, commit_every, on_conflict,
+                               workers=0, resume=False):
+        """
+        Load ratings without remembering every (user_id, edition_id) pair.
+        Duplicates are dropped within each batch and then by the database via
+        INSERT .. ON CONFLICT on unique_user_edition_rating, so memory stays
+        proportional to --batch-size rather than to the file.
+
+        With workers, parsing runs in a process pool and this process is the
+        only database writer. Batches then arrive out of file order, so when
+        a pair appears more than once which line wins is not defined.
+
+        Otherwise each transaction also records a LoadCheckpoint (file hash
+        and byte offset), so resume can seek past everything already committed.
+        """
+        if on_conflict == "update":
+            conflict = {"update_conflicts": True,
+                        "unique_fields": ["user_id", "edition"],
+                        "update_fields": ["rating"]}
+        else:
+            conflict = {"ignore_conflicts": True}
+
+        before = Rating.objects.count()
+        rows = start = 0
+        self.invalid_rows = 0
+        checkpoint = None
+        if not (workers or self.fast):
+            file_hash = file_digest(path)
+            checkpoint = LoadCheckpoint.objects.filter(
+                file_hash=file_hash).first()
+            if resume and checkpoint:
+                start = checkpoint.offset
+                self.stdout.write(
+                    f"Resuming at byte {start:,} after {checkpoint.rows:,} "
+                    f"rows committed on {checkpoint.updated_at:%Y-%m-%d %H:%M}.")
+            elif resume:
+                self.stdout.write("No checkpoint for this file; starting "
+                                  "from the first row.")
+            if checkpoint is None:
+                checkpoint = LoadCheckpoint(file_hash=file_hash)
+            checkpoint.path = str(path.resolve())
+            checkpoint.offset = start
+            checkpoint.rows = checkpoint.rows if start else 0
+
+        if workers:
+            batches = ((None, batch)
+                       for batch in self.parse_in_workers(path, workers))
+        else:
+            batches = iter_batches(path, self.batch_size, start,
+                                   on_invalid=self.count_invalid_row)
+        while True:
+            committed = 0
+            with transaction.atomic():
+                for offset, batch in itertools.islice(batches, commit_every):
+                    rows += len(batch)
+                    self.track(batch)
+                    if self.fast:
+                        # staged as-is; duplicates fail the final INSERT
+                        with connection.cursor() as cursor:
+                            cursor.executemany(
+                                f"INSERT INTO {FAST_STAGING_TABLE} "
+                                "(user_id, edition_id, rating) VALUES (%s, %s, %s)",
+                                batch)
+                        committed += 1
+                        continue
+                    # one row per pair per INSERT: first wins when ignoring,
+                    # last wins when updating, as the database would decide
+                    pairs = {}
+                    for user_id, edition_id, rating in batch:
+                        key = (user_id, edition_id)
+                        if on_conflict == "update" or key not in pairs:
+                            pairs[key] = rating
+                    Rating.objects.bulk_create(
+                        [Rating(user_id=u, edition_id=e, rating=r)
+                         for (u, e), r in pairs.items()],
+                        batch_size=self.batch_size, **conflict)
+                    committed += 1
+                    if checkpoint is not None:
+                        checkpoint.offset = offset
+                        checkpoint.rows += len(batch)
+                if checkpoint is not None and committed:
+                    # saved in the same transaction as the batches it covers
+                    checkpoint.save()
+            if committed < commit_every:
+                break
+
+        if self.fast:
+            self.stdout.write(f"Staged {rows:,} ratings.")
+            return rows
+        inserted = Rating.objects.count() - before
+        verb = "updated or skipped" if on_conflict == "update" else "skipped"
+        self.stdout.write(
+            f"Inserted {inserted:,} new ratings; {rows - inserted:,} rows "
+            f"{verb} as duplicates of existing ratings.")
+        if self.invalid_rows:
+            self.stderr.write(self.style.WARNING(
+                f"Skipped {self.invalid_rows:,} invalid lines."))
+        return rows
+
+    def count_invalid_row(self, line):
+        self.invalid_rows += 1
+
+    def parse_in_workers(self, path, workers):
+        """
+        Yield rating batches parsed by `workers` processes, one byte range
+        of the file each. The queue is bounded so parsers wait for the
+        writer rather than filling memory.
+        """
+        ctx = multiprocessing.get_context("spawn")
+        batch_queue = ctx.Queue(maxsize=workers * 4)
+        procs = [
+            ctx.Process(target=parse_range, daemon=True,
+                        args=(str(path), start, end, self.batch_size, batch_queue))
+            for start, end in split_ranges(path, workers)
+        ]
+        for proc in procs:
+            proc.start()
+
+        running = len(procs)
+        try:
+            while running:
+                try:
+                    kind, payload = batch_queue.get(timeout=1)
+                except queue.Empty:
+                    if not any(proc.is_alive() for proc in procs):
+                        raise CommandError(
+                            "Ratings parser processes exited unexpectedly")
+                    continue
+                if kind == "batch":
+                    # flattened (user_id, edition_id, rating) triples
+                    yield list(zip(*[iter(payload)] * 3))
+                elif kind == "done":
+                    running -= 1
+                    self.invalid_rows += payload
+                else:
+                    raise CommandError(f"Ratings parser failed: {payload}")
+        finally:
+            for proc in procs:
+                if proc.is_alive():
+                    proc.terminate()
+                proc.join()
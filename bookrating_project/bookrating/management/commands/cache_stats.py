@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from bookrating import response_cache
+
+
+class Command(BaseCommand):
+    help = ("Show the hit and miss counts of the response cache behind "
+            "WorkViewSet's ratings, also_loved and top_rated_by_author")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true",
+            help="Reset the counters after showing them")
+        parser.add_argument(
+            "--clear", action="store_true",
+            help="Invalidate every cached response")
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats()
+        total = stats["hits"] + stats["misses"]
+        rate = stats["hits"] / total * 100 if total else 0
+        self.stdout.write(
+            f"{stats['hits']:,} hits, {stats['misses']:,} misses "
+            f"({rate:.1f}% hit rate)")
+        self.stdout.write(
+            f"Other processes' counts are approximate and may lag by up to "
+            f"{response_cache.FLUSH_EVERY} lookups each.")
+        if options["reset"]:
+            response_cache.reset_stats()
+        if options["clear"]:
+            response_cache.clear()
+            self.stdout.write(self.style.SUCCESS("Cleared the response cache."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bookrating import rating_stats
+
+
+class Command(BaseCommand):
+    help = ("Compare the per-work rating histograms in WorkRatingStats with "
+            "counts taken from the Rating table")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true",
+            help="Rebuild the table from Rating if anything differs")
+        parser.add_argument(
+            "--show", type=int, default=10,
+            help="Mismatched works to list (default 10)")
+
+    def handle(self, *args, **options):
+        problems = rating_stats.mismatches()
+        if not problems:
+            self.stdout.write(self.style.SUCCESS(
+                "WorkRatingStats matches the Rating table."))
+            return
+
+        for work_id, stored, actual in problems[:options["show"]]:
+            self.stdout.write(
+                f"Work {work_id}: stored {stored}, actual {actual}")
+        if options["fix"]:
+            rebuilt = rating_stats.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(problems):,} works differed; rebuilt {rebuilt:,} "
+                f"histograms from Rating."))
+        else:
+            raise CommandError(
+                f"{len(problems):,} works differ from the Rating table; "
+                f"run with --fix to rebuild.")
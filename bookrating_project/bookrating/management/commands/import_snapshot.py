@@ -0,0 +1,90 @@
+import time
+from pathlib import Path
+
+import numpy as np
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from bookrating import derived
+from bookrating.bulk_sql import insert_ignore_sql
+from bookrating.models import BookEdition, Rating
+from bookrating.snapshots import read_snapshot
+
+# rows per executemany call
+BATCH_SIZE = 50_000
+
+
+def _work_of(edition_ids, ids, works):
+    """
+    The work of each of `edition_ids`, found by binary search in the sorted
+    edition `ids` and their `works`; -1 where an id is not among them.
+    """
+    if not len(ids):
+        return np.full(len(edition_ids), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(ids, edition_ids), len(ids) - 1)
+    return np.where(ids[pos] == edition_ids, works[pos], -1)
+
+
+class Command(BaseCommand):
+    help = ("Load ratings from a snapshot written by export_snapshot. "
+            "Pairs already rated in the database are left as they are.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", type=Path,
+                            help="Snapshot directory holding manifest.json")
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE,
+            help=f"Rows per INSERT batch (default {BATCH_SIZE})")
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+        try:
+            manifest, columns = read_snapshot(directory)
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Cannot read snapshot in {directory}: {e}")
+
+        start = time.perf_counter()
+        before = Rating.objects.count()
+        rows = manifest["rows"]
+        # the columns are memory-mapped, so only one batch is ever in memory;
+        # rows go through executemany rather than model instances, which
+        # would cost more than reading the snapshot itself
+        # Rating.work is looked up from the edition in the sorted edition
+        # ids, so memory follows the number of editions, not the largest id
+        editions = np.array(list(BookEdition.objects.order_by("id")
+                                 .values_list("id", "work_id")),
+                            dtype=np.int64).reshape(-1, 2)
+        ids, works = editions[:, 0], editions[:, 1]
+        unknown = set()
+        for pos in range(0, rows, batch_size):
+            edition_ids = columns["edition_id"][pos:pos + batch_size]
+            unknown.update(
+                edition_ids[_work_of(edition_ids, ids, works) < 0].tolist())
+        if unknown:
+            listed = ", ".join(map(str, sorted(unknown)[:10]))
+            raise CommandError(
+                f"The snapshot rates {len(unknown):,} editions missing from "
+                f"the database (e.g. {listed}); load the books first.")
+        sql = insert_ignore_sql(Rating, ["user_id", "edition", "work", "rating"])
+        with transaction.atomic(), connection.cursor() as cursor:
+            for pos in range(0, rows, batch_size):
+                edition_ids = columns["edition_id"][pos:pos + batch_size]
+                cursor.executemany(sql, zip(
+                    columns["user_id"][pos:pos + batch_size].tolist(),
+                    edition_ids.tolist(),
+                    _work_of(edition_ids, ids, works).tolist(),
+                    columns["rating"][pos:pos + batch_size].tolist()))
+
+        # raw inserts bypass the Rating signals, so rebuild what they maintain
+        derived.rebuild_all()
+
+        elapsed = time.perf_counter() - start
+        inserted = Rating.objects.count() - before
+        rate = rows / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {inserted:,} of {rows:,} snapshot ratings "
+            f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)."))
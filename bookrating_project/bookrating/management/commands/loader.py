@@ -0,0 +1,133 @@
+import argparse
+import csv
+import itertools
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.core.management.color import no_style
+from django.db import connection
+
+from bookrating.management.commands.bulk_load import (
+    BATCH_SIZE, Command as BulkLoadCommand)
+from bookrating.models import (Work, BookEdition, Author, WorkAuthor, Rating,
+                               LoadCheckpoint, WorkCoLove, WorkMinHash,
+                               WorkLshBucket, UserNeighbour, StaleRater,
+                               WorkRatingStats, RatingChange,
+                               AggregateWatermark)
+from bookrating.ratings_csv import iter_batches
+
+# Loads books, editions, authors and ratings from
+# goodbooks-10k CSVs into a normalised Django database schema.
+# Tags excluded due to data restriction
+
+DATA_DIR = Path(settings.BASE_DIR).parent / "goodbooks-10k-filtered"
+
+# children before parents, so the flush never orphans a foreign key
+RESET_MODELS = [WorkCoLove, WorkLshBucket, WorkMinHash, UserNeighbour,
+                StaleRater, WorkRatingStats, RatingChange, AggregateWatermark,
+                Rating, WorkAuthor, Author, BookEdition, Work, LoadCheckpoint]
+
+
+def reset_tables():
+    """
+    Empty the RESET_MODELS tables with the backend's flush SQL (DELETE on
+    SQLite, TRUNCATE elsewhere) rather than Model.delete(), which would load
+    every related row into Python to emulate cascades.
+    """
+    tables = [model._meta.db_table for model in RESET_MODELS]
+    sql_list = connection.ops.sql_flush(
+        no_style(), tables, reset_sequences=True)
+    connection.ops.execute_sql_flush(sql_list)
+
+
+class Command(BulkLoadCommand):
+    help = ("Load the goodbooks-10k CSVs for development, clearing all book "
+            "and rating data first unless --no-reset is given")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--data-dir", type=Path, default=DATA_DIR,
+            help=f"Directory holding the CSV files (default {DATA_DIR})")
+        parser.add_argument(
+            "--books-file", default="filtered_books.csv",
+            help="Books CSV inside --data-dir")
+        parser.add_argument(
+            "--ratings-file", default="filtered_ratings.csv",
+            help="Ratings CSV inside --data-dir")
+        # fyi 6mm ratings on unfiltered dataset ...
+        parser.add_argument(
+            "--limit-books", type=int, default=None,
+            help="Import only the first N rows of the books file, and only "
+                 "ratings of those editions")
+        # resetting is the default, as it always was; --no-reset loads on
+        # top of the existing data and refreshes only what it touched
+        parser.add_argument(
+            "--reset", action=argparse.BooleanOptionalAction, default=True,
+            help="Empty the book and rating tables and reset their id "
+                 "sequences before loading (default); --no-reset keeps them")
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE,
+            help=f"Rows per bulk_create call (default {BATCH_SIZE})")
+
+    def handle(self, *args, **options):
+        books_path = options["data_dir"] / options["books_file"]
+        ratings_path = options["data_dir"] / options["ratings_file"]
+        for path in (books_path, ratings_path):
+            if not path.exists():
+                raise CommandError(f"File not found: {path}")
+        if options["limit_books"] is not None and options["limit_books"] < 1:
+            raise CommandError("--limit-books must be positive")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        self.batch_size = options["batch_size"]
+        self.fast = False
+        # a reset load writes every row of the derived tables anyway
+        self.full_refresh = options["reset"]
+        self.start_tracking()
+
+        if options["reset"]:
+            self.stdout.write("Clearing existing data...")
+            reset_tables()
+
+        with open(books_path, newline="", encoding="utf-8") as f:
+            rows = list(itertools.islice(
+                csv.DictReader(f), options["limit_books"]))
+        self.load_book_rows(rows)
+        self.stdout.write(
+            f"Loaded {len(rows):,} books, with their authors and editions.")
+
+        kept_edition_ids = {int(row["book_id"]) for row in rows}
+        self.load_ratings_subset(ratings_path, kept_edition_ids)
+        self.refresh_derived_tables()
+        self.stdout.write(self.style.SUCCESS("Done!"))
+
+    def load_ratings_subset(self, path, kept_edition_ids):
+        # duplicates are left to the unique_user_edition_rating constraint
+        # (ignore_conflicts) so memory stays flat on the full file
+        rows_read = 0
+        invalid_lines = 0
+
+        def count_invalid(line):
+            nonlocal invalid_lines
+            invalid_lines += 1
+
+        before = Rating.objects.count()
+        for _, batch in iter_batches(path, self.batch_size,
+                                     on_invalid=count_invalid):
+            rows_read += len(batch)
+            # skip ratings outside subset
+            kept = [row for row in batch if row[1] in kept_edition_ids]
+            self.track(kept)
+            Rating.objects.bulk_create(
+                [Rating(user_id=user_id, edition_id=edition_id, rating=rating)
+                 for user_id, edition_id, rating in kept],
+                ignore_conflicts=True,
+            )
+        loaded = Rating.objects.count() - before
+        self.stdout.write(
+            f"Loaded {loaded:,} ratings; skipped {rows_read - loaded:,} "
+            f"duplicate or out-of-subset ratings.")
+        if invalid_lines:
+            self.stderr.write(self.style.WARNING(
+                f"Skipped {invalid_lines:,} invalid lines."))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookrating import colove, response_cache
+
+
+class Command(BaseCommand):
+    help = ("Recompute the precomputed also-loved table (pairs of works "
+            "both rated 5 stars by the same users) from all ratings")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        pairs = colove.rebuild()
+        response_cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {pairs:,} also-loved pairs in "
+            f"{time.perf_counter() - start:.1f}s."))
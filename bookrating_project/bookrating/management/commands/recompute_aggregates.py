@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookrating import aggregates
+
+
+class Command(BaseCommand):
+    help = ("Recompute avg_rating and ratings_count of works and editions "
+            "from the Rating table")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental", action="store_true",
+            help="Only recompute works whose ratings changed since the last "
+                 "run (and their editions)")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["incremental"]:
+            works, editions = aggregates.recompute_changed()
+        else:
+            works, editions = aggregates.recompute()
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {works:,} works and {editions:,} editions in "
+            f"{time.perf_counter() - start:.1f}s."))
@@ -0,0 +1,171 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from bookrating import derived
+from bookrating.bulk_sql import insert_ignore_sql
+from bookrating.management.commands.loader import reset_tables
+from bookrating.models import Work, BookEdition, Author, WorkAuthor, Rating
+
+# rows per executemany / bulk_create call
+BATCH_SIZE = 50_000
+
+# share of 1..5 star ratings, roughly as in goodbooks-10k
+RATING_VALUES = np.array([1, 2, 3, 4, 5])
+RATING_WEIGHTS = np.array([0.02, 0.07, 0.23, 0.36, 0.32])
+
+
+def power_law_weights(n, exponent, rng):
+    """
+    Zipf-like probabilities for n items (rank k gets weight 1 / k**exponent),
+    assigned to the items in a random order so popularity is not tied to id.
+    """
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+
+def sample_unique_pairs(rng, count, user_p, edition_p):
+    """
+    Draw `count` distinct (user index, edition index) pairs, users and
+    editions each picked with the given popularity weights. Pairs come back
+    sorted by user then edition, which keeps index inserts sequential.
+    """
+    n_editions = len(edition_p)
+    keys = np.empty(0, dtype=np.int64)
+    while len(keys) < count:
+        # oversample a little to cover pairs lost to de-duplication
+        draw = int((count - len(keys)) * 1.1) + 1
+        users = rng.choice(len(user_p), size=draw, p=user_p)
+        editions = rng.choice(n_editions, size=draw, p=edition_p)
+        keys = np.unique(np.concatenate(
+            [keys, users.astype(np.int64) * n_editions + editions]))
+    keys = keys[np.sort(rng.choice(len(keys), size=count, replace=False))]
+    return keys // n_editions, keys % n_editions
+
+
+class Command(BaseCommand):
+    help = ("Fill an empty database with a reproducible goodbooks-scale "
+            "synthetic catalogue and power-law distributed ratings")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--works", type=int, default=10_000)
+        parser.add_argument("--editions-per-work", type=int, default=1)
+        parser.add_argument("--authors", type=int, default=5_000)
+        parser.add_argument("--users", type=int, default=53_424)
+        parser.add_argument("--ratings", type=int, default=6_000_000)
+        # the defaults roughly match goodbooks-10k: the top edition gets
+        # ~30k of 6M ratings and the median a few hundred, while users
+        # give between ~100 and ~300 ratings each
+        parser.add_argument(
+            "--popularity-exponent", type=float, default=0.5,
+            help="Power-law exponent for edition and author popularity "
+                 "(default 0.5)")
+        parser.add_argument(
+            "--activity-exponent", type=float, default=0.1,
+            help="Power-law exponent for how many ratings each user gives "
+                 "(default 0.1)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--reset", action="store_true",
+            help="Empty the book and rating tables first")
+
+    def handle(self, *args, **options):
+        works = options["works"]
+        editions = works * options["editions_per_work"]
+        users = options["users"]
+        ratings = options["ratings"]
+        if min(works, options["editions_per_work"], options["authors"], users) < 1:
+            raise CommandError(
+                "--works, --editions-per-work, --authors and --users must be positive")
+        if not 0 <= ratings <= users * editions:
+            raise CommandError(
+                f"--ratings must be between 0 and users x editions "
+                f"({users * editions:,})")
+
+        if options["reset"]:
+            reset_tables()
+        elif Work.objects.exists() or Author.objects.exists():
+            raise CommandError(
+                "The database already holds books; pass --reset to replace them")
+
+        start = time.perf_counter()
+        rng = np.random.default_rng(options["seed"])
+
+        # ratings first, so the catalogue aggregates can be derived from them
+        user_idx, edition_idx = sample_unique_pairs(
+            rng, ratings,
+            power_law_weights(users, options["activity_exponent"], rng),
+            power_law_weights(editions, options["popularity_exponent"], rng))
+        values = rng.choice(RATING_VALUES, size=ratings, p=RATING_WEIGHTS)
+        user_ids = user_idx + 1
+        edition_ids = edition_idx + 1
+        # edition e belongs to work (e - 1) // editions_per_work + 1
+        edition_work = np.arange(editions) // options["editions_per_work"] + 1
+
+        with transaction.atomic():
+            self.create_catalogue(rng, options, edition_work, edition_idx, values)
+            sql = insert_ignore_sql(
+                Rating, ["user_id", "edition", "work", "rating"])
+            work_ids = edition_work[edition_idx]
+            with connection.cursor() as cursor:
+                for pos in range(0, ratings, BATCH_SIZE):
+                    end = pos + BATCH_SIZE
+                    cursor.executemany(sql, zip(
+                        user_ids[pos:end].tolist(),
+                        edition_ids[pos:end].tolist(),
+                        work_ids[pos:end].tolist(),
+                        values[pos:end].tolist()))
+            derived.rebuild_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {works:,} works, {editions:,} editions, "
+            f"{options['authors']:,} authors and {ratings:,} ratings from "
+            f"{users:,} users in {time.perf_counter() - start:.1f}s "
+            f"(seed {options['seed']})."))
+
+    def create_catalogue(self, rng, options, edition_work, edition_idx, values):
+        works = options["works"]
+        editions = len(edition_work)
+
+        # per-edition and per-work counts and averages of the sampled ratings
+        ed_count = np.bincount(edition_idx, minlength=editions)
+        ed_sum = np.bincount(edition_idx, weights=values, minlength=editions)
+        work_count = np.bincount(edition_work - 1, weights=ed_count,
+                                 minlength=works).astype(np.int64)
+        work_sum = np.bincount(edition_work - 1, weights=ed_sum,
+                               minlength=works)
+        ed_avg = np.round(ed_sum / np.maximum(ed_count, 1), 2)
+        work_avg = np.round(work_sum / np.maximum(work_count, 1), 2)
+        years = rng.integers(1850, 2018, size=works)
+
+        Work.objects.bulk_create(
+            [Work(id=i + 1, title=f"Synthetic Work {i + 1}",
+                  original_year=int(years[i]), avg_rating=float(work_avg[i]),
+                  ratings_count=int(work_count[i]))
+             for i in range(works)],
+            batch_size=BATCH_SIZE)
+        BookEdition.objects.bulk_create(
+            [BookEdition(id=i + 1, work_id=int(edition_work[i]),
+                         language_code="eng", ratings_count=int(ed_count[i]),
+                         avg_rating=float(ed_avg[i]))
+             for i in range(editions)],
+            batch_size=BATCH_SIZE)
+
+        # prolific authors write many works; about 1 in 10 works has a co-author
+        authors = options["authors"]
+        Author.objects.bulk_create(
+            [Author(id=i + 1, name=f"Synthetic Author {i + 1}")
+             for i in range(authors)],
+            batch_size=BATCH_SIZE)
+        author_p = power_law_weights(
+            authors, options["popularity_exponent"], rng)
+        first = rng.choice(authors, size=works, p=author_p) + 1
+        second = rng.choice(authors, size=works, p=author_p) + 1
+        co_written = rng.random(works) < 0.1
+        links = {(w + 1, int(first[w])) for w in range(works)}
+        links |= {(w + 1, int(second[w])) for w in np.flatnonzero(co_written)}
+        WorkAuthor.objects.bulk_create(
+            [WorkAuthor(work_id=w, author_id=a) for w, a in sorted(links)],
+            batch_size=BATCH_SIZE)
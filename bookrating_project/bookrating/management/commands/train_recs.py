@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookrating.recommender import (ALS, artifact_dir, save_artifact,
+                                    train_als, user_work_matrix)
+
+
+class Command(BaseCommand):
+    help = ("Train the matrix-factorization model behind "
+            "/api/users/<user_id>/recommendations/ with alternating least "
+            "squares over all ratings")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--factors", type=int, default=32,
+                            help="Latent factors per user and work (default 32)")
+        parser.add_argument("--iterations", type=int, default=10,
+                            help="ALS sweeps (default 10)")
+        parser.add_argument("--reg", type=float, default=0.05,
+                            help="Regularisation weight (default 0.05)")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options["factors"] < 1 or options["iterations"] < 1:
+            raise CommandError("--factors and --iterations must be positive")
+        if options["reg"] <= 0:
+            raise CommandError("--reg must be positive")
+
+        start = time.perf_counter()
+        matrix, user_ids, work_ids = user_work_matrix()
+        if not matrix.nnz:
+            raise CommandError("There are no ratings to train on")
+        self.stdout.write(
+            f"Built a {matrix.shape[0]:,} x {matrix.shape[1]:,} matrix with "
+            f"{matrix.nnz:,} ratings in {time.perf_counter() - start:.1f}s.")
+
+        start = time.perf_counter()
+        rmse = []
+
+        def progress(iteration, error):
+            rmse.append(error)
+            self.stdout.write(
+                f"Iteration {iteration}: training RMSE {error:.4f} "
+                f"({time.perf_counter() - start:.1f}s)")
+
+        user_factors, item_factors, mean = train_als(
+            matrix, options["factors"], options["iterations"], options["reg"],
+            options["seed"], progress)
+        save_artifact(ALS, {
+            "user_ids": user_ids,
+            "work_ids": work_ids,
+            "user_factors": user_factors,
+            "item_factors": item_factors,
+        }, mean=mean, factors=options["factors"],
+            iterations=options["iterations"], reg=options["reg"],
+            ratings=matrix.nnz, rmse=round(rmse[-1], 4))
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved the model to {artifact_dir(ALS)} "
+            f"({time.perf_counter() - start:.1f}s)."))
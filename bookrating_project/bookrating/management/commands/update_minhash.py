@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookrating import minhash, response_cache
+
+
+class Command(BaseCommand):
+    help = ("Recompute the MinHash signatures and LSH index behind "
+            "also_loved?approx=1 for works whose 5-star fans changed")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Recompute every work instead of only the stale ones")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["full"]:
+            done = f"Rebuilt {minhash.rebuild():,} signatures"
+        else:
+            done = f"Recomputed {minhash.refresh_stale():,} stale signatures"
+        response_cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"{done} in {time.perf_counter() - start:.1f}s."))
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_colove(apps, schema_editor):
+    # existing databases already hold ratings; count their fan pairs once
+    # here, as bookrating.colove.rebuild does (Rating has no work column
+    # yet, so fans are found through the edition)
+    Rating = apps.get_model("bookrating", "Rating")
+    BookEdition = apps.get_model("bookrating", "BookEdition")
+    WorkCoLove = apps.get_model("bookrating", "WorkCoLove")
+    qn = schema_editor.connection.ops.quote_name
+    fans = qn("colove_fans")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {fans}")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {fans} AS "
+            f"SELECT DISTINCT r.user_id, e.work_id "
+            f"FROM {qn(Rating._meta.db_table)} r "
+            f"JOIN {qn(BookEdition._meta.db_table)} e ON e.id = r.edition_id "
+            f"WHERE r.rating = 5")
+        cursor.execute(
+            f"CREATE INDEX {qn('colove_fans_user')} ON {fans} (user_id, work_id)")
+        cursor.execute(
+            f"INSERT INTO {qn(WorkCoLove._meta.db_table)} "
+            f"(work_id, other_work_id, five_star_count) "
+            f"SELECT a.work_id, b.work_id, COUNT(*) "
+            f"FROM {fans} a JOIN {fans} b "
+            f"ON b.user_id = a.user_id AND b.work_id <> a.work_id "
+            f"GROUP BY a.work_id, b.work_id")
+        cursor.execute(f"DROP TABLE {fans}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0003_loadcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkCoLove',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('five_star_count', models.PositiveIntegerField()),
+                ('other_work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='bookrating.work')),
+                ('work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_loved', to='bookrating.work')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('work', 'other_work'), name='unique_work_colove')],
+            },
+        ),
+        migrations.RunPython(fill_colove, migrations.RunPython.noop),
+    ]
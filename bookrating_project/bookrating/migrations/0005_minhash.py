@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:38
+
+import django.db.models.deletion
+import numpy as np
+from django.db import migrations, models
+
+from bookrating.minhash import BANDS, band_keys, signatures
+
+
+def fill_signatures(apps, schema_editor):
+    # existing databases already hold ratings; sign every work's fans once
+    # here, as bookrating.minhash.rebuild does (Rating has no work column
+    # yet, so fans are found through the edition)
+    Rating = apps.get_model("bookrating", "Rating")
+    WorkMinHash = apps.get_model("bookrating", "WorkMinHash")
+    WorkLshBucket = apps.get_model("bookrating", "WorkLshBucket")
+    pairs = np.array(list(Rating.objects.filter(rating=5).order_by()
+                          .values_list("edition__work_id", "user_id")),
+                     dtype=np.int64).reshape(-1, 2)
+    # sorted by work, then user; a fan of two editions counts once
+    keys = np.unique((pairs[:, 0] << 32) | pairs[:, 1])
+    work_of, user_of = keys >> 32, keys & 0xFFFFFFFF
+    works, sigs = signatures(work_of, user_of)
+    fan_counts = np.bincount(np.searchsorted(works, work_of),
+                             minlength=len(works))
+    WorkMinHash.objects.bulk_create(
+        [WorkMinHash(work_id=int(work), signature=sig.tobytes(),
+                     fans=int(count))
+         for work, sig, count in zip(works, sigs, fan_counts)],
+        batch_size=5_000)
+    WorkLshBucket.objects.bulk_create(
+        [WorkLshBucket(work_id=work, key=key) for work, key in zip(
+            np.repeat(works, BANDS).tolist(), band_keys(sigs).ravel().tolist())],
+        batch_size=5_000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0004_workcolove'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkMinHash',
+            fields=[
+                ('work', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='minhash', serialize=False, to='bookrating.work')),
+                ('signature', models.BinaryField()),
+                ('fans', models.PositiveIntegerField()),
+                ('stale', models.BooleanField(db_index=True, default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkLshBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='bookrating.work')),
+            ],
+        ),
+        migrations.RunPython(fill_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0005_minhash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleRater',
+            fields=[
+                ('user_id', models.IntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('neighbour_id', models.IntegerField()),
+                ('metric', models.CharField(choices=[('cosine', 'Cosine'), ('pearson', 'Pearson')], max_length=7)),
+                ('score', models.FloatField()),
+                ('common', models.PositiveIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'metric', '-score'], name='user_neighbour_lookup')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_stats(apps, schema_editor):
+    # existing databases already hold ratings; count them once here
+    Rating = apps.get_model("bookrating", "Rating")
+    WorkRatingStats = apps.get_model("bookrating", "WorkRatingStats")
+    rows = (Rating.objects.order_by()
+            .values_list("edition__work_id")
+            .annotate(**{f"count_{value}": Count("id", filter=Q(rating=value))
+                         for value in range(6)}, rating_sum=Sum("rating")))
+    WorkRatingStats.objects.bulk_create(
+        [WorkRatingStats(work_id=row[0], rating_sum=row[7],
+                         **{f"count_{value}": row[1 + value]
+                            for value in range(6)})
+         for row in rows],
+        batch_size=5_000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0006_user_neighbours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkRatingStats',
+            fields=[
+                ('work', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='bookrating.work')),
+                ('count_0', models.PositiveIntegerField(default=0)),
+                ('count_1', models.PositiveIntegerField(default=0)),
+                ('count_2', models.PositiveIntegerField(default=0)),
+                ('count_3', models.PositiveIntegerField(default=0)),
+                ('count_4', models.PositiveIntegerField(default=0)),
+                ('count_5', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
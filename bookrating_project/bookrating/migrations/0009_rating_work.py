@@ -0,0 +1,18 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0008_aggregate_watermark'),
+    ]
+
+    operations = [
+        # nullable until 0010 has filled it in
+        migrations.AddField(
+            model_name='rating',
+            name='work',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='bookrating.work'),
+        ),
+    ]
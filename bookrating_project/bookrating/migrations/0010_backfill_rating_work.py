@@ -0,0 +1,33 @@
+from django.db import migrations, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+# ratings updated per transaction
+CHUNK_SIZE = 100_000
+
+
+def backfill_work(apps, schema_editor):
+    # one short transaction per id range, so a large table is never locked
+    # for the whole backfill; rows already filled in are skipped, so an
+    # interrupted run can simply be restarted
+    Rating = apps.get_model("bookrating", "Rating")
+    BookEdition = apps.get_model("bookrating", "BookEdition")
+    work = Subquery(BookEdition.objects.filter(pk=OuterRef("edition_id"))
+                    .values("work_id")[:1])
+    last = Rating.objects.aggregate(last=Max("id"))["last"] or 0
+    for start in range(0, last, CHUNK_SIZE):
+        with transaction.atomic():
+            Rating.objects.filter(
+                id__gt=start, id__lte=start + CHUNK_SIZE, work__isnull=True,
+            ).update(work=work)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('bookrating', '0009_rating_work'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_work, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0010_backfill_rating_work'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rating',
+            name='work',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='bookrating.work'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['work', 'rating', 'user_id'], name='rating_work_lookup'),
+        ),
+    ]
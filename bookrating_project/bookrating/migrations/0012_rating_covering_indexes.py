@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0011_rating_work_not_null'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rating',
+            name='edition',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='bookrating.bookedition'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['rating', 'user_id', 'work'], name='rating_fans'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['edition', 'rating'], name='rating_edition_values'),
+        ),
+    ]
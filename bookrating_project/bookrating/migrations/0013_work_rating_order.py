@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0012_rating_covering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='work',
+            index=models.Index(fields=['-avg_rating', 'id'], name='work_rating_order'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0013_work_rating_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='work',
+            name='modified_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='work',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
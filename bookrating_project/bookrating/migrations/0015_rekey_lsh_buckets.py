@@ -0,0 +1,34 @@
+import numpy as np
+from django.db import migrations
+
+from bookrating.minhash import BANDS, band_keys
+
+
+def rekey_buckets(apps, schema_editor):
+    # the band split changed, so every stored key is stale; the signatures
+    # themselves are unchanged and give the new keys directly
+    WorkMinHash = apps.get_model("bookrating", "WorkMinHash")
+    WorkLshBucket = apps.get_model("bookrating", "WorkLshBucket")
+    rows = list(WorkMinHash.objects.exclude(signature=b"")
+                .values_list("work_id", "signature"))
+    WorkLshBucket.objects.all().delete()
+    if not rows:
+        return
+    works = [work_id for work_id, _ in rows]
+    sigs = np.stack([np.frombuffer(bytes(sig), dtype=np.uint32)
+                     for _, sig in rows])
+    WorkLshBucket.objects.bulk_create(
+        [WorkLshBucket(work_id=work, key=key) for work, key in zip(
+            np.repeat(works, BANDS).tolist(), band_keys(sigs).ravel().tolist())],
+        batch_size=5_000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookrating', '0014_work_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_buckets, migrations.RunPython.noop),
+    ]
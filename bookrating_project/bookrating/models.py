@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # Work id corresponds to goodbooks work_id
 # work_id refers to the book (regardless of edition/version)
@@ -12,6 +13,24 @@ class Work(models.Model):
     original_year = models.IntegerField(null=True, blank=True)
     avg_rating = models.DecimalField(max_digits=3, decimal_places=2)
     ratings_count = models.PositiveIntegerField()
+    # bumped whenever the work, its editions, authors or ratings change
+    # (see bookrating.stamps); the ETag and Last-Modified of its views
+    version = models.PositiveIntegerField(default=0, editable=False)
+    modified_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        # the order of the works list, so each of its pages is a range read
+        indexes = [
+            models.Index(fields=["-avg_rating", "id"], name="work_rating_order")
+        ]
+
+    def save(self, *args, **kwargs):
+        self.version += 1
+        self.modified_at = timezone.now()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"],
+                                       "version", "modified_at"}
+        super().save(*args, **kwargs)
 
 # BookEdition id corresponds to book_id in goodbooks
 # Book edition holds data for each separate version of a book
@@ -48,14 +67,172 @@ class Author(models.Model):
     name = models.CharField(max_length=255, unique=True)
 
 
+# Rating.work copies edition.work, so per-work queries on Rating need no
+# join to BookEdition. save() sets it, and so does bulk_create for rows
+# that leave it out; raw SQL inserts must fill it themselves.
+
+
+class RatingQuerySet(models.QuerySet):
+    # edition ids looked up per query when filling in work
+    WORK_LOOKUP_CHUNK = 10_000
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        missing = sorted({obj.edition_id for obj in objs if obj.work_id is None})
+        work_of = {}
+        for start in range(0, len(missing), self.WORK_LOOKUP_CHUNK):
+            work_of.update(BookEdition.objects.filter(
+                pk__in=missing[start:start + self.WORK_LOOKUP_CHUNK])
+                .values_list("id", "work_id"))
+        for obj in objs:
+            if obj.work_id is None:
+                obj.work_id = work_of.get(obj.edition_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Rating(models.Model):
     user_id = models.IntegerField()
-    edition = models.ForeignKey(BookEdition, on_delete=models.CASCADE)
+    # rating_edition_values and rating_work_lookup lead with these two
+    # foreign keys, so neither needs an index of its own
+    edition = models.ForeignKey(BookEdition, on_delete=models.CASCADE,
+                                db_index=False)
+    work = models.ForeignKey(Work, on_delete=models.CASCADE,
+                             related_name="ratings", editable=False,
+                             db_index=False)
     rating = models.PositiveSmallIntegerField()
 
+    objects = RatingQuerySet.as_manager()
+
     class Meta:
         # only one rating per user per edition
         constraints = [
             models.UniqueConstraint(
                 fields=["user_id", "edition"], name="unique_user_edition_rating")
         ]
+        # covering indexes: per-work fans and histograms; every 5-star
+        # rating, and one user's, for the also-loved and MinHash tables;
+        # per-edition histograms
+        indexes = [
+            models.Index(fields=["work", "rating", "user_id"],
+                         name="rating_work_lookup"),
+            models.Index(fields=["rating", "user_id", "work"],
+                         name="rating_fans"),
+            models.Index(fields=["edition", "rating"],
+                         name="rating_edition_values"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.work_id = self.edition.work_id
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "work"}
+        super().save(*args, **kwargs)
+
+# Progress of bulk_load --stream through a ratings file, so an interrupted
+# load can --resume from the last committed batch.
+
+
+class LoadCheckpoint(models.Model):
+    file_hash = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=1024)
+    offset = models.BigIntegerField()
+    rows = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+# Precomputed also-loved pairs: five_star_count is the number of users who
+# gave 5 stars to both works (to any of their editions). Stored in both
+# directions so WorkViewSet.also_loved is a single lookup by work.
+# Rebuilt by the rebuild_also_loved command and kept up to date on Rating
+# saves and deletes by bookrating.signals.
+
+
+class WorkCoLove(models.Model):
+    work = models.ForeignKey(Work, on_delete=models.CASCADE,
+                             related_name="co_loved")
+    other_work = models.ForeignKey(Work, on_delete=models.CASCADE,
+                                   related_name="+")
+    five_star_count = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["work", "other_work"], name="unique_work_colove")
+        ]
+
+# MinHash signatures of each work's set of 5-star fans, for approximate
+# also_loved (?approx=1). stale marks works whose fans changed since the
+# signature was computed; update_minhash recomputes them.
+
+
+class WorkMinHash(models.Model):
+    work = models.OneToOneField(Work, on_delete=models.CASCADE,
+                                primary_key=True, related_name="minhash")
+    signature = models.BinaryField()
+    fans = models.PositiveIntegerField()
+    stale = models.BooleanField(default=False, db_index=True)
+
+
+# LSH index over the signatures: one row per band of each signature, keyed
+# by a hash of the band, so works sharing a key are candidate neighbours.
+
+
+class WorkLshBucket(models.Model):
+    work = models.ForeignKey(Work, on_delete=models.CASCADE, related_name="+")
+    key = models.BigIntegerField(db_index=True)
+
+# "Readers like you": each user's most similar raters by cosine and by
+# Pearson correlation, built by build_neighbours. StaleRater lists users
+# whose ratings changed since their neighbours were computed.
+
+
+class UserNeighbour(models.Model):
+    METRICS = [("cosine", "Cosine"), ("pearson", "Pearson")]
+
+    user_id = models.IntegerField()
+    neighbour_id = models.IntegerField()
+    metric = models.CharField(max_length=7, choices=METRICS)
+    score = models.FloatField()
+    common = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "metric", "-score"],
+                         name="user_neighbour_lookup")
+        ]
+
+
+class StaleRater(models.Model):
+    user_id = models.IntegerField(primary_key=True)
+
+# Per-work histogram of ratings across all editions, so
+# WorkViewSet.ratings is a primary-key lookup. Kept up to date on Rating
+# saves and deletes by bookrating.signals and rebuilt by the bulk loaders;
+# check_rating_stats compares it with the Rating table.
+
+
+class WorkRatingStats(models.Model):
+    work = models.OneToOneField(Work, on_delete=models.CASCADE,
+                                primary_key=True, related_name="rating_stats")
+    count_0 = models.PositiveIntegerField(default=0)
+    count_1 = models.PositiveIntegerField(default=0)
+    count_2 = models.PositiveIntegerField(default=0)
+    count_3 = models.PositiveIntegerField(default=0)
+    count_4 = models.PositiveIntegerField(default=0)
+    count_5 = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveBigIntegerField(default=0)
+
+    def counts(self):
+        return [getattr(self, f"count_{value}") for value in range(6)]
+
+# Works whose ratings were saved or deleted, appended by bookrating.signals.
+# recompute_aggregates --incremental refreshes the avg_rating and
+# ratings_count of the works (and their editions) logged after
+# AggregateWatermark, then moves the watermark and prunes the log up to it.
+
+
+class RatingChange(models.Model):
+    work_id = models.IntegerField()
+
+
+class AggregateWatermark(models.Model):
+    last_change_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
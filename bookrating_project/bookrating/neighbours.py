@@ -0,0 +1,139 @@
+# Precomputed user-user neighbours ("readers like you"). For a user u, one
+# sparse product of their ratings row with the works x users matrix gives,
+# for every other user v, the number of co-rated works and the dot products
+# of the raw and of the mean-centred ratings over them:
+#   cosine(u, v)  = sum r_u r_v / (|r_u| |r_v|)
+#   pearson(u, v) = sum (r_u - mean_u)(r_v - mean_v) / (|r_u - mean_u| |r_v - mean_v|)
+# (the second is Pearson correlation with each user's mean over all their
+# ratings). Users sharing fewer than min_common works are not neighbours.
+
+import numpy as np
+from django.db import connection, transaction
+
+from bookrating.bulk_sql import insert_ignore_sql
+from bookrating.models import Rating, StaleRater, UserNeighbour
+from bookrating.recommender import CsrMatrix, user_work_matrix
+
+METRICS = ("cosine", "pearson")
+
+# neighbour rows written per executemany call
+BATCH_SIZE = 50_000
+
+
+class NeighbourModel:
+    """Per-user scoring over a users x works rating matrix."""
+
+    def __init__(self, matrix, user_ids):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        counts = np.diff(matrix.indptr)
+        rows = np.repeat(np.arange(matrix.shape[0]), counts)
+        means = (np.bincount(rows, weights=matrix.data, minlength=matrix.shape[0])
+                 / np.maximum(counts, 1))
+        self.raw = matrix.data.astype(np.float64)
+        self.centred = self.raw - means[rows]
+        self.norms = np.sqrt(np.bincount(
+            rows, weights=self.raw ** 2, minlength=matrix.shape[0]))
+        self.centred_norms = np.sqrt(np.bincount(
+            rows, weights=self.centred ** 2, minlength=matrix.shape[0]))
+        # works x users, holding each entry's position in `matrix` so both
+        # the raw and the centred values can be looked up
+        positions = CsrMatrix(matrix.indptr, matrix.indices,
+                              np.arange(matrix.nnz), matrix.shape)
+        self.by_work = positions.transpose()
+
+    def scores(self, row):
+        """(common, cosine, pearson) of user `row` against every user."""
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        works = self.matrix.indices[start:end]
+        others, positions = self.by_work.gather(works)
+        lengths = self.by_work.indptr[works + 1] - self.by_work.indptr[works]
+        n = self.matrix.shape[0]
+
+        common = np.bincount(others, minlength=n)
+        dot = np.bincount(others, minlength=n, weights=(
+            np.repeat(self.raw[start:end], lengths) * self.raw[positions]))
+        centred_dot = np.bincount(others, minlength=n, weights=(
+            np.repeat(self.centred[start:end], lengths)
+            * self.centred[positions]))
+        common[row] = 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosine = dot / (self.norms[row] * self.norms)
+            pearson = centred_dot / (self.centred_norms[row] * self.centred_norms)
+        return common, np.nan_to_num(cosine), np.nan_to_num(pearson)
+
+    def neighbours(self, row, k, min_common):
+        """{metric: [(neighbour user id, score, common), ...]}, best first."""
+        common, *scores = self.scores(row)
+        eligible = np.flatnonzero(common >= min_common)
+        result = {}
+        for metric, score in zip(METRICS, scores):
+            candidates = eligible
+            if len(candidates) > k:
+                candidates = candidates[
+                    np.argpartition(-score[candidates], k - 1)[:k]]
+            candidates = candidates[np.lexsort(
+                (self.user_ids[candidates], -score[candidates]))]
+            result[metric] = list(zip(self.user_ids[candidates].tolist(),
+                                      score[candidates].tolist(),
+                                      common[candidates].tolist()))
+        return result
+
+
+def build(k=20, min_common=5, stale_only=False, progress=None):
+    """
+    Recompute the neighbour lists of every user, or with stale_only just of
+    the users whose ratings changed since the last build. Other users' lists
+    are not revisited, so a changed user's score in them stays as it was
+    until the next full build. Returns the number of users recomputed.
+    """
+    stale = None
+    if stale_only:
+        stale = set(StaleRater.objects.values_list("user_id", flat=True))
+        if not stale:
+            return 0
+    matrix, user_ids, _ = user_work_matrix()
+    model = NeighbourModel(matrix, user_ids)
+    rows = (np.arange(len(user_ids)) if stale is None
+            else np.flatnonzero(np.isin(user_ids, list(stale))))
+
+    sql = insert_ignore_sql(
+        UserNeighbour, ["user_id", "neighbour_id", "metric", "score", "common"])
+    with transaction.atomic(), connection.cursor() as cursor:
+        if stale is None:
+            UserNeighbour.objects.all().delete()
+            StaleRater.objects.all().delete()
+        else:
+            # users in `stale` that no longer have ratings just lose their rows
+            UserNeighbour.objects.filter(user_id__in=stale).delete()
+            StaleRater.objects.filter(user_id__in=stale).delete()
+        batch = []
+        for done, row in enumerate(rows, start=1):
+            user_id = int(user_ids[row])
+            for metric, found in model.neighbours(row, k, min_common).items():
+                batch += [(user_id, other, metric, score, common)
+                          for other, score, common in found]
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                batch = []
+            if progress and done % 5_000 == 0:
+                progress(done, len(rows))
+        cursor.executemany(sql, batch)
+    return len(rows)
+
+
+def mark_stale(user_ids):
+    StaleRater.objects.bulk_create(
+        [StaleRater(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True)
+
+
+def mark_all_stale():
+    """
+    Flag every rater, e.g. after a bulk load that bypassed the signals;
+    returns how many there are.
+    """
+    user_ids = list(Rating.objects.order_by()
+                    .values_list("user_id", flat=True).distinct())
+    mark_stale(user_ids)
+    return len(user_ids)
@@ -0,0 +1,113 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on an ordering that is unique as a whole. The cursor
+    holds the last row's value of every ordering field and the next page
+    is the range starting right after it, so every page costs one indexed
+    range read and no COUNT(*), however deep it is. (CursorPagination
+    keeps only the first field and skips ties with an OFFSET, which grows
+    with the number of ties and is capped at offset_cutoff.)
+    Items may be model instances, dicts or named rows
+    (values_list(named=True)).
+    """
+    page_size_query_param = "limit"
+    max_page_size = 1000
+    ordering = "id"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        # positions are unique, so the offset of a cursor is always 0
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor else None
+        ordering = (_reverse_ordering(self.ordering) if reverse
+                    else self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.after(ordering, position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = following_position is not None
+            self.next_position = position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = position is not None
+            self.next_position = following_position
+            self.previous_position = position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, ordering, position):
+        """
+        Rows that come after `position` in `ordering`. For (-a, b):
+        a <= x AND (a < x OR (a = x AND b > y)); the first term is a plain
+        range on the leading column, which an index on the ordering uses.
+        """
+        values = json.loads(position)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError(position)
+        fields = [(order.lstrip("-"), "lt" if order.startswith("-") else "gt")
+                  for order in ordering]
+        condition = None
+        for (field, op), value in reversed(list(zip(fields, values))):
+            later = Q(**{f"{field}__{op}": value})
+            condition = later if condition is None else (
+                later | Q(**{field: value}) & condition)
+        if len(fields) > 1:
+            field, op = fields[0]
+            condition &= Q(**{f"{field}__{op}e": values[0]})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip("-")
+            value = (instance[field] if isinstance(instance, dict)
+                     else getattr(instance, field))
+            values.append(str(value))
+        return json.dumps(values)
+
+
+class WorkPagination(KeysetPagination):
+    # best rated first; id breaks the ties between equal averages
+    max_page_size = 100
+    ordering = ("-avg_rating", "id")
+
+
+class AlsoLovedPagination(KeysetPagination):
+    # pages of also_loved rows (WorkCoLove annotated with the other work's
+    # avg_rating); the database sorts and returns only ?limit= rows, and
+    # other_work_id breaks the ties
+    page_size = 20
+    max_page_size = 100
+    ordering = ("-avg_rating", "-five_star_count", "other_work_id")
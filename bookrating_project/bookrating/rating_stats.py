@@ -0,0 +1,96 @@
+# Maintenance of WorkRatingStats, the per-work rating histogram behind
+# WorkViewSet.ratings.
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from bookrating.models import Rating, WorkRatingStats
+
+RATING_VALUES = range(6)
+COUNT_FIELDS = [f"count_{value}" for value in RATING_VALUES]
+
+
+def raw_stats(work_ids=None):
+    """
+    {work_id: (count_0, ..., count_5, rating_sum)} from one GROUP BY, for
+    `work_ids` (every work when None).
+    """
+    ratings = Rating.objects.order_by()
+    if work_ids is not None:
+        ratings = ratings.filter(work_id__in=list(work_ids))
+    rows = (ratings
+            .values_list("work_id")
+            .annotate(**{field: Count("id", filter=Q(rating=value))
+                         for field, value in zip(COUNT_FIELDS, RATING_VALUES)},
+                      rating_sum=Sum("rating")))
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def rebuild(work_ids=None):
+    """
+    Replace the rows of `work_ids` (the whole table when None) with counts
+    from Rating; returns the number of rows written.
+    """
+    stats = raw_stats(work_ids)
+    existing = WorkRatingStats.objects.all()
+    if work_ids is not None:
+        existing = existing.filter(work_id__in=list(work_ids))
+    with transaction.atomic():
+        existing.delete()
+        WorkRatingStats.objects.bulk_create(
+            [WorkRatingStats(work_id=work_id, rating_sum=values[-1],
+                             **dict(zip(COUNT_FIELDS, values)))
+             for work_id, values in stats.items()],
+            batch_size=5_000)
+    return len(stats)
+
+
+def mismatches():
+    """
+    [(work_id, stored, actual), ...] for every work whose stored histogram
+    differs from the Rating table (None where a side has no row).
+    """
+    actual = {work_id: values for work_id, values in raw_stats().items()
+              if any(values[:-1])}
+    stored = {row[0]: tuple(row[1:]) for row in
+              WorkRatingStats.objects.values_list("work_id", *COUNT_FIELDS,
+                                                  "rating_sum")
+              if any(row[1:-1])}
+    return [(work_id, stored.get(work_id), actual.get(work_id))
+            for work_id in sorted(stored.keys() | actual.keys())
+            if stored.get(work_id) != actual.get(work_id)]
+
+
+def adjust(work_id, rating, delta):
+    """Add `delta` ratings of value `rating` to a work's counts (< 0 removes)."""
+    with transaction.atomic():
+        if delta > 0:
+            WorkRatingStats.objects.get_or_create(work_id=work_id)
+        WorkRatingStats.objects.filter(work_id=work_id).update(**{
+            f"count_{rating}": F(f"count_{rating}") + delta,
+            "rating_sum": F("rating_sum") + delta * rating,
+        })
+
+
+def apply_change(old, new):
+    """
+    Update the counts for a rating write, given (user_id, work_id, rating)
+    before and after it (None for a create or a delete).
+    """
+    old = old and old[1:]
+    new = new and new[1:]
+    if old == new:
+        return
+    if old and old[0] is not None:
+        adjust(old[0], old[1], -1)
+    if new and new[0] is not None:
+        adjust(new[0], new[1], +1)
+
+
+def move_edition(edition_id, old_work_id, new_work_id):
+    """Move the counts of an edition's ratings from one work to another."""
+    histogram = (Rating.objects.filter(edition_id=edition_id).order_by()
+                 .values_list("rating").annotate(count=Count("id")))
+    for rating, count in histogram:
+        adjust(old_work_id, rating, -count)
+        adjust(new_work_id, rating, count)
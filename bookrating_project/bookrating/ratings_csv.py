@@ -0,0 +1,145 @@
+# Streaming reader for goodbooks ratings CSVs (user_id,rating,book_id).
+# Kept free of Django imports so it can be used from worker processes.
+
+import hashlib
+import os
+from array import array
+
+RATING_COLUMNS = ("user_id", "book_id", "rating")
+
+
+def read_header(f):
+    """Return the (user_id, book_id, rating) column indexes of a ratings file."""
+    header = f.readline().decode("utf-8-sig").strip().split(",")
+    try:
+        return tuple(header.index(col) for col in RATING_COLUMNS)
+    except ValueError:
+        raise ValueError(
+            f"Ratings file must have columns {', '.join(RATING_COLUMNS)}; "
+            f"found {', '.join(header)}")
+
+
+def iter_ratings(path, start=0, on_invalid=None):
+    """
+    Yield (offset, user_id, edition_id, rating) for each data line,
+    where offset is the byte position just after the line. Invalid lines
+    are skipped, as parse_range does, and passed to `on_invalid` if given.
+    Memory use is constant regardless of file size.
+    """
+    with open(path, "rb") as f:
+        columns = read_header(f)
+        if start > f.tell():
+            f.seek(start)
+        offset = f.tell()
+        for line in f:
+            offset += len(line)
+            try:
+                parsed = parse_line(line, columns)
+            except ValueError:
+                if on_invalid is not None:
+                    on_invalid(line)
+                continue
+            if parsed is not None:
+                yield (offset, *parsed)
+
+
+def iter_batches(path, batch_size, start=0, on_invalid=None):
+    """
+    Group iter_ratings into lists of (user_id, edition_id, rating),
+    yielding (offset, batch) where offset follows the batch's last line.
+    """
+    batch, offset = [], start
+    for offset, user_id, edition_id, rating in iter_ratings(
+            path, start, on_invalid):
+        batch.append((user_id, edition_id, rating))
+        if len(batch) >= batch_size:
+            yield offset, batch
+            batch = []
+    if batch:
+        yield offset, batch
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_line(line, columns):
+    """
+    Parse one data line into a validated (user_id, edition_id, rating),
+    or None for a blank line. Raises ValueError for anything malformed.
+    """
+    fields = line.split(b",")
+    if len(fields) < 3:
+        if line.strip():
+            raise ValueError(f"too few columns: {line!r}")
+        return None
+    user_col, book_col, rating_col = columns
+    try:
+        user_id, edition_id, rating = (
+            int(fields[user_col]), int(fields[book_col]), int(fields[rating_col]))
+    except (ValueError, IndexError):
+        raise ValueError(f"non-integer value: {line!r}")
+    if user_id < 0 or edition_id < 0 or not 0 <= rating <= 5:
+        raise ValueError(f"value out of range: {line!r}")
+    return user_id, edition_id, rating
+
+
+def split_ranges(path, parts):
+    """
+    Split the data lines of a ratings file into at most `parts`
+    (start, end) byte ranges, each starting at the beginning of a line.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        read_header(f)
+        first = f.tell()
+        bounds = [first]
+        for i in range(1, parts):
+            f.seek(max(first + (size - first) * i // parts - 1, bounds[-1]))
+            f.readline()  # move to the start of the next line
+            bounds.append(min(f.tell(), size))
+        bounds.append(size)
+    return [(s, e) for s, e in zip(bounds, bounds[1:]) if s < e]
+
+
+def parse_range(path, start, end, batch_size, queue):
+    """
+    Worker process entry point: parse the lines in [start, end) and put
+    ("batch", array) messages on `queue`, each array holding flattened
+    (user_id, edition_id, rating) triples. Invalid lines are skipped and
+    counted in the closing ("done", invalid_count) message; a crash is
+    reported as ("error", message).
+    """
+    try:
+        invalid = 0
+        batch = array("q")
+        with open(path, "rb") as f:
+            columns = read_header(f)
+            f.seek(start)
+            pos = start
+            while pos < end:
+                line = f.readline()
+                if not line:
+                    break
+                pos += len(line)
+                try:
+                    parsed = parse_line(line, columns)
+                except ValueError:
+                    invalid += 1
+                    continue
+                if parsed is None:
+                    continue
+                batch.extend(parsed)
+                if len(batch) >= batch_size * 3:
+                    queue.put(("batch", batch))
+                    batch = array("q")
+        if batch:
+            queue.put(("batch", batch))
+        queue.put(("done", invalid))
+    except Exception as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
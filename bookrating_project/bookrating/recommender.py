@@ -0,0 +1,340 @@
+# Recommendation engine over the ratings as a sparse users x works matrix.
+# The matrix is built once from Rating (editions folded into their works),
+# item-item scores come from sparse products of it, and the results are
+# saved as .npy artifacts that every web worker memory-maps read-only,
+# so the operating system shares one copy of the pages between processes.
+# Only numpy is used: the products are computed one row at a time by
+# gathering CSR rows and summing them with np.bincount.
+
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from bookrating.models import Rating, Work
+
+ARTIFACT_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+ITEM_COSINE = "item_cosine"
+ALS = "als"
+
+# ratings fetched from the database per chunk when building the matrix
+CHUNK_SIZE = 500_000
+
+# rows whose ALS normal equations are solved in one batch
+SOLVE_ROWS = 8_192
+
+
+class CsrMatrix:
+    """
+    Compressed sparse rows: the entries of row i are indices[indptr[i]:
+    indptr[i + 1]] (column numbers, ascending) with values in data.
+    """
+
+    def __init__(self, indptr, indices, data, shape):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, shape):
+        """Build from (row, col, value) arrays; duplicate cells keep the max."""
+        keys = rows.astype(np.int64) * shape[1] + cols
+        order = np.argsort(keys, kind="stable")
+        keys, values = keys[order], values[order]
+        keys, first = np.unique(keys, return_index=True)
+        values = np.maximum.reduceat(values, first) if len(keys) else values
+        counts = np.bincount(keys // shape[1], minlength=shape[0])
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(indptr, (keys % shape[1]).astype(np.int32), values, shape)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def row(self, i):
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def gather(self, rows):
+        """Column numbers and values of all entries in `rows`, concatenated."""
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        # position of each entry: its row's start plus its rank in the row
+        before = np.cumsum(lengths) - lengths
+        positions = (np.repeat(starts - before, lengths)
+                     + np.arange(lengths.sum()))
+        return self.indices[positions], self.data[positions]
+
+    def transpose(self):
+        rows = np.repeat(np.arange(self.shape[0], dtype=np.int32),
+                         np.diff(self.indptr))
+        return CsrMatrix.from_coo(self.indices, rows, self.data,
+                                  (self.shape[1], self.shape[0]))
+
+    def column_norms(self):
+        return np.sqrt(np.bincount(
+            self.indices, weights=self.data.astype(np.float64) ** 2,
+            minlength=self.shape[1]))
+
+
+def user_work_matrix(min_rating=None, binary=False):
+    """
+    Ratings as a users x works CsrMatrix of float32 values. Returns
+    (matrix, user_ids, work_ids): row i is user user_ids[i], column j is
+    work work_ids[j]. A user who rated several editions of one work keeps
+    their highest rating. With min_rating only ratings >= min_rating are
+    kept, and with binary every kept rating becomes 1.
+    """
+    work_ids = np.fromiter(
+        Work.objects.order_by("id").values_list("id", flat=True), dtype=np.int64)
+
+    ratings = Rating.objects.order_by()
+    if min_rating is not None:
+        ratings = ratings.filter(rating__gte=min_rating)
+    chunks, chunk = [], []
+    for row in ratings.values_list("user_id", "work_id", "rating").iterator(
+            chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            chunks.append(np.array(chunk, dtype=np.int64))
+            chunk = []
+    chunks.append(np.array(chunk, dtype=np.int64).reshape(-1, 3))
+    triples = np.concatenate(chunks)
+
+    user_ids, rows = np.unique(triples[:, 0], return_inverse=True)
+    values = (np.ones(len(triples), dtype=np.float32) if binary
+              else triples[:, 2].astype(np.float32))
+    matrix = CsrMatrix.from_coo(rows, np.searchsorted(work_ids, triples[:, 1]),
+                                values, (len(user_ids), len(work_ids)))
+    return matrix, user_ids, work_ids
+
+
+def gram_row(matrix, matrix_t, col):
+    """
+    Row `col` of matrix.T @ matrix: for every column, the sum over users
+    of value(user, col) * value(user, column). For a 0/1 matrix this is
+    the number of users the two columns share.
+    """
+    users, weights = matrix_t.row(col)
+    cols, values = matrix.gather(users)
+    lengths = matrix.indptr[users + 1] - matrix.indptr[users]
+    return np.bincount(cols, weights=values * np.repeat(weights, lengths),
+                       minlength=matrix.shape[1])
+
+
+def item_cosine(matrix, work_ids, top_k):
+    """
+    Top-k neighbours of every work by cosine similarity of their columns.
+    Returns CSR-style arrays: the neighbours of work_ids[i] are
+    neighbours[indptr[i]:indptr[i + 1]], best first, with their cosine
+    scores and co-occurrence counts.
+    """
+    matrix_t = matrix.transpose()
+    norms = matrix.column_norms()
+    indptr = np.zeros(len(work_ids) + 1, dtype=np.int64)
+    neighbours, scores, counts = [], [], []
+    for col in range(len(work_ids)):
+        co = gram_row(matrix, matrix_t, col)
+        co[col] = 0
+        candidates = np.flatnonzero(co)
+        if len(candidates) > top_k:
+            cosine = co[candidates] / norms[candidates]
+            candidates = candidates[np.argpartition(-cosine, top_k - 1)[:top_k]]
+        cosine = co[candidates] / (norms[col] * norms[candidates])
+        # best score first; ties by count, then by work id
+        order = np.lexsort((candidates, -co[candidates], -cosine))
+        candidates = candidates[order]
+        neighbours.append(work_ids[candidates])
+        scores.append(cosine[order])
+        counts.append(co[candidates])
+        indptr[col + 1] = indptr[col] + len(candidates)
+    return {
+        "work_ids": work_ids.astype(np.int32),
+        "indptr": indptr,
+        "neighbours": np.concatenate(neighbours).astype(np.int32),
+        "scores": np.concatenate(scores).astype(np.float32),
+        "counts": np.concatenate(counts).astype(np.int32),
+    }
+
+
+def artifact_dir(name):
+    return Path(settings.RECOMMENDER_DIR) / name
+
+
+def save_artifact(name, arrays, **info):
+    """
+    Write `arrays` as .npy files plus manifest.json under RECOMMENDER_DIR.
+    The new directory is renamed into place, so readers never see a half
+    written artifact; workers still mapping the old files keep them until
+    they reload.
+    """
+    target = artifact_dir(name)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    staging = target.with_name(f"{name}.tmp-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir()
+    for key, array in arrays.items():
+        np.save(staging / f"{key}.npy", array)
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "arrays": {key: {"file": f"{key}.npy", "dtype": array.dtype.name,
+                         "shape": list(array.shape)}
+                   for key, array in arrays.items()},
+        **info,
+    }
+    (staging / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+
+    old = target.with_name(f"{name}.old-{os.getpid()}")
+    if target.exists():
+        target.rename(old)
+    staging.rename(target)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+# per-process cache: manifest path -> (manifest mtime, loaded artifact)
+_loaded = {}
+
+
+def load_artifact(name):
+    """
+    (manifest, {name: read-only memory-mapped array}) for an artifact, or
+    None if it has not been built. Cached per process and reloaded when
+    the artifact is rebuilt.
+    """
+    manifest_path = artifact_dir(name) / MANIFEST_NAME
+    try:
+        mtime = manifest_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        _loaded.pop(manifest_path, None)
+        return None
+    cached = _loaded.get(manifest_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format')!r}")
+    arrays = {key: np.load(manifest_path.parent / spec["file"], mmap_mode="r")
+              for key, spec in manifest["arrays"].items()}
+    _loaded[manifest_path] = (mtime, (manifest, arrays))
+    return manifest, arrays
+
+
+def similar_works(work_id, name=ITEM_COSINE):
+    """
+    [(work id, score, count), ...] for a work's precomputed neighbours,
+    best first, or None if the artifact has not been built.
+    """
+    artifact = load_artifact(name)
+    if artifact is None:
+        return None
+    arrays = artifact[1]
+    row = _position(arrays["work_ids"], work_id)
+    if row is None:
+        return []
+    start, end = arrays["indptr"][row], arrays["indptr"][row + 1]
+    return list(zip(arrays["neighbours"][start:end].tolist(),
+                    arrays["scores"][start:end].tolist(),
+                    arrays["counts"][start:end].tolist()))
+
+
+def _position(sorted_ids, value):
+    """Index of value in a sorted id array, or None."""
+    pos = int(np.searchsorted(sorted_ids, value))
+    if pos == len(sorted_ids) or sorted_ids[pos] != value:
+        return None
+    return pos
+
+
+def _solve_rows(matrix, fixed, reg):
+    """
+    One ALS half-step: for every row of `matrix`, the factor vector x
+    minimising sum((r - x . f_j) ** 2) + reg * n * |x| ** 2 over the row's
+    entries r in columns j, where n is the row's entry count (weighted
+    regularisation, so heavy raters are not over-penalised).
+    """
+    n_rows, n_factors = matrix.shape[0], fixed.shape[1]
+    counts = np.diff(matrix.indptr)
+    identity = np.eye(n_factors)
+    result = np.empty((n_rows, n_factors), dtype=np.float32)
+    # normal equations of SOLVE_ROWS rows at a time, solved as a batch
+    for start in range(0, n_rows, SOLVE_ROWS):
+        end = min(start + SOLVE_ROWS, n_rows)
+        lhs = np.empty((end - start, n_factors, n_factors))
+        rhs = np.empty((end - start, n_factors))
+        for i in range(start, end):
+            cols, values = matrix.row(i)
+            f = fixed[cols]
+            lhs[i - start] = f.T @ f + reg * max(counts[i], 1) * identity
+            rhs[i - start] = values @ f
+        result[start:end] = np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0]
+    return result
+
+
+def train_als(matrix, factors=32, iterations=10, reg=0.05, seed=42,
+              progress=None):
+    """
+    Alternating least squares on a users x works rating matrix, fitting
+    rating - mean ~ user_factors[u] . item_factors[w] over the rated cells.
+    Returns (user_factors, item_factors, mean); `progress(iteration, rmse)`
+    is called after each iteration with the training RMSE.
+    """
+    mean = float(matrix.data.mean()) if matrix.nnz else 0.0
+    centred = CsrMatrix(matrix.indptr, matrix.indices,
+                        matrix.data - np.float32(mean), matrix.shape)
+    centred_t = centred.transpose()
+    rng = np.random.default_rng(seed)
+    users = rng.normal(0, 0.1, (matrix.shape[0], factors)).astype(np.float32)
+    items = rng.normal(0, 0.1, (matrix.shape[1], factors)).astype(np.float32)
+    for iteration in range(1, iterations + 1):
+        users = _solve_rows(centred, items, reg)
+        items = _solve_rows(centred_t, users, reg)
+        if progress:
+            progress(iteration, training_rmse(centred, users, items))
+    return users, items, mean
+
+
+def training_rmse(centred, users, items, chunk=1_000_000):
+    rows = np.repeat(np.arange(centred.shape[0]), np.diff(centred.indptr))
+    total = 0.0
+    for start in range(0, centred.nnz, chunk):
+        end = start + chunk
+        predicted = np.einsum("ij,ij->i", users[rows[start:end]],
+                              items[centred.indices[start:end]])
+        total += float(((centred.data[start:end] - predicted) ** 2).sum())
+    return (total / max(centred.nnz, 1)) ** 0.5
+
+
+def recommend_for_user(user_id, limit, exclude_work_ids=(), name=ALS):
+    """
+    Top-`limit` works for a user by predicted rating, skipping
+    `exclude_work_ids`: [(work id, predicted rating), ...], best first.
+    None if the model has not been trained, [] if it has no factors for
+    this user (they had no ratings at training time).
+    """
+    artifact = load_artifact(name)
+    if artifact is None:
+        return None
+    manifest, arrays = artifact
+    row = _position(arrays["user_ids"], user_id)
+    if row is None:
+        return []
+    work_ids = arrays["work_ids"]
+    scores = arrays["item_factors"] @ arrays["user_factors"][row]
+    excluded = np.isin(work_ids, np.fromiter(exclude_work_ids, dtype=np.int64))
+    scores[excluded] = -np.inf
+    limit = min(limit, int((~excluded).sum()))
+    if limit < 1:
+        return []
+    best = np.argpartition(-scores, limit - 1)[:limit]
+    best = best[np.argsort(-scores[best], kind="stable")]
+    predicted = np.clip(scores[best] + manifest["mean"], 0, 5)
+    return list(zip(work_ids[best].tolist(), predicted.tolist()))
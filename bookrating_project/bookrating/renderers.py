@@ -0,0 +1,28 @@
+# JSON rendering with orjson for the hot list endpoints. The output is the
+# same bytes JSONRenderer would produce for the data those endpoints return
+# (strings, ints, bools, None, and decimals already turned into strings).
+# Floats are not: orjson writes 1e16 where json writes 1e+16, so views
+# returning floats keep the stock renderer.
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # fall back to the stock renderer
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type, renderer_context or {})
+                or self.ensure_ascii or not self.compact):
+            return super().render(data, accepted_media_type, renderer_context)
+        # non-str keys as str, and anything orjson does not handle natively
+        # (dates included, whose format differs) through DRF's encoder
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        # JSONRenderer escapes these two, as they end lines in JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029")
@@ -0,0 +1,162 @@
+# Cached responses of WorkViewSet's read actions (ratings, also_loved,
+# top_rated_by_author), in the Django cache named by
+# settings.RESPONSE_CACHE_ALIAS, whose TIMEOUT is the time to live.
+#
+# An entry's key holds the action, work, query parameters and host, and the
+# current token of every generation the response depends on:
+#   work:<id>        the work's ratings (bumped with its version stamp)
+#   also_loved:<id>  the work's also_loved lists (its fans changed, or a
+#                    work listed in them)
+#   catalog          top_rated_by_author (any work, edition or author)
+#   all              everything (bulk loads and rebuilds)
+# Invalidating replaces a token, so the entries keyed by the old one are
+# never read again and expire with the TTL. Tokens are random rather than
+# counters: one evicted from the cache comes back as a fresh token, never
+# as an old value that would revive stale entries.
+#
+# Hits and misses are counted in the process and added to the shared
+# counters every FLUSH_EVERY lookups (and by stats()), rather than written
+# on every lookup. The counts of other processes lag by up to that many,
+# and the cache's incr() reads and rewrites the value, so two processes
+# flushing at once can lose one's counts: the totals are approximate.
+
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from bookrating.models import WorkCoLove
+
+PREFIX = "response-cache"
+HITS = f"{PREFIX}:hits"
+MISSES = f"{PREFIX}:misses"
+FLUSH_EVERY = 100
+
+_counts = {HITS: 0, MISSES: 0}
+_counts_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _generation_key(name):
+    return f"{PREFIX}:gen:{name}"
+
+
+def _tokens(names):
+    cache = _cache()
+    keys = [_generation_key(name) for name in names]
+    tokens = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in tokens}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        tokens.update(missing)
+    return [tokens[key] for key in keys]
+
+
+def _flush_counts():
+    with _counts_lock:
+        pending = {key: n for key, n in _counts.items() if n}
+        for key in pending:
+            _counts[key] = 0
+    cache = _cache()
+    for key, n in pending.items():
+        try:
+            cache.incr(key, n)
+        except ValueError:  # first count, or evicted
+            cache.set(key, n, timeout=None)
+
+
+def _count(key):
+    with _counts_lock:
+        _counts[key] += 1
+        due = sum(_counts.values()) >= FLUSH_EVERY
+    if due:
+        _flush_counts()
+
+
+def key(request, action, pk, generations):
+    """
+    The entry key for `action` on work `pk` (None for list actions) as
+    asked by `request`, depending on `generations` (and on "all").
+    """
+    parts = (action, pk, sorted(request.query_params.lists()),
+             request.build_absolute_uri("/"),
+             _tokens(["all", *generations]))
+    return f"{PREFIX}:entry:{hashlib.md5(repr(parts).encode()).hexdigest()}"
+
+
+def lookup(key):
+    """The cached value, or None; counts a hit or a miss."""
+    value = _cache().get(key)
+    _count(MISSES if value is None else HITS)
+    return value
+
+
+def store(key, value):
+    _cache().set(key, value)
+
+
+def _replace_tokens(names):
+    _cache().set_many({_generation_key(name): uuid.uuid4().hex
+                       for name in names}, timeout=None)
+
+
+def bump(*names):
+    """
+    Invalidate every entry depending on the generations `names`: now, and
+    again when the write's transaction commits, in case another process
+    cached what it read before then.
+    """
+    if names:
+        _replace_tokens(names)
+        transaction.on_commit(lambda: _replace_tokens(names))
+
+
+def works_changed(work_ids):
+    bump(*(f"work:{work_id}" for work_id in work_ids))
+
+
+def also_loved_changed(work_ids):
+    bump(*(f"also_loved:{work_id}" for work_id in work_ids))
+
+
+def work_changed(work_id):
+    """
+    A work's own fields changed, or it is being deleted: its responses, the
+    also_loved lists that show it (pairs are stored both ways, so those of
+    the works it is co-loved with) and top_rated_by_author.
+    """
+    listed_by = WorkCoLove.objects.filter(work_id=work_id).values_list(
+        "other_work_id", flat=True)
+    works_changed([work_id])
+    also_loved_changed([work_id, *listed_by])
+    bump("catalog")
+
+
+def catalog_changed():
+    bump("catalog")
+
+
+def clear():
+    bump("all")
+
+
+def stats():
+    """
+    {"hits": n, "misses": n} since the counters were last reset: this
+    process's exactly, the others' approximately (see above).
+    """
+    _flush_counts()
+    counts = _cache().get_many([HITS, MISSES])
+    return {"hits": counts.get(HITS, 0), "misses": counts.get(MISSES, 0)}
+
+
+def reset_stats():
+    with _counts_lock:
+        _counts.update(dict.fromkeys(_counts, 0))
+    _cache().delete_many([HITS, MISSES])
@@ -1,11 +1,70 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.reverse import reverse
+
 from .models import Work, Author, BookEdition, WorkAuthor, Rating
 
 
+def param_names(request, name):
+    """The names in a comma-separated query parameter, or None if absent."""
+    if request is None:
+        return None
+    params = getattr(request, "query_params", request.GET)
+    if name not in params:
+        return None
+    return {value.strip() for value in params[name].split(",")
+            if value.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    On GET, ?fields=a,b keeps only the named fields, and ?expand=x,y swaps
+    the named relations in expandable_fields for the nested serializers
+    given there; unexpanded relations keep their plain ids or links. Only
+    the top-level serializer (or the child of a top-level many=True) reads
+    the parameters.
+    """
+    # {field name: (serializer class, kwargs)}
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        top_level = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer)
+            and self.parent.parent is None)
+        if (not top_level or request is None
+                or request.method not in SAFE_METHODS):
+            return fields
+
+        only = param_names(request, "fields")
+        expand = param_names(request, "expand") or set()
+        errors = {}
+        if only is not None and only - fields.keys():
+            errors["fields"] = (
+                f"Unknown fields: {', '.join(sorted(only - fields.keys()))}.")
+        if expand - self.expandable_fields.keys():
+            errors["expand"] = (
+                "Unknown relations: "
+                f"{', '.join(sorted(expand - self.expandable_fields.keys()))}.")
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        for name in expand:
+            serializer_class, kwargs = self.expandable_fields[name]
+            fields[name] = serializer_class(**kwargs)
+        if only is not None:
+            fields = {name: field for name, field in fields.items()
+                      if name in only}
+        return fields
+
+
 class RatingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Rating
-        fields = ["id", "user_id", "edition", "rating"]
+        # work is read-only: Rating.save() copies it from the edition on
+        # every create and update
+        fields = ["id", "user_id", "edition", "work", "rating"]
 
     # define custom validation for the rating field
     def validate_rating(self, value):
@@ -17,38 +76,54 @@ class RatingSerializer(serializers.ModelSerializer):
         return value
 
 
-class AuthorSerializer(serializers.HyperlinkedModelSerializer):
+class WorkListSerializer(SparseFieldsMixin,
+                         serializers.HyperlinkedModelSerializer):
+    # Get DRF to add a hyperlink to the work detail view
+    url = serializers.HyperlinkedIdentityField(
+        view_name="work-detail",
+        lookup_field="pk",
+    )
+    id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Work
+        exclude = ["version", "modified_at"]
+
+
+class AuthorSerializer(SparseFieldsMixin,
+                       serializers.HyperlinkedModelSerializer):
     works = serializers.HyperlinkedIdentityField(
         view_name='author-works',
         lookup_field='pk'
     )
+    # ?expand=works embeds the works in place of the link
+    expandable_fields = {
+        "works": (WorkListSerializer, {"many": True, "read_only": True}),
+    }
 
     class Meta:
         model = Author
         fields = ["id", "name", "works"]
 
 
-class WorkListSerializer(serializers.HyperlinkedModelSerializer):
-    # Get DRF to add a hyperlink to the work detail view
-    url = serializers.HyperlinkedIdentityField(
-        view_name="work-detail",
-        lookup_field="pk",
-    )
-
-    class Meta:
-        model = Work
-        fields = "__all__"
-
+class BookEditionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "work": (WorkListSerializer, {"read_only": True}),
+    }
 
-class BookEditionSerializer(serializers.ModelSerializer):
     class Meta:
         model = BookEdition
         fields = "__all__"
 
 
-class WorkDetailSerializer(serializers.ModelSerializer):
-    authors = AuthorSerializer(many=True, read_only=True)
-    editions = BookEditionSerializer(many=True, read_only=True)
+class WorkDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # ids unless ?expand= asks for the authors or editions themselves
+    authors = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    editions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    expandable_fields = {
+        "authors": (AuthorSerializer, {"many": True, "read_only": True}),
+        "editions": (BookEditionSerializer, {"many": True, "read_only": True}),
+    }
 
     class Meta:
         model = Work
@@ -64,7 +139,150 @@ class WorkWithFanCountSerializer(serializers.ModelSerializer):
         fields = ["id", "title", "avg_rating", "five_star_count"]
 
 
+class WorkSimilaritySerializer(WorkWithFanCountSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(WorkWithFanCountSerializer.Meta):
+        fields = WorkWithFanCountSerializer.Meta.fields + ["score"]
+
+
+class WorkApproxSerializer(WorkWithFanCountSerializer):
+    jaccard = serializers.FloatField(read_only=True)
+    jaccard_error = serializers.FloatField(read_only=True)
+
+    class Meta(WorkWithFanCountSerializer.Meta):
+        fields = WorkWithFanCountSerializer.Meta.fields + [
+            "jaccard", "jaccard_error"]
+
+
+class WorkRecommendationSerializer(serializers.ModelSerializer):
+    predicted_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Work
+        fields = ["id", "title", "avg_rating", "predicted_rating"]
+
+
 class WorkAuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = WorkAuthor
         fields = ["id", "work", "author"]
+
+
+# Read-only serializers for the hot list endpoints. They take rows from
+# values_list(*columns()) rather than model instances, and build hyperlinks
+# from a URL template rather than calling reverse() per row; the output is
+# the same as that of the ModelSerializer each one names.
+
+
+def url_template(view_name, request, format=None):
+    """
+    pk -> the URL a hyperlinked field would give for `view_name`, from a
+    single reverse().
+    """
+    marker = "2147483647"
+    url = reverse(view_name, kwargs={"pk": marker}, request=request,
+                  format=format)
+    prefix, suffix = url.rsplit(marker, 1)
+    return lambda pk: f"{prefix}{pk}{suffix}"
+
+
+def decimal_field(model, name):
+    """to_representation of the DecimalField a ModelSerializer would use."""
+    field = model._meta.get_field(name)
+    return serializers.DecimalField(
+        max_digits=field.max_digits,
+        decimal_places=field.decimal_places).to_representation
+
+
+class ValuesListSerializer:
+    # (output key, values_list column, converter or None), in output order
+    fields = []
+    # columns selected even when their keys are left out by `names`
+    required_columns = []
+
+    def __init__(self, rows, context=None, names=None):
+        """
+        `rows` come from values_list(*columns(names)); `names`, if given,
+        are the output keys to keep (e.g. the serializer's ?fields=).
+        """
+        self.rows = rows
+        self.context = context or {}
+        self.names = names
+        columns = self.columns(names)
+        self.positions = [(key, columns.index(column), convert)
+                          for key, column, convert in self.fields
+                          if names is None or key in names]
+
+    @classmethod
+    def columns(cls, names=None):
+        columns = [column for key, column, _ in cls.fields
+                   if names is None or key in names]
+        return list(dict.fromkeys(columns + cls.required_columns))
+
+    @property
+    def data(self):
+        return [self.to_representation(row) for row in self.rows]
+
+    def to_representation(self, row):
+        return {key: row[index] if convert is None or row[index] is None
+                else convert(row[index])
+                for key, index, convert in self.positions}
+
+
+class RatingValuesSerializer(ValuesListSerializer):
+    # RatingSerializer
+    fields = [("id", "id", None), ("user_id", "user_id", None),
+              ("edition", "edition_id", None), ("work", "work_id", None),
+              ("rating", "rating", None)]
+
+
+class BookEditionValuesSerializer(ValuesListSerializer):
+    # BookEditionSerializer
+    fields = [("id", "id", None), ("isbn", "isbn", None),
+              ("isbn13", "isbn13", None),
+              ("language_code", "language_code", None),
+              ("ratings_count", "ratings_count", None),
+              ("avg_rating", "avg_rating",
+               decimal_field(BookEdition, "avg_rating")),
+              ("work", "work_id", None)]
+
+
+class WorkListValuesSerializer(ValuesListSerializer):
+    # WorkListSerializer: url (from id) first and the author URLs last
+    fields = [("url", "id", None), ("id", "id", None), ("title", "title", None),
+              ("original_year", "original_year", None),
+              ("avg_rating", "avg_rating", decimal_field(Work, "avg_rating")),
+              ("ratings_count", "ratings_count", None)]
+    # the url and authors are built from the id, and WorkPagination's
+    # cursor reads avg_rating and id
+    required_columns = ["id", "avg_rating"]
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        pk = self.columns(self.names).index("id")
+        with_url = self.names is None or "url" in self.names
+        with_authors = self.names is None or "authors" in self.names
+        # one query for the page's authors, in the order the authors
+        # prefetch would list them
+        authors = {row[pk]: [] for row in rows}
+        if authors and with_authors:
+            for work_id, author_id in (WorkAuthor.objects
+                                       .filter(work_id__in=list(authors))
+                                       .values_list("work_id", "author_id")):
+                authors[work_id].append(author_id)
+        request = self.context.get("request")
+        format = self.context.get("format")
+        work_url = url_template("work-detail", request, format)
+        author_url = url_template("author-detail", request, format)
+        data = []
+        for row in rows:
+            item = super().to_representation(row)
+            if with_url:
+                item["url"] = work_url(row[pk])
+            if with_authors:
+                item["authors"] = [author_url(author_id)
+                                   for author_id in authors[row[pk]]]
+            data.append(item)
+        return data
@@ -0,0 +1,174 @@
+# Keep WorkCoLove and WorkRatingStats in step with Rating saves and deletes,
+# and flag the MinHash signatures, user neighbour lists and work averages
+# they invalidate. Rating, edition, author and work-author writes also bump
+# the version stamps of the works they change, and invalidate the cached
+# responses that show them. An edition moved to another work takes its
+# ratings, and what they count for, along.
+# Bulk loaders bypass model signals, so they rebuild these instead (see
+# bookrating.derived).
+
+from django.db.models.signals import (m2m_changed, pre_save, post_save,
+                                      pre_delete, post_delete)
+from django.dispatch import receiver
+
+from bookrating import (aggregates, colove, minhash, neighbours,
+                        rating_stats, response_cache, stamps)
+from bookrating.models import Author, BookEdition, Rating, Work, WorkAuthor
+
+
+def _remember(instance, old, new):
+    # (user_id, work_id, rating) before and after the write, and the fan
+    # status of every (user, work) the write can touch, before the write
+    instance._rating_change = (old, new)
+    keys = dict.fromkeys(
+        (change[0], change[1]) for change in (old, new)
+        if change is not None and change[1] is not None)
+    instance._colove_before = {key: colove.is_fan(*key) for key in keys}
+
+
+def _apply_changes(instance):
+    before = getattr(instance, "_colove_before", {})
+    for key, was_fan in before.items():
+        now_fan = colove.is_fan(*key)
+        if now_fan != was_fan:
+            others = colove.apply_fan_change(*key, became_fan=now_fan)
+            minhash.mark_stale(key[1])
+            response_cache.also_loved_changed([key[1], *others])
+    neighbours.mark_stale({user_id for user_id, _ in before})
+    old, new = getattr(instance, "_rating_change", (None, None))
+    rating_stats.apply_change(old, new)
+    aggregates.log_change(old, new)
+    stamps.apply_change(old, new)
+    instance._colove_before = {}
+    instance._rating_change = (None, None)
+
+
+def _move_ratings(edition_id, old_work_id, new_work_id):
+    # Rating.work copies the edition's work, so an edition moved to another
+    # work takes its ratings along: bulk-updated, so everything the Rating
+    # signals maintain is adjusted here, for both works
+    ratings = Rating.objects.filter(edition_id=edition_id)
+    fans = set(ratings.filter(rating=5).values_list("user_id", flat=True))
+    # fans who still love the old work through another edition, and fans
+    # who already loved the new one
+    keep_old = set(Rating.objects.filter(
+        work_id=old_work_id, rating=5, user_id__in=fans)
+        .exclude(edition_id=edition_id).values_list("user_id", flat=True))
+    had_new = set(Rating.objects.filter(
+        work_id=new_work_id, rating=5, user_id__in=fans)
+        .values_list("user_id", flat=True))
+    also_loved = {old_work_id, new_work_id}
+    # the old pairs go while the ratings still point at the old work, the
+    # new ones are added once they point at the new one
+    for user_id in sorted(fans - keep_old):
+        also_loved.update(colove.apply_fan_change(
+            user_id, old_work_id, became_fan=False))
+    rating_stats.move_edition(edition_id, old_work_id, new_work_id)
+    raters = set(ratings.values_list("user_id", flat=True))
+    ratings.update(work_id=new_work_id)
+    for user_id in sorted(fans - had_new):
+        also_loved.update(colove.apply_fan_change(
+            user_id, new_work_id, became_fan=True))
+    if fans:
+        minhash.mark_stale(old_work_id)
+        minhash.mark_stale(new_work_id)
+        response_cache.also_loved_changed(also_loved)
+    neighbours.mark_stale(raters)
+    aggregates.log_works([old_work_id, new_work_id])
+
+
+@receiver(pre_save, sender=Rating)
+def rating_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Rating.save() has already copied the edition's work onto the instance
+    new = (instance.user_id, instance.work_id, instance.rating)
+    old = None
+    if instance.pk is not None:
+        old = (Rating.objects.filter(pk=instance.pk)
+               .values_list("user_id", "work_id", "rating").first())
+    _remember(instance, old, new)
+
+
+@receiver(post_save, sender=Rating)
+def rating_post_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _apply_changes(instance)
+
+
+@receiver(pre_delete, sender=Rating)
+def rating_pre_delete(sender, instance, **kwargs):
+    old = (instance.user_id, instance.work_id, instance.rating)
+    _remember(instance, old, None)
+
+
+@receiver(post_delete, sender=Rating)
+def rating_post_delete(sender, instance, **kwargs):
+    _apply_changes(instance)
+
+
+@receiver(pre_save, sender=BookEdition)
+def edition_pre_save(sender, instance, raw=False, **kwargs):
+    # an edition moved to another work changes both works
+    instance._previous_work_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_work_id = (
+            BookEdition.objects.filter(pk=instance.pk)
+            .values_list("work_id", flat=True).first())
+
+
+@receiver(post_save, sender=BookEdition)
+def edition_post_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        previous = getattr(instance, "_previous_work_id", None)
+        if previous is not None and previous != instance.work_id:
+            _move_ratings(instance.pk, previous, instance.work_id)
+        stamps.touch([instance.work_id, previous])
+        response_cache.catalog_changed()
+
+
+@receiver(post_delete, sender=BookEdition)
+@receiver(post_save, sender=WorkAuthor)
+@receiver(post_delete, sender=WorkAuthor)
+def work_relation_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        stamps.touch([instance.work_id])
+        response_cache.catalog_changed()
+
+
+@receiver(m2m_changed, sender=WorkAuthor)
+def work_authors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # work.authors.add() and friends bulk-create WorkAuthor rows without
+    # post_save; from the author side (reverse) pk_set holds work ids
+    if action == "pre_clear" and reverse:
+        instance._cleared_work_ids = list(
+            WorkAuthor.objects.filter(author=instance)
+            .values_list("work_id", flat=True))
+    elif action in ("post_add", "post_remove"):
+        stamps.touch(pk_set if reverse else [instance.pk])
+        response_cache.catalog_changed()
+    elif action == "post_clear":
+        stamps.touch(getattr(instance, "_cleared_work_ids", [])
+                     if reverse else [instance.pk])
+        response_cache.catalog_changed()
+
+
+@receiver(post_save, sender=Author)
+def author_post_save(sender, instance, created=False, raw=False, **kwargs):
+    # expanded author entries carry the name
+    if not raw and not created:
+        stamps.touch(WorkAuthor.objects.filter(author=instance)
+                     .values_list("work_id", flat=True))
+        response_cache.catalog_changed()
+
+
+@receiver(post_save, sender=Work)
+def work_post_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        response_cache.work_changed(instance.pk)
+
+
+@receiver(pre_delete, sender=Work)
+def work_pre_delete(sender, instance, **kwargs):
+    # before the cascade removes its WorkCoLove pairs
+    response_cache.work_changed(instance.pk)
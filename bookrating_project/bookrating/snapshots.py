@@ -0,0 +1,83 @@
+# Columnar binary snapshots of the Rating table.
+# A snapshot is a directory with one .npy file per column plus manifest.json,
+# so analytics jobs can np.load(..., mmap_mode="r") it without touching the DB.
+
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+
+# column name -> dtype; goodbooks ids fit in uint32 and ratings are 0-5
+RATING_COLUMNS = {
+    "user_id": np.uint32,
+    "edition_id": np.uint32,
+    "rating": np.uint8,
+}
+
+
+def write_snapshot(directory, chunks, rows):
+    """
+    Write `rows` ratings to `directory`. `chunks` yields lists of
+    (user_id, edition_id, rating) tuples, in the order they should be stored;
+    they are written straight into memory-mapped .npy files, so memory use
+    depends on the chunk size rather than the table size.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    columns = {
+        name: np.lib.format.open_memmap(
+            directory / f"{name}.npy", mode="w+", dtype=dtype, shape=(rows,))
+        for name, dtype in RATING_COLUMNS.items()
+    }
+    pos = 0
+    for chunk in chunks:
+        values = np.array(chunk, dtype=np.int64).reshape(-1, 3)
+        end = pos + len(values)
+        if end > rows:
+            raise ValueError(f"More than the expected {rows:,} rows")
+        for i, (name, dtype) in enumerate(RATING_COLUMNS.items()):
+            column = values[:, i]
+            limits = np.iinfo(dtype)
+            if column.size and (column.min() < limits.min
+                                or column.max() > limits.max):
+                raise ValueError(f"{name} value out of range for {dtype.__name__}")
+            columns[name][pos:end] = column
+        pos = end
+    if pos != rows:
+        raise ValueError(f"Expected {rows:,} rows, got {pos:,}")
+    for column in columns.values():
+        column.flush()
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "model": "bookrating.Rating",
+        "rows": rows,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "columns": {name: {"file": f"{name}.npy", "dtype": np.dtype(dtype).name}
+                    for name, dtype in RATING_COLUMNS.items()},
+    }
+    (directory / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def read_snapshot(directory):
+    """
+    Return (manifest, {column: read-only memory-mapped array}) for a
+    snapshot directory, checking the files against the manifest.
+    """
+    directory = Path(directory)
+    manifest = json.loads((directory / MANIFEST_NAME).read_text())
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(
+            f"Unsupported snapshot format {manifest.get('format')!r}")
+    columns = {}
+    for name, spec in manifest["columns"].items():
+        column = np.load(directory / spec["file"], mmap_mode="r")
+        if column.dtype.name != spec["dtype"] or len(column) != manifest["rows"]:
+            raise ValueError(f"{spec['file']} does not match the manifest")
+        columns[name] = column
+    return manifest, columns
@@ -0,0 +1,54 @@
+# Per-work version stamps, Work.version and Work.modified_at, from which
+# the work views derive their ETag and Last-Modified headers. Work.save()
+# bumps a work's own stamp; the signals bump it when the work's editions,
+# authors or ratings change, aggregates when it recomputes the work's
+# averages, and the bulk commands bump every work (see bookrating.derived).
+# Cached responses carry the stamp, so bumping one invalidates them too.
+
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+
+from bookrating import response_cache
+from bookrating.models import BookEdition, Work
+
+# ids per UPDATE or lookup (keeps the lists below the database's parameter
+# limit)
+CHUNK_SIZE = 5_000
+
+
+def touch(work_ids=(), edition_ids=()):
+    """Bump the stamps of `work_ids` and of the works of `edition_ids`."""
+    work_ids = {work_id for work_id in work_ids if work_id is not None}
+    edition_ids = sorted(edition_ids)
+    for start in range(0, len(edition_ids), CHUNK_SIZE):
+        work_ids.update(BookEdition.objects.filter(
+            id__in=edition_ids[start:start + CHUNK_SIZE])
+            .values_list("work_id", flat=True))
+    work_ids = sorted(work_ids)
+    response_cache.works_changed(work_ids)
+    now = timezone.now()
+    for start in range(0, len(work_ids), CHUNK_SIZE):
+        Work.objects.filter(id__in=work_ids[start:start + CHUNK_SIZE]).update(
+            version=F("version") + 1, modified_at=now)
+
+
+def touch_all():
+    """Bump every work's stamp; returns the number of works."""
+    response_cache.clear()
+    return Work.objects.update(version=F("version") + 1,
+                               modified_at=timezone.now())
+
+
+def apply_change(old, new):
+    """
+    Bump the works of a rating write, given (user_id, work_id, rating)
+    before and after it (None for a create or a delete).
+    """
+    touch(change[1] for change in (old, new) if change is not None)
+
+
+def etag(*parts):
+    """An opaque ETag value for a representation identified by `parts`."""
+    return hashlib.md5(repr(parts).encode()).hexdigest()
@@ -0,0 +1,27 @@
+# Test runner that gives the test run a response cache of its own, so tests
+# neither read nor invalidate the entries of the development server sharing
+# the FileBasedCache directory.
+
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.response_cache_dir = tempfile.TemporaryDirectory()
+        alias = settings.RESPONSE_CACHE_ALIAS
+        self.response_cache_settings = override_settings(CACHES={
+            **settings.CACHES,
+            alias: {**settings.CACHES[alias],
+                    "LOCATION": self.response_cache_dir.name},
+        })
+        self.response_cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.response_cache_settings.disable()
+        self.response_cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from bookrating.factories import BookEditionFactory, RatingFactory, WorkFactory
+from bookrating.models import AggregateWatermark, Rating, RatingChange
+
+
+class RecomputeAggregatesTest(TestCase):
+    def setUp(self):
+        self.work = WorkFactory(avg_rating=4.2, ratings_count=500)
+        self.editions = [BookEditionFactory(work=self.work) for _ in range(2)]
+        self.other = WorkFactory(avg_rating=3.0, ratings_count=10)
+        self.other_edition = BookEditionFactory(work=self.other)
+
+    def recompute(self, *args):
+        out = StringIO()
+        call_command("recompute_aggregates", *args, stdout=out)
+        return out.getvalue()
+
+    def values(self, obj):
+        obj.refresh_from_db()
+        return obj.avg_rating, obj.ratings_count
+
+    def test_full_recompute_from_ratings(self):
+        RatingFactory(user_id=1, edition=self.editions[0], rating=5)
+        RatingFactory(user_id=2, edition=self.editions[0], rating=4)
+        RatingFactory(user_id=3, edition=self.editions[1], rating=4)
+        out = self.recompute()
+        # the other work and its edition have no ratings: 0 and 0
+        self.assertIn("Updated 2 works and 3 editions", out)
+        self.assertEqual(self.values(self.work), (Decimal("4.33"), 3))
+        self.assertEqual(self.values(self.editions[0]), (Decimal("4.50"), 2))
+        self.assertEqual(self.values(self.other), (Decimal("0.00"), 0))
+        self.assertFalse(RatingChange.objects.exists())
+
+        # nothing to write on a second pass
+        self.assertIn("Updated 0 works and 0 editions", self.recompute())
+
+    def test_incremental_only_touches_logged_works(self):
+        RatingFactory(user_id=1, edition=self.editions[0], rating=5)
+        self.recompute()
+        watermark = AggregateWatermark.objects.get().last_change_id
+
+        rating = RatingFactory(user_id=2, edition=self.editions[1], rating=2)
+        # bypasses the signals, so it is not logged
+        Rating.objects.bulk_create(
+            [Rating(user_id=3, edition=self.other_edition, rating=5)])
+        out = self.recompute("--incremental")
+        self.assertIn("Updated 1 works and 1 editions", out)
+        self.assertEqual(self.values(self.work), (Decimal("3.50"), 2))
+        self.assertEqual(self.values(self.other), (Decimal("0.00"), 0))
+        self.assertGreater(AggregateWatermark.objects.get().last_change_id,
+                           watermark)
+
+        # moving a rating logs both works
+        rating.edition = self.other_edition
+        rating.save()
+        self.recompute("--incremental")
+        self.assertEqual(self.values(self.work), (Decimal("5.00"), 1))
+        self.assertEqual(self.values(self.other), (Decimal("3.50"), 2))
+        self.assertEqual(self.values(self.editions[1]), (Decimal("0.00"), 0))
+        self.assertIn("Updated 0 works", self.recompute("--incremental"))
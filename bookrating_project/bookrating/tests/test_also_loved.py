@@ -0,0 +1,159 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating import colove, minhash
+from bookrating.factories import BookEditionFactory, RatingFactory, WorkFactory
+from bookrating.models import Rating, RatingChange, WorkCoLove, WorkMinHash
+
+
+class AlsoLovedTest(APITestCase):
+    def setUp(self):
+        self.target = WorkFactory(avg_rating=4.0)
+        self.other = WorkFactory(avg_rating=4.5)
+        self.third = WorkFactory(avg_rating=3.0)
+        self.target_eds = [BookEditionFactory(work=self.target) for _ in range(2)]
+        self.other_ed = BookEditionFactory(work=self.other)
+        self.third_ed = BookEditionFactory(work=self.third)
+
+    def counts(self):
+        return {(c.work_id, c.other_work_id): c.five_star_count
+                for c in WorkCoLove.objects.all()}
+
+    def rebuilt_counts(self):
+        current = self.counts()
+        colove.rebuild()
+        return current, self.counts()
+
+    def test_lists_co_loved_works_ranked_by_avg_rating(self):
+        # user 1 loves two editions of target: still one fan
+        for ed in self.target_eds:
+            RatingFactory(user_id=1, edition=ed, rating=5)
+        RatingFactory(user_id=1, edition=self.other_ed, rating=5)
+        RatingFactory(user_id=1, edition=self.third_ed, rating=5)
+        RatingFactory(user_id=2, edition=self.target_eds[0], rating=5)
+        RatingFactory(user_id=2, edition=self.third_ed, rating=5)
+        # 4 stars do not count
+        RatingFactory(user_id=3, edition=self.target_eds[0], rating=5)
+        RatingFactory(user_id=3, edition=self.other_ed, rating=4)
+
+        response = self.client.get(
+            reverse("work-also-loved", args=[self.target.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(w["id"], w["five_star_count"]) for w in response.data["results"]],
+            [(self.other.id, 1), (self.third.id, 2)])
+
+    def test_incremental_updates_match_rebuild(self):
+        rating = RatingFactory(user_id=1, edition=self.target_eds[0], rating=5)
+        RatingFactory(user_id=1, edition=self.other_ed, rating=5)
+        RatingFactory(user_id=2, edition=self.other_ed, rating=5)
+        second = RatingFactory(user_id=2, edition=self.third_ed, rating=3)
+        current, rebuilt = self.rebuilt_counts()
+        self.assertEqual(current, rebuilt)
+
+        # upgrade to 5 stars, move a rating to another work, then delete
+        second.rating = 5
+        second.save()
+        rating.edition = self.third_ed
+        rating.save()
+        current, rebuilt = self.rebuilt_counts()
+        self.assertEqual(current, rebuilt)
+        self.assertEqual(current[(self.other.id, self.third.id)], 2)
+
+        Rating.objects.get(user_id=2, edition=self.other_ed).delete()
+        current, rebuilt = self.rebuilt_counts()
+        self.assertEqual(current, rebuilt)
+        self.assertEqual(current, {(self.other.id, self.third.id): 1,
+                                   (self.third.id, self.other.id): 1})
+
+    def test_api_writes_keep_table_current(self):
+        RatingFactory(user_id=7, edition=self.other_ed, rating=5)
+        response = self.client.post(
+            reverse("rating-list"),
+            {"user_id": 7, "edition": self.target_eds[0].id, "rating": 5},
+            format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.counts()[(self.target.id, self.other.id)], 1)
+
+        self.client.delete(reverse("rating-detail", args=[response.data["id"]]))
+        self.assertEqual(self.counts(), {})
+
+    def test_moving_an_edition_moves_its_ratings(self):
+        moved = self.target_eds[0]
+        # user 1 still loves target through its other edition, user 2 stops
+        # loving it, user 3 already loved the work the edition moves to
+        for user in (1, 2, 3):
+            RatingFactory(user_id=user, edition=moved, rating=5)
+        RatingFactory(user_id=1, edition=self.target_eds[1], rating=5)
+        RatingFactory(user_id=2, edition=self.third_ed, rating=5)
+        RatingFactory(user_id=3, edition=self.other_ed, rating=5)
+        RatingFactory(user_id=4, edition=moved, rating=2)
+        minhash.rebuild()
+        RatingChange.objects.all().delete()
+
+        response = self.client.patch(
+            reverse("edition-detail", args=[moved.id]),
+            {"work": self.other.id}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(Rating.objects.filter(edition=moved)
+                             .values_list("work_id", flat=True)),
+                         {self.other.id})
+        current, rebuilt = self.rebuilt_counts()
+        self.assertEqual(current, rebuilt)
+        self.assertEqual(current[(self.other.id, self.third.id)], 1)
+        call_command("check_rating_stats", stdout=StringIO())
+        self.assertTrue(all(WorkMinHash.objects.filter(
+            work__in=[self.target, self.other]).values_list("stale", flat=True)))
+        self.assertEqual(set(RatingChange.objects.values_list(
+            "work_id", flat=True)), {self.target.id, self.other.id})
+
+    def test_limit_min_count_and_cursor(self):
+        # five more works loved alongside target, by 1..5 shared fans
+        works = [WorkFactory(avg_rating=4.0) for _ in range(5)]
+        for n, work in enumerate(works, start=1):
+            edition = BookEditionFactory(work=work)
+            for user in range(1, n + 1):
+                RatingFactory(user_id=user, edition=edition, rating=5)
+        for user in range(1, 6):
+            RatingFactory(user_id=user, edition=self.target_eds[0], rating=5)
+        url = reverse("work-also-loved", args=[self.target.id])
+
+        response = self.client.get(url + "?min_count=2&limit=2")
+        self.assertEqual([w["id"] for w in response.data["results"]],
+                         [works[4].id, works[3].id])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([w["id"] for w in response.data["results"]],
+                         [works[2].id, works[1].id])
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(url + "?min_count=x")
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_walks_ties(self):
+        # equal averages and counts: other_work_id orders the pages
+        works = [WorkFactory(avg_rating=4.0) for _ in range(3)]
+        for work in works:
+            RatingFactory(user_id=1, edition=BookEditionFactory(work=work),
+                          rating=5)
+        RatingFactory(user_id=1, edition=self.target_eds[0], rating=5)
+        url = reverse("work-also-loved", args=[self.target.id]) + "?limit=1"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen += [w["id"] for w in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(seen, [work.id for work in works])
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([w["id"] for w in response.data["results"]],
+                         [works[1].id])
+
+    def test_single_lookup(self):
+        RatingFactory(user_id=1, edition=self.target_eds[0], rating=5)
+        RatingFactory(user_id=1, edition=self.other_ed, rating=5)
+        url = reverse("work-also-loved", args=[self.target.id])
+        # get_object (without the detail view's prefetches), then the lookup
+        with self.assertNumQueries(2):
+            self.client.get(url)
@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase
+
+from bookrating.benchmarks import find_regressions
+
+BASELINE = {
+    "loader": {"ratings": {"rows_per_sec": 100_000.0, "peak_rss_mb": 50.0}},
+    "api": {"also_loved": {"p50_ms": 10.0, "p95_ms": 20.0, "queries": 5,
+                           "peak_kb": 100}},
+}
+
+
+def result(rows_per_sec=100_000.0, p50=10.0, p95=20.0, queries=5,
+           peak_rss_mb=50.0, peak_kb=100):
+    return {
+        "loader": {"ratings": {"rows_per_sec": rows_per_sec,
+                               "peak_rss_mb": peak_rss_mb}},
+        "api": {"also_loved": {"p50_ms": p50, "p95_ms": p95,
+                               "queries": queries, "peak_kb": peak_kb}},
+    }
+
+
+class FindRegressionsTest(SimpleTestCase):
+    def test_within_threshold(self):
+        self.assertEqual(
+            find_regressions(result(rows_per_sec=90_000, p50=11.5), BASELINE, 0.2),
+            [])
+
+    def test_slower_endpoint(self):
+        problems = find_regressions(result(p95=30.0), BASELINE, 0.2)
+        self.assertEqual(problems, ["also_loved p95_ms: 30.00, was 20.00"])
+
+    def test_ignores_sub_millisecond_noise(self):
+        baseline = {"api": {"work-detail": {
+            "p50_ms": 1.0, "p95_ms": 1.0, "queries": 3}}}
+        new = {"api": {"work-detail": {
+            "p50_ms": 1.5, "p95_ms": 1.5, "queries": 3}}}
+        self.assertEqual(find_regressions(new, baseline, 0.2), [])
+
+    def test_slower_loader_and_extra_queries(self):
+        problems = find_regressions(
+            result(rows_per_sec=50_000, queries=6), BASELINE, 0.2)
+        self.assertEqual(len(problems), 2)
+
+    def test_lower_minhash_recall(self):
+        baseline = {"minhash": {"recall": 0.8}}
+        self.assertEqual(
+            find_regressions({"minhash": {"recall": 0.7}}, baseline, 0.2), [])
+        self.assertEqual(
+            find_regressions({"minhash": {"recall": 0.6}}, baseline, 0.2),
+            ["minhash recall: 0.600, was 0.800"])
+
+    def test_more_memory(self):
+        problems = find_regressions(
+            result(peak_rss_mb=80.0, peak_kb=130), BASELINE, 0.2)
+        self.assertEqual(problems, [
+            "loader ratings peak_rss_mb: 80.0, was 50.0",
+            "also_loved peak_kb: 130, was 100"])
+
+    def test_memory_threshold(self):
+        new = result(peak_rss_mb=80.0, peak_kb=130)
+        self.assertEqual(
+            find_regressions(new, BASELINE, 0.2, memory_threshold=0.75), [])
+        self.assertEqual(
+            len(find_regressions(result(peak_kb=110), BASELINE, 0.2,
+                                 memory_threshold=0.05)), 1)
+
+    def test_unmeasured_peak_rss_is_skipped(self):
+        self.assertEqual(
+            find_regressions(result(peak_rss_mb=None), BASELINE, 0.2), [])
@@ -0,0 +1,387 @@
+import csv
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from bookrating import derived
+from bookrating.factories import BookEditionFactory, RatingFactory
+from bookrating.models import (Work, BookEdition, Author, WorkAuthor, Rating,
+                               LoadCheckpoint, StaleRater, WorkCoLove,
+                               WorkMinHash, WorkRatingStats)
+from bookrating.ratings_csv import split_ranges
+
+BOOK_FIELDS = ["book_id", "work_id", "isbn", "isbn13", "authors",
+               "original_publication_year", "original_title", "title",
+               "language_code", "average_rating", "ratings_count",
+               "work_ratings_count"]
+
+BOOK_ROWS = [
+    ["1", "10", "439023483", "9780439023480", "Suzanne Collins", "2008.0",
+     "The Hunger Games", "The Hunger Games (#1)", "eng", "4.34", "100", "120"],
+    ["2", "20", "439554934", "9780439554930", "J.K. Rowling, Mary GrandPré",
+     "1997.0", "", "Harry Potter (#1)", "eng", "4.44", "200", "210"],
+    # second edition of work 10, shared author
+    ["3", "10", "", "", "Suzanne Collins", "", "The Hunger Games",
+     "The Hunger Games (#1)", "", "4.10", "5", "120"],
+    ["4", "30", "", "", "J.K. Rowling", "2005.0", "Half-Blood Prince",
+     "HBP", "en-US", "", "", ""],
+]
+
+
+def write_csv(directory, name, fields, rows):
+    path = Path(directory) / name
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerows(rows)
+    return path
+
+
+def snapshot():
+    # comparable view of everything the books loader writes
+    return (
+        list(Work.objects.order_by("id").values(
+            "id", "title", "original_year", "avg_rating", "ratings_count")),
+        list(BookEdition.objects.order_by("id").values(
+            "id", "work_id", "isbn", "isbn13", "language_code",
+            "ratings_count", "avg_rating")),
+        sorted(Author.objects.values_list("name", flat=True)),
+        sorted(WorkAuthor.objects.values_list("work_id", "author__name")),
+    )
+
+
+class BulkLoadBooksTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.books = write_csv(self.tmp.name, "books.csv",
+                               BOOK_FIELDS, BOOK_ROWS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self, *extra):
+        out = StringIO()
+        call_command("bulk_load", "--books", str(self.books), *extra,
+                     stdout=out)
+        return out.getvalue()
+
+    def test_set_based_matches_row_path(self):
+        self.load()
+        expected = snapshot()
+        WorkAuthor.objects.all().delete()
+        Author.objects.all().delete()
+        Work.objects.all().delete()
+
+        output = self.load("--set-based")
+        self.assertEqual(snapshot(), expected)
+        self.assertIn("rows/sec", output)
+
+    def test_set_based_is_idempotent(self):
+        self.load("--set-based")
+        first = snapshot()
+        self.load("--set-based")
+        self.assertEqual(snapshot(), first)
+        self.assertEqual(WorkAuthor.objects.count(), 4)
+
+    def test_set_based_query_count_independent_of_rows(self):
+        counts = []
+        for first, size in ((1, 10), (1_001, 1_000)):
+            # new ids and authors each time, so both loads insert every row
+            rows = [[str(n), str(n), "", "", f"Author {n}", "2000.0",
+                     f"Work {n}", f"Edition {n}", "eng", "4.00", "10", "10"]
+                    for n in range(first, first + size)]
+            self.books = write_csv(self.tmp.name, "books.csv",
+                                   BOOK_FIELDS, rows)
+            with CaptureQueriesContext(connection) as queries:
+                self.load("--set-based")
+            counts.append(len(queries))
+        self.assertEqual(BookEdition.objects.count(), 1_010)
+        self.assertEqual(WorkAuthor.objects.count(), 1_010)
+        self.assertEqual(counts, [11, 11])
+
+    def test_sync_updates_only_changed_rows(self):
+        self.load("--set-based")
+        newer = [list(r) for r in BOOK_ROWS]
+        newer[0][9] = "4.36"    # edition 1 avg_rating; work 10 follows row 1
+        newer[0][11] = "130"    # work 10 work_ratings_count
+        newer[1][10] = "250"    # edition 2 ratings_count
+        newer.append(["5", "40", "", "", "New Author", "2020.0", "New Book",
+                      "New Book", "eng", "3.90", "7", "7"])
+        self.books = write_csv(self.tmp.name, "books.csv", BOOK_FIELDS, newer)
+
+        output = self.load("--sync")
+        work = Work.objects.get(id=10)
+        self.assertEqual(str(work.avg_rating), "4.36")
+        self.assertEqual(work.ratings_count, 130)
+        self.assertEqual(BookEdition.objects.get(id=2).ratings_count, 250)
+        self.assertEqual(str(BookEdition.objects.get(id=3).avg_rating), "4.10")
+        self.assertIn("Works: 1 inserted, 1 updated, 2 unchanged.", output)
+        self.assertIn("Book editions: 1 inserted, 2 updated, 2 unchanged.",
+                      output)
+
+
+    def test_sync_moves_ratings_with_their_edition(self):
+        self.load("--set-based")
+        for user in (1, 2):
+            Rating.objects.create(user_id=user, edition_id=3, rating=5)
+        Rating.objects.create(user_id=1, edition_id=4, rating=5)
+        moved = [list(r) for r in BOOK_ROWS]
+        moved[2][1] = "30"  # edition 3 moves from work 10 to work 30
+        self.books = write_csv(self.tmp.name, "books.csv", BOOK_FIELDS, moved)
+
+        output = self.load("--sync")
+        self.assertIn("Moved the ratings of 1 editions", output)
+        self.assertEqual(set(Rating.objects.filter(edition_id=3)
+                             .values_list("work_id", flat=True)), {30})
+        self.assertEqual(WorkRatingStats.objects.get(work_id=30).counts(),
+                         [0, 0, 0, 0, 0, 3])
+        self.assertFalse(WorkRatingStats.objects.filter(work_id=10).exists())
+        self.assertFalse(WorkCoLove.objects.exists())
+
+
+class BulkLoadRatingsStreamTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.e1 = BookEditionFactory()
+        self.e2 = BookEditionFactory()
+        # (user, edition) 1/e1 appears twice, in different batches
+        self.ratings_csv = write_csv(
+            self.tmp.name, "ratings.csv", ["user_id", "rating", "book_id"],
+            [[1, 5, self.e1.id], [2, 4, self.e1.id], [1, 3, self.e2.id],
+             [1, 2, self.e1.id], [3, 1, self.e2.id]])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self, *extra):
+        out = StringIO()
+        call_command("bulk_load", "--ratings", str(self.ratings_csv), "--stream",
+                     "--batch-size", "2", "--commit-every", "1", *extra,
+                     stdout=out)
+        return out.getvalue()
+
+    def loaded(self):
+        return set(Rating.objects.values_list("user_id", "edition_id", "rating"))
+
+    def test_stream_keeps_first_duplicate(self):
+        output = self.load()
+        self.assertEqual(self.loaded(), {
+            (1, self.e1.id, 5), (2, self.e1.id, 4),
+            (1, self.e2.id, 3), (3, self.e2.id, 1)})
+        self.assertIn("Inserted 4 new ratings", output)
+        self.assertIn("rows/sec", output)
+
+    def test_stream_update_overwrites_existing(self):
+        self.load()
+        self.load("--on-conflict", "update")
+        self.assertIn((1, self.e1.id, 2), self.loaded())
+        self.assertEqual(Rating.objects.count(), 4)
+
+    def test_resume_skips_committed_batches(self):
+        real_bulk_create = Rating.objects.bulk_create
+        calls = []
+
+        def crash_on_fourth_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 4:
+                raise RuntimeError("killed")
+            return real_bulk_create(*args, **kwargs)
+
+        # batches of one row, two per transaction: rows 3-4 are rolled back
+        with mock.patch.object(Rating.objects, "bulk_create",
+                               side_effect=crash_on_fourth_batch):
+            with self.assertRaises(RuntimeError):
+                self.load("--batch-size", "1", "--commit-every", "2")
+        self.assertEqual(Rating.objects.count(), 2)
+        self.assertEqual(LoadCheckpoint.objects.get().rows, 2)
+
+        output = self.load("--batch-size", "1", "--commit-every", "2",
+                           "--resume")
+        self.assertIn("Resuming at byte", output)
+        self.assertIn("Inserted 2 new ratings; 1 rows skipped", output)
+        self.assertEqual(LoadCheckpoint.objects.get().rows, 5)
+
+    def test_resume_without_checkpoint_starts_over(self):
+        output = self.load("--resume")
+        self.assertIn("No checkpoint for this file", output)
+        self.assertEqual(Rating.objects.count(), 4)
+
+    def test_workers_load_same_rows(self):
+        output = self.load("--workers", "2")
+        self.assertEqual(Rating.objects.count(), 4)
+        self.assertIn((1, self.e2.id, 3), self.loaded())
+        self.assertIn("Inserted 4 new ratings", output)
+
+    def test_invalid_lines_are_skipped_and_counted(self):
+        self.ratings_csv = write_csv(
+            self.tmp.name, "invalid.csv", ["user_id", "rating", "book_id"],
+            [[1, 5, self.e1.id], [2, "x", self.e1.id], [3, 9, self.e2.id],
+             [4, 2, self.e2.id]])
+        for extra in ((), ("--workers", "2")):
+            with self.subTest(extra=extra):
+                Rating.objects.all().delete()
+                err = StringIO()
+                call_command("bulk_load", "--ratings", str(self.ratings_csv),
+                             "--stream", "--batch-size", "2", *extra,
+                             stdout=StringIO(), stderr=err)
+                self.assertEqual(Rating.objects.count(), 2)
+                self.assertIn("Skipped 2 invalid lines.", err.getvalue())
+
+    def test_split_ranges_cover_every_line(self):
+        lines = []
+        for start, end in split_ranges(self.ratings_csv, 3):
+            with open(self.ratings_csv, "rb") as f:
+                f.seek(start)
+                lines += f.read(end - start).splitlines()
+        self.assertEqual(len(lines), 5)
+
+
+class DerivedRefreshTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.editions = [BookEditionFactory() for _ in range(6)]
+        # users 1-3 love editions 0 and 1; user 4 loves 2 and 3
+        for user, editions in ((1, [0, 1]), (2, [0, 1]), (3, [0, 1]),
+                               (4, [2, 3])):
+            for index in editions:
+                RatingFactory(user_id=user, edition=self.editions[index],
+                              rating=5)
+        derived.rebuild_all()
+        StaleRater.objects.all().delete()
+        # written past the signals, so the derived tables miss it
+        Rating.objects.bulk_create([Rating(
+            user_id=5, edition=self.editions[5], rating=2)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self, rows, *extra):
+        path = write_csv(self.tmp.name, "ratings.csv",
+                         ["user_id", "rating", "book_id"], rows)
+        out = StringIO()
+        call_command("bulk_load", "--ratings", str(path), "--stream", *extra,
+                     stdout=out)
+        return out.getvalue()
+
+    def derived_rows(self):
+        return (set(WorkCoLove.objects.values_list(
+                    "work_id", "other_work_id", "five_star_count")),
+                dict(WorkRatingStats.objects.values_list("work_id", "count_5")),
+                dict(WorkMinHash.objects.values_list("work_id", "fans")))
+
+    def test_only_touched_works_are_refreshed(self):
+        # user 4 also loves edition 0: pairs with works 2 and 3
+        output = self.load([[4, 5, self.editions[0].id]])
+        self.assertIn("Refreshed", output)
+        refreshed = self.derived_rows()
+        self.assertFalse(WorkRatingStats.objects.filter(
+            work=self.editions[5].work).exists())
+        self.assertEqual(set(StaleRater.objects.values_list(
+            "user_id", flat=True)), {4})
+
+        # what a full rebuild gives, apart from the untouched work
+        derived.rebuild_all()
+        pairs, stats, fans = self.derived_rows()
+        del stats[self.editions[5].work_id]
+        self.assertEqual(refreshed, (pairs, stats, fans))
+        self.assertIn((self.editions[0].work_id, self.editions[2].work_id, 1),
+                      pairs)
+
+    def test_full_refresh(self):
+        output = self.load([[4, 5, self.editions[0].id]], "--full-refresh")
+        self.assertIn("Refreshed", output)
+        self.assertEqual(WorkRatingStats.objects.get(
+            work=self.editions[5].work).count_2, 1)
+
+
+class BulkLoadFastTest(TransactionTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.edition = BookEditionFactory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self, rows, *extra):
+        path = write_csv(self.tmp.name, "ratings.csv",
+                         ["user_id", "rating", "book_id"], rows)
+        out = StringIO()
+        call_command("bulk_load", "--ratings", str(path), "--fast", *extra,
+                     stdout=out)
+        return out.getvalue()
+
+    def rating_indexes(self):
+        with connection.cursor() as cursor:
+            return {c.get("name") for c in connection.introspection
+                    .get_constraints(cursor, Rating._meta.db_table).values()
+                    if c["index"] or c["unique"]}
+
+    def test_fast_load_rebuilds_indexes(self):
+        indexes = self.rating_indexes()
+        output = self.load([[1, 5, self.edition.id], [2, 3, self.edition.id]],
+                           "--stream")
+        self.assertEqual(Rating.objects.count(), 2)
+        self.assertEqual(self.rating_indexes(), indexes)
+        self.assertIn("Inserted 2 ratings and rebuilt", output)
+
+    def test_duplicate_rolls_back_whole_load(self):
+        Rating.objects.create(user_id=1, edition=self.edition, rating=4)
+        indexes = self.rating_indexes()
+        with self.assertRaisesMessage(CommandError, "1 (user_id, edition) pairs"):
+            self.load([[2, 5, self.edition.id], [1, 3, self.edition.id]],
+                      "--stream")
+        self.assertEqual(
+            list(Rating.objects.values_list("user_id", "rating")), [(1, 4)])
+        self.assertEqual(self.rating_indexes(), indexes)
+
+
+class LoaderCommandTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        write_csv(self.tmp.name, "filtered_books.csv", BOOK_FIELDS, BOOK_ROWS)
+        write_csv(self.tmp.name, "filtered_ratings.csv",
+                  ["user_id", "rating", "book_id"],
+                  [[1, 5, 1], [1, 4, 2], [2, 3, 3], [1, 5, 1]])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self, *extra):
+        out = StringIO()
+        call_command("loader", "--data-dir", self.tmp.name, *extra,
+                     stdout=out)
+        return out.getvalue()
+
+    def test_resets_by_default(self):
+        stale = BookEditionFactory()
+        self.load()
+        self.assertFalse(BookEdition.objects.filter(id=stale.id).exists())
+
+    def test_no_reset_keeps_existing_data(self):
+        kept = BookEditionFactory()
+        Rating.objects.create(user_id=9, edition=kept, rating=1)
+        self.load("--no-reset")
+        self.assertTrue(BookEdition.objects.filter(id=kept.id).exists())
+        self.assertEqual(Rating.objects.count(), 4)
+
+    def test_limit_books_filters_ratings(self):
+        output = self.load("--limit-books", "2")
+        self.assertEqual(sorted(BookEdition.objects.values_list("id", flat=True)),
+                         [1, 2])
+        self.assertEqual(Rating.objects.count(), 2)
+        self.assertIn("skipped 2 duplicate or out-of-subset", output)
+
+    def test_reset_clears_existing_data(self):
+        stale = BookEditionFactory()
+        Rating.objects.create(user_id=9, edition=stale, rating=1)
+        self.load("--reset")
+        self.assertFalse(BookEdition.objects.filter(id=stale.id).exists())
+        self.assertFalse(Work.objects.filter(id=stale.work_id).exists())
+        self.assertEqual(Rating.objects.count(), 3)
@@ -0,0 +1,96 @@
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.test import APITestCase
+
+from bookrating import aggregates, derived
+from bookrating.factories import (AuthorFactory, BookEditionFactory,
+                                  RatingFactory, WorkFactory)
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.author = AuthorFactory()
+        self.work = WorkFactory()
+        self.other = WorkFactory()
+        self.work.authors.add(self.author)
+        self.other.authors.add(self.author)
+        self.edition = BookEditionFactory(work=self.work)
+        self.other_edition = BookEditionFactory(work=self.other)
+        self.urls = [reverse("work-detail", args=[self.work.pk]),
+                     reverse("work-ratings", args=[self.work.pk]),
+                     reverse("author-works", args=[self.author.pk])]
+
+    def etags(self):
+        return [self.client.get(url)["ETag"] for url in self.urls]
+
+    def assertNotModified(self, url, etag):
+        # one lookup of the version stamp, and no view queries
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified(self):
+        for url, etag in zip(self.urls, self.etags()):
+            with self.subTest(url=url):
+                self.assertNotModified(url, etag)
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.urls[0])
+        self.assertIn("Last-Modified", response)
+        self.assertEqual(self.client.get(
+            self.urls[0], HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+            .status_code, 304)
+        self.assertEqual(self.client.get(
+            self.urls[0], HTTP_IF_MODIFIED_SINCE=http_date(0)).status_code, 200)
+
+    def test_plain_requests_cost_no_extra_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.urls[1])
+        self.assertIn("ETag", response)
+
+    def test_variants_differ(self):
+        self.assertNotEqual(
+            self.client.get(self.urls[0])["ETag"],
+            self.client.get(self.urls[0], {"fields": "title"})["ETag"])
+
+    def test_writes_change_the_etags(self):
+        writes = [
+            lambda: RatingFactory(user_id=1, edition=self.edition, rating=4),
+            lambda: self.client.patch(
+                reverse("edition-detail", args=[self.edition.pk]),
+                {"isbn": "0123456789"}, format="json"),
+            lambda: self.client.patch(self.urls[0], {"title": "New"},
+                                      format="json"),
+            lambda: self.work.authors.add(AuthorFactory()),
+            lambda: self.client.patch(
+                reverse("author-detail", args=[self.author.pk]),
+                {"name": "Renamed"}, format="json"),
+            lambda: BookEditionFactory(work=self.work),
+            derived.rebuild_all,
+        ]
+        for write in writes:
+            before = self.etags()
+            write()
+            after = self.etags()
+            self.assertTrue(all(b != a for b, a in zip(before, after)))
+
+    def test_other_works_keep_their_etags(self):
+        before = self.etags()
+        RatingFactory(user_id=1, edition=self.other_edition, rating=4)
+        after = self.etags()
+        self.assertEqual(before[:2], after[:2])
+        self.assertNotEqual(before[2], after[2])  # the author's list
+
+    def test_recompute_aggregates(self):
+        RatingFactory(user_id=1, edition=self.edition, rating=1)
+        before = self.etags()
+        aggregates.recompute()
+        self.assertNotEqual(before[0], self.etags()[0])
+
+    def test_missing_objects(self):
+        for url in (reverse("work-detail", args=[999_999]),
+                    reverse("author-works", args=[999_999])):
+            self.assertEqual(self.client.get(
+                url, HTTP_IF_NONE_MATCH="*").status_code, 404)
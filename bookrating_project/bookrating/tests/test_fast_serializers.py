@@ -0,0 +1,86 @@
+import datetime
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from bookrating.factories import (AuthorFactory, BookEditionFactory,
+                                  RatingFactory, WorkFactory)
+from bookrating.models import BookEdition, Rating, Work
+from bookrating.renderers import ORJSONRenderer
+from bookrating.serializers import (BookEditionSerializer, RatingSerializer,
+                                    WorkListSerializer)
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    def test_matches_json_renderer(self):
+        data = {"title": "Café \u2028 \u2029 \"quoted\" \U0001F600",
+                "ids": [1, -2, 2 ** 40], "avg": "4.20", "missing": None,
+                "ok": True, 3: "int key", "score": 0.1234,
+                "when": datetime.datetime(2024, 1, 2, 3, 4, 5, 678901,
+                                          tzinfo=datetime.timezone.utc),
+                "exact": Decimal("1.50")}
+        self.assertEqual(ORJSONRenderer().render(data),
+                         JSONRenderer().render(data))
+
+    def test_indent_falls_back(self):
+        self.assertEqual(
+            ORJSONRenderer().render(
+                {"a": 1}, "application/json; indent=2"),
+            JSONRenderer().render({"a": 1}, "application/json; indent=2"))
+
+
+class FastListEndpointsTest(APITestCase):
+    """The values_list endpoints return what their ModelSerializers did."""
+
+    def setUp(self):
+        self.author = AuthorFactory()
+        co_author = AuthorFactory()
+        for n in range(3):
+            work = WorkFactory(title=f"Título\u2028{n}", avg_rating=4 - n / 3,
+                               original_year=None if n == 1 else 1990 + n)
+            work.authors.add(co_author, self.author)
+            for _ in range(2):
+                edition = BookEditionFactory(work=work, isbn=None,
+                                             avg_rating=Decimal("3.5"))
+                RatingFactory(user_id=n, edition=edition, rating=n)
+        self.work = work
+
+    def expected(self, response, serializer_class, objects, paginated=False):
+        data = serializer_class(objects, many=True, context={
+            "request": response.wsgi_request}).data
+        if paginated:
+            data = {"next": None, "previous": None, "results": data}
+        return JSONRenderer().render(data)
+
+    def test_work_list(self):
+        response = self.client.get(reverse("work-list"))
+        self.assertEqual(response.content, self.expected(
+            response, WorkListSerializer,
+            list(Work.objects.prefetch_related("authors")
+                 .order_by("-avg_rating", "id")), paginated=True))
+
+    def test_author_works(self):
+        response = self.client.get(
+            reverse("author-works", args=[self.author.pk]))
+        self.assertEqual(response.content, self.expected(
+            response, WorkListSerializer,
+            list(self.author.works.prefetch_related("authors")
+                 .order_by("-avg_rating"))))
+
+    def test_editions(self):
+        response = self.client.get(
+            reverse("work-editions", args=[self.work.pk]))
+        self.assertEqual(response.content, self.expected(
+            response, BookEditionSerializer,
+            list(BookEdition.objects.filter(work=self.work))))
+        self.assertEqual(self.client.get(
+            reverse("work-editions", args=[999_999])).status_code, 404)
+
+    def test_rating_list(self):
+        response = self.client.get(reverse("rating-list"))
+        self.assertEqual(response.content, self.expected(
+            response, RatingSerializer, list(Rating.objects.order_by("id")),
+            paginated=True))
@@ -0,0 +1,65 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+from bookrating import minhash, models
+
+
+class BackfillMigrationTest(TransactionTestCase):
+    """Tables added after ratings exist are filled by their migration."""
+
+    def migrate(self, target=None):
+        """Migrate to `target` (the latest migration when None)."""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        nodes = ([("bookrating", target)] if target
+                 else executor.loader.graph.leaf_nodes("bookrating"))
+        executor.migrate(nodes)
+        return executor.loader.project_state(nodes).apps
+
+    def setUp(self):
+        apps = self.migrate("0003_loadcheckpoint")
+        Work = apps.get_model("bookrating", "Work")
+        BookEdition = apps.get_model("bookrating", "BookEdition")
+        Rating = apps.get_model("bookrating", "Rating")
+        for work_id in (1, 2, 3):
+            Work.objects.create(id=work_id, title=f"Work {work_id}",
+                                avg_rating=0, ratings_count=0)
+            BookEdition.objects.create(id=work_id, work_id=work_id,
+                                       avg_rating=0, ratings_count=0)
+        # users 1-5 love works 1 and 2, users 6-10 works 1 and 3
+        for user_id in range(1, 11):
+            for edition_id in (1, 2 if user_id <= 5 else 3):
+                Rating.objects.create(user_id=user_id, edition_id=edition_id,
+                                      rating=5)
+
+    def tearDown(self):
+        self.migrate()
+
+    def test_colove_is_filled(self):
+        apps = self.migrate("0004_workcolove")
+        WorkCoLove = apps.get_model("bookrating", "WorkCoLove")
+        self.assertEqual(
+            set(WorkCoLove.objects.values_list(
+                "work_id", "other_work_id", "five_star_count")),
+            {(1, 2, 5), (2, 1, 5), (1, 3, 5), (3, 1, 5)})
+
+    def test_minhash_signatures_are_filled(self):
+        apps = self.migrate("0005_minhash")
+        WorkMinHash = apps.get_model("bookrating", "WorkMinHash")
+        WorkLshBucket = apps.get_model("bookrating", "WorkLshBucket")
+        self.assertEqual(dict(WorkMinHash.objects.values_list("work_id", "fans")),
+                         {1: 10, 2: 5, 3: 5})
+        self.assertEqual(WorkLshBucket.objects.count(), 3 * minhash.BANDS)
+
+        # the signatures are those update_minhash would write
+        self.migrate()
+        stored = dict(WorkMinHash.objects.values_list("work_id", "signature"))
+        buckets = sorted(WorkLshBucket.objects.values_list("work_id", "key"))
+        minhash.rebuild()
+        self.assertEqual(buckets, sorted(
+            models.WorkLshBucket.objects.values_list("work_id", "key")))
+        self.assertEqual(
+            {work_id: bytes(sig) for work_id, sig in stored.items()},
+            {work_id: bytes(sig) for work_id, sig in
+             models.WorkMinHash.objects.values_list("work_id", "signature")})
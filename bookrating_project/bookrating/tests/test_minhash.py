@@ -0,0 +1,93 @@
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating import minhash
+from bookrating.factories import BookEditionFactory, RatingFactory, WorkFactory
+from bookrating.models import WorkMinHash
+
+
+class SignatureTest(SimpleTestCase):
+    def test_agreement_estimates_jaccard(self):
+        # fans 0..599 and 300..899: Jaccard 300 / 900
+        users = np.concatenate([np.arange(600), np.arange(300, 900)])
+        works = np.repeat([1, 2], 600)
+        ids, sigs = minhash.signatures(works, users)
+        self.assertEqual(ids.tolist(), [1, 2])
+        estimate = (sigs[0] == sigs[1]).mean()
+        error = np.sqrt(1 / 3 * 2 / 3 / minhash.NUM_PERM)
+        self.assertLess(abs(estimate - 1 / 3), 4 * error)
+
+    def test_chunks_do_not_change_signatures(self):
+        rng = np.random.default_rng(1)
+        works = np.sort(rng.integers(0, 50, size=5_000))
+        users = rng.integers(0, 10_000, size=5_000)
+        _, whole = minhash.signatures(works, users)
+        old, minhash.CHUNK_ROWS = minhash.CHUNK_ROWS, 70
+        try:
+            _, chunked = minhash.signatures(works, users)
+        finally:
+            minhash.CHUNK_ROWS = old
+        np.testing.assert_array_equal(whole, chunked)
+
+    def test_band_keys_are_stable(self):
+        signature = np.arange(minhash.NUM_PERM, dtype=np.uint32)
+        keys = minhash.band_keys(signature)
+        self.assertEqual(len(set(keys.tolist())), minhash.BANDS)
+        np.testing.assert_array_equal(keys, minhash.band_keys(signature.copy()))
+
+
+class ApproxAlsoLovedTest(APITestCase):
+    def setUp(self):
+        self.target, self.twin, self.other = (WorkFactory() for _ in range(3))
+        self.target_ed = BookEditionFactory(work=self.target)
+        self.twin_ed = BookEditionFactory(work=self.twin)
+        self.other_ed = BookEditionFactory(work=self.other)
+        for user in range(1, 21):
+            RatingFactory(user_id=user, edition=self.target_ed, rating=5)
+            RatingFactory(user_id=user, edition=self.twin_ed, rating=5)
+        self.url = reverse("work-also-loved", args=[self.target.id])
+
+    def test_identical_fan_sets(self):
+        call_command("update_minhash", "--full", stdout=StringIO())
+        response = self.client.get(self.url + "?approx=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["expected_error"],
+                         round(0.5 / minhash.NUM_PERM ** 0.5, 4))
+        [work] = response.data["results"]
+        self.assertEqual((work["id"], work["jaccard"], work["jaccard_error"],
+                          work["five_star_count"]), (self.twin.id, 1.0, 0.0, 20))
+
+    def test_rating_writes_mark_signatures_stale(self):
+        call_command("update_minhash", "--full", stdout=StringIO())
+        RatingFactory(user_id=1, edition=self.other_ed, rating=5)
+        RatingFactory(user_id=21, edition=self.twin_ed, rating=5)
+        # the twin's signature is flagged; the other work's first fan is
+        # found by update_minhash
+        self.assertTrue(WorkMinHash.objects.get(work=self.twin).stale)
+        self.assertFalse(WorkMinHash.objects.get(work=self.target).stale)
+        self.assertFalse(WorkMinHash.objects.filter(work=self.other).exists())
+
+        out = StringIO()
+        call_command("update_minhash", stdout=out)
+        self.assertIn("Recomputed 2 stale signatures", out.getvalue())
+        signature = WorkMinHash.objects.get(work=self.other)
+        self.assertEqual((signature.stale, signature.fans), (False, 1))
+        self.assertEqual(WorkMinHash.objects.get(work=self.twin).fans, 21)
+
+    def test_deleting_a_rated_work(self):
+        call_command("update_minhash", "--full", stdout=StringIO())
+        self.twin.delete()
+        response = self.client.delete(
+            reverse("work-detail", args=[self.target.id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(WorkMinHash.objects.exists())
+        self.assertEqual(minhash.refresh_stale(), 0)
+
+    def test_approx_with_algo_is_rejected(self):
+        response = self.client.get(self.url + "?approx=1&algo=cosine")
+        self.assertEqual(response.status_code, 400)
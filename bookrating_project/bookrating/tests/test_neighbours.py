@@ -0,0 +1,83 @@
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating.factories import BookEditionFactory, RatingFactory
+from bookrating.models import StaleRater, UserNeighbour
+from bookrating.neighbours import NeighbourModel
+from bookrating.recommender import CsrMatrix
+
+
+class NeighbourModelTest(SimpleTestCase):
+    def test_scores_match_dense_formulas(self):
+        rng = np.random.default_rng(5)
+        dense = rng.integers(1, 6, size=(12, 9)) * (rng.random((12, 9)) < 0.6)
+        rows, cols = np.nonzero(dense)
+        matrix = CsrMatrix.from_coo(rows, cols, dense[rows, cols].astype(
+            np.float32), dense.shape)
+        model = NeighbourModel(matrix, np.arange(100, 112))
+
+        rated = dense > 0
+        means = dense.sum(axis=1) / rated.sum(axis=1)
+        centred = np.where(rated, dense - means[:, None], 0)
+        common, cosine, pearson = model.scores(3)
+        expected_common = (rated & rated[3]).sum(axis=1)
+        expected_common[3] = 0
+        np.testing.assert_array_equal(common, expected_common)
+        np.testing.assert_allclose(cosine, dense @ dense[3] / (
+            np.linalg.norm(dense, axis=1) * np.linalg.norm(dense[3])))
+        np.testing.assert_allclose(pearson, centred @ centred[3] / (
+            np.linalg.norm(centred, axis=1) * np.linalg.norm(centred[3])))
+
+        found = model.neighbours(3, k=2, min_common=1)["cosine"]
+        self.assertEqual(len(found), 2)
+        self.assertGreaterEqual(found[0][1], found[1][1])
+
+
+class SimilarUsersAPITest(APITestCase):
+    def setUp(self):
+        self.editions = [BookEditionFactory() for _ in range(3)]
+        # users 1 and 2 agree, user 3 rates the other way round
+        for user, ratings in {1: [5, 3, 1], 2: [5, 3, 2], 3: [1, 3, 5]}.items():
+            for edition, rating in zip(self.editions, ratings):
+                RatingFactory(user_id=user, edition=edition, rating=rating)
+        self.url = reverse("user-similar", args=[1])
+
+    def build(self, *args):
+        out = StringIO()
+        call_command("build_neighbours", "--min-common=2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_pearson_ranks_agreeing_users_first(self):
+        self.build()
+        response = self.client.get(self.url + "?metric=pearson")
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([r["user_id"] for r in results], [2, 3])
+        self.assertGreater(results[0]["score"], 0.9)
+        self.assertLess(results[1]["score"], -0.9)
+        self.assertEqual(results[0]["common"], 3)
+
+        response = self.client.get(self.url + "?limit=1")
+        self.assertEqual(response.data["metric"], "cosine")
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_refresh_recomputes_changed_users_only(self):
+        self.assertIn("of 3 all users", self.build())
+        self.assertFalse(StaleRater.objects.exists())
+        RatingFactory(user_id=4, edition=self.editions[0], rating=5)
+        RatingFactory(user_id=4, edition=self.editions[1], rating=3)
+        self.assertIn("of 1 changed users", self.build())
+        self.assertEqual(
+            list(UserNeighbour.objects.filter(user_id=4, metric="cosine")
+                 .values_list("neighbour_id", flat=True).order_by("neighbour_id")),
+            [1, 2, 3])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        response = self.client.get(self.url + "?metric=jaccard")
+        self.assertEqual(response.status_code, 400)
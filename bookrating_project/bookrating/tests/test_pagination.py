@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating.factories import (BookEditionFactory, RatingFactory,
+                                  WorkFactory)
+from bookrating.models import Rating, Work
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        # runs of equal averages longer than a page, so pages start and
+        # end in the middle of ties
+        for n in range(11):
+            WorkFactory(avg_rating=Decimal("4.00") if n % 3 else Decimal("3.50"))
+        edition = BookEditionFactory()
+        for user in range(25):
+            RatingFactory(user_id=user, edition=edition)
+
+    def walk(self, url):
+        """The ids on every page, following next links and then previous."""
+        forward, backward = [], []
+        while url:
+            response = self.client.get(url)
+            forward.append([item.get("id") or item["url"]
+                            for item in response.data["results"]])
+            last, url = url, response.data["next"]
+        url = self.client.get(last).data["previous"]
+        while url:
+            response = self.client.get(url)
+            backward.insert(0, [item.get("id") or item["url"]
+                                for item in response.data["results"]])
+            url = response.data["previous"]
+        return forward, backward + forward[-1:]
+
+    def test_works_ordered_by_rating_then_id(self):
+        forward, backward = self.walk(reverse("work-list") + "?limit=2")
+        expected = list(Work.objects.order_by("-avg_rating", "id")
+                        .values_list("id", flat=True))
+        self.assertEqual(sum(forward, []), expected)
+        self.assertEqual(forward, backward)
+        self.assertEqual({len(page) for page in forward[:-1]}, {2})
+
+    def test_ratings_ordered_by_id(self):
+        forward, backward = self.walk(reverse("rating-list") + "?limit=10")
+        self.assertEqual(sum(forward, []), list(
+            Rating.objects.order_by("id").values_list("id", flat=True)))
+        self.assertEqual(forward, backward)
+
+    def test_editions_ordered_by_id(self):
+        response = self.client.get(reverse("edition-list"))
+        ids = [item["id"] for item in response.data["results"]]
+        self.assertEqual(ids, sorted(ids))
+        self.assertNotIn("count", response.data)
+
+    def test_no_count_query(self):
+        first = self.client.get(reverse("rating-list") + "?limit=5")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data["next"])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("COUNT", queries[0]["sql"].upper())
+
+    def test_invalid_cursor(self):
+        for cursor in ("junk", "cD1bIngiXQ==", "cD1bIjEiLCAiMiJd"):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    reverse("rating-list") + f"?cursor={cursor}")
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,116 @@
+import re
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating import minhash
+from bookrating.factories import (AuthorFactory, BookEditionFactory,
+                                  RatingFactory, WorkFactory)
+from bookrating.models import (Rating, RatingChange, StaleRater, UserNeighbour,
+                               WorkAuthor, WorkCoLove, WorkLshBucket)
+
+# tables that grow with the number of ratings; a scan of one of them (or of
+# a whole index on it) reads millions of rows on a full dataset
+LARGE_TABLES = {model._meta.db_table for model in (
+    Rating, RatingChange, StaleRater, UserNeighbour, WorkCoLove, WorkLshBucket)}
+
+# `"table" alias` in Django's SQL, e.g. FROM "bookrating_rating" U0
+ALIAS = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)\b')
+SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def full_scans(sql):
+    """The LARGE_TABLES that EXPLAIN QUERY PLAN says `sql` scans in full."""
+    if not sql.lstrip().upper().startswith(
+            ("SELECT", "INSERT", "UPDATE", "DELETE")):
+        return []
+    tables = dict((alias, table) for table, alias in ALIAS.findall(sql))
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        plan = [row[-1] for row in cursor.fetchall()]
+    scans = []
+    for step in plan:
+        match = SCAN.match(step)
+        if match and tables.get(match[1], match[1]) in LARGE_TABLES:
+            scans.append(step)
+    return scans
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite's")
+class QueryPlanTest(APITestCase):
+    def setUp(self):
+        self.author = AuthorFactory()
+        self.works = [WorkFactory() for _ in range(3)]
+        for work in self.works:
+            WorkAuthor.objects.create(work=work, author=self.author)
+        self.editions = [BookEditionFactory(work=work) for work in self.works]
+        for user in range(1, 4):
+            for edition in self.editions:
+                RatingFactory(user_id=user, edition=edition, rating=5)
+        minhash.rebuild()
+        call_command("build_neighbours", "--min-common=1", stdout=StringIO())
+
+    def assertNoFullScans(self, send):
+        # errors raise in the test client; a 503 (no recommendation model
+        # here) has still run the view's queries
+        with CaptureQueriesContext(connection) as queries:
+            send()
+        scans = {query["sql"]: full_scans(query["sql"])
+                 for query in queries.captured_queries}
+        self.assertEqual({sql: steps for sql, steps in scans.items() if steps},
+                         {})
+
+    def test_detects_full_scans(self):
+        self.assertEqual(full_scans(str(Rating.objects.filter(rating=5).query)),
+                         [])  # rating_fans
+        # no index can answer these, so both tables are read in full
+        sql = str(WorkCoLove.objects.filter(five_star_count__in=Rating.objects
+                  .filter(rating__gt=F("user_id")).values("rating")).query)
+        self.assertEqual(len(full_scans(sql)), 2)
+
+    def test_read_endpoints(self):
+        work = self.works[0].id
+        urls = [
+            reverse("work-list"),
+            reverse("work-detail", args=[work]),
+            reverse("work-detail", args=[work]) + "?expand=authors,editions",
+            reverse("work-ratings", args=[work]),
+            reverse("work-editions", args=[work]),
+            reverse("work-also-loved", args=[work]),
+            reverse("work-also-loved", args=[work]) + "?min_count=2&limit=1",
+            reverse("work-also-loved", args=[work]) + "?approx=1",
+            reverse("work-top-rated-by-author") + f"?author={self.author.name}",
+            reverse("author-works", args=[self.author.id]),
+            reverse("edition-detail", args=[self.editions[0].id]),
+            reverse("rating-detail", args=[Rating.objects.first().id]),
+            reverse("user-recommendations", args=[1]),
+            reverse("user-similar", args=[1]),
+            # the first page is an unfiltered scan in id order that stops at
+            # the LIMIT; from the second page on the cursor makes it a range
+            self.client.get(reverse("rating-list") + "?limit=2").data["next"],
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNoFullScans(lambda: self.client.get(url))
+
+    def test_rating_writes(self):
+        # the signal handlers' lookups as well as the writes themselves
+        url = reverse("rating-list")
+        response = self.client.post(url, {
+            "user_id": 9, "edition": self.editions[0].id, "rating": 5},
+            format="json")
+        detail = reverse("rating-detail", args=[response.data["id"]])
+        self.assertNoFullScans(lambda: self.client.post(url, {
+            "user_id": 9, "edition": self.editions[1].id, "rating": 5},
+            format="json"))
+        self.assertNoFullScans(lambda: self.client.patch(
+            detail, {"edition": self.editions[2].id}, format="json"))
+        self.assertNoFullScans(lambda: self.client.patch(
+            detail, {"rating": 2}, format="json"))
+        self.assertNoFullScans(lambda: self.client.delete(detail))
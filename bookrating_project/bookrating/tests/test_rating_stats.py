@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating.factories import BookEditionFactory, RatingFactory, WorkFactory
+from bookrating.models import Rating, WorkRatingStats
+
+
+class WorkRatingStatsTest(APITestCase):
+    def setUp(self):
+        self.work = WorkFactory()
+        self.editions = [BookEditionFactory(work=self.work) for _ in range(2)]
+        self.url = reverse("work-ratings", args=[self.work.id])
+
+    def check(self):
+        call_command("check_rating_stats", stdout=StringIO())
+
+    def test_api_writes_keep_histogram_current(self):
+        ratings_url = reverse("rating-list")
+        created = [self.client.post(ratings_url, {
+            "user_id": user, "edition": edition.id, "rating": value},
+            format="json").data
+            for user, edition, value in [(1, self.editions[0], 5),
+                                         (2, self.editions[1], 3),
+                                         (3, self.editions[0], 3)]]
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, {"sample_average_rating": 3.67,
+                                         "sample_total_ratings": 3,
+                                         "distribution": {3: 2, 5: 1}})
+
+        # change a rating, then move one to another work and delete one
+        self.client.put(reverse("rating-detail", args=[created[1]["id"]]), {
+            "user_id": 2, "edition": self.editions[1].id, "rating": 4},
+            format="json")
+        other = BookEditionFactory()
+        rating = Rating.objects.get(pk=created[2]["id"])
+        rating.edition = other
+        rating.save()
+        self.client.delete(reverse("rating-detail", args=[created[0]["id"]]))
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["distribution"], {4: 1})
+        self.assertEqual(
+            WorkRatingStats.objects.get(work=other.work).counts(),
+            [0, 0, 0, 1, 0, 0])
+        self.check()
+
+    def test_single_query_and_unrated_work(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data, {"sample_average_rating": None,
+                                         "sample_total_ratings": 0,
+                                         "distribution": {}})
+        missing = reverse("work-ratings", args=[999_999])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_check_detects_and_fixes_drift(self):
+        RatingFactory(user_id=1, edition=self.editions[0], rating=2)
+        # bulk_create bypasses the signals
+        Rating.objects.bulk_create(
+            [Rating(user_id=2, edition=self.editions[1], rating=2)])
+        with self.assertRaises(CommandError):
+            self.check()
+        out = StringIO()
+        call_command("check_rating_stats", "--fix", stdout=out)
+        self.assertIn("1 works differed", out.getvalue())
+        self.check()
+        self.assertEqual(self.work.rating_stats.counts()[2], 2)
@@ -112,3 +112,25 @@ class RatingAPITest(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Rating.objects.filter(id=created_rating_id).exists())
+
+    def test_work_follows_edition(self):
+        response = self.client.post(self.url, self.init_data, format="json")
+        self.assertEqual(response.data["work"], self.edition.work_id)
+        other = BookEditionFactory()
+        url = reverse("rating-detail", args=[response.data["id"]])
+        response = self.client.patch(url, {"edition": other.id}, format="json")
+        self.assertEqual(response.data["work"], other.work_id)
+        self.assertEqual(Rating.objects.get().work_id, other.work_id)
+
+        # the client cannot set it
+        response = self.client.patch(url, {"work": self.edition.work_id},
+                                     format="json")
+        self.assertEqual(response.data["work"], other.work_id)
+
+    def test_bulk_create_fills_in_work(self):
+        Rating.objects.bulk_create(
+            [Rating(user_id=user, edition=self.edition, rating=3)
+             for user in range(3)])
+        self.assertEqual(
+            set(Rating.objects.values_list("work_id", flat=True)),
+            {self.edition.work_id})
@@ -0,0 +1,63 @@
+import tempfile
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating import recommender
+from bookrating.factories import BookEditionFactory, RatingFactory
+
+
+class TrainAlsTest(SimpleTestCase):
+    def test_fits_a_low_rank_matrix(self):
+        rng = np.random.default_rng(3)
+        dense = np.clip(np.rint(3 + rng.normal(size=(40, 2))
+                                @ rng.normal(size=(2, 15))), 1, 5)
+        rows, cols = np.nonzero(rng.random(dense.shape) < 0.6)
+        matrix = recommender.CsrMatrix.from_coo(
+            rows, cols, dense[rows, cols].astype(np.float32), dense.shape)
+        errors = []
+        users, items, mean = recommender.train_als(
+            matrix, factors=4, iterations=8, reg=0.01,
+            progress=lambda i, rmse: errors.append(rmse))
+        self.assertEqual((users.shape, items.shape), ((40, 4), (15, 4)))
+        self.assertAlmostEqual(mean, dense[rows, cols].mean(), places=4)
+        self.assertLess(errors[-1], errors[0])
+        self.assertLess(errors[-1], 0.5)
+
+
+class RecommendationsAPITest(APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(RECOMMENDER_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.editions = [BookEditionFactory() for _ in range(4)]
+        # users 1-5 rate everything; user 6 has only rated the first two
+        for user in range(1, 6):
+            for n, edition in enumerate(self.editions):
+                RatingFactory(user_id=user, edition=edition, rating=5 - n)
+        for edition in self.editions[:2]:
+            RatingFactory(user_id=6, edition=edition, rating=5)
+        self.url = reverse("user-recommendations", args=[6])
+
+    def test_recommends_unrated_works(self):
+        call_command("train_recs", "--factors=2", stdout=StringIO())
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["user_id"], 6)
+        self.assertEqual([w["id"] for w in response.data["results"]],
+                         [self.editions[2].work_id, self.editions[3].work_id])
+        response = self.client.get(self.url + "?limit=1")
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_untrained_and_unknown_users(self):
+        self.assertEqual(self.client.get(self.url).status_code, 503)
+        call_command("train_recs", "--factors=2", stdout=StringIO())
+        url = reverse("user-recommendations", args=[999])
+        self.assertEqual(self.client.get(url).status_code, 404)
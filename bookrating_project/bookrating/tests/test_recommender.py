@@ -0,0 +1,79 @@
+import tempfile
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating import recommender
+from bookrating.factories import BookEditionFactory, RatingFactory, WorkFactory
+
+
+class CsrMatrixTest(TestCase):
+    def test_gram_rows_match_dense_product(self):
+        rng = np.random.default_rng(0)
+        dense = rng.integers(0, 3, size=(30, 12)) * (rng.random((30, 12)) < 0.3)
+        rows, cols = np.nonzero(dense)
+        matrix = recommender.CsrMatrix.from_coo(
+            rows, cols, dense[rows, cols].astype(np.float32), dense.shape)
+        matrix_t = matrix.transpose()
+        gram = dense.T @ dense
+        for col in range(dense.shape[1]):
+            np.testing.assert_allclose(
+                recommender.gram_row(matrix, matrix_t, col), gram[col])
+        np.testing.assert_allclose(
+            matrix.column_norms(), np.sqrt((dense ** 2).sum(axis=0)))
+
+    def test_duplicate_cells_keep_highest_value(self):
+        matrix = recommender.CsrMatrix.from_coo(
+            np.array([1, 0, 1]), np.array([2, 0, 2]),
+            np.array([3.0, 1.0, 5.0]), (2, 3))
+        self.assertEqual(matrix.nnz, 2)
+        np.testing.assert_array_equal(matrix.row(1)[1], [5.0])
+
+
+class ItemCosineTest(APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(RECOMMENDER_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.target, self.close, self.far = (WorkFactory() for _ in range(3))
+        target_ed = BookEditionFactory(work=self.target)
+        close_ed = BookEditionFactory(work=self.close)
+        far_ed = BookEditionFactory(work=self.far)
+        # close shares both fans of target; far shares one fan of its three
+        for user in (1, 2):
+            RatingFactory(user_id=user, edition=target_ed, rating=5)
+            RatingFactory(user_id=user, edition=close_ed, rating=5)
+        for user in (2, 3, 4):
+            RatingFactory(user_id=user, edition=far_ed, rating=5)
+        RatingFactory(user_id=5, edition=target_ed, rating=3)
+        self.url = reverse("work-also-loved", args=[self.target.id])
+
+    def test_cosine_ranking(self):
+        call_command("build_similarity", stdout=StringIO())
+        response = self.client.get(self.url + "?algo=cosine")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(w["id"], w["five_star_count"], w["score"])
+             for w in response.data["results"]],
+            [(self.close.id, 2, 1.0),
+             (self.far.id, 1, round(1 / np.sqrt(6), 4))])
+
+    def test_top_k_limits_neighbours(self):
+        call_command("build_similarity", "--top-k=1", stdout=StringIO())
+        response = self.client.get(self.url + "?algo=cosine")
+        self.assertEqual([w["id"] for w in response.data["results"]], [self.close.id])
+
+    def test_missing_artifact(self):
+        response = self.client.get(self.url + "?algo=cosine")
+        self.assertEqual(response.status_code, 503)
+
+    def test_unknown_algo(self):
+        response = self.client.get(self.url + "?algo=magic")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating import response_cache
+from bookrating.factories import (AuthorFactory, BookEditionFactory,
+                                  RatingFactory, WorkFactory)
+
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        response_cache.reset_stats()
+        self.author = AuthorFactory(name="Cached Author")
+        self.works = [WorkFactory(avg_rating=4.5 - n / 10) for n in range(4)]
+        self.editions = [BookEditionFactory(work=work) for work in self.works]
+        for work in self.works:
+            work.authors.add(self.author)
+        # user 1 loves works 0 and 1, user 2 loves works 2 and 3
+        for user, editions in ((1, self.editions[:2]), (2, self.editions[2:])):
+            for edition in editions:
+                RatingFactory(user_id=user, edition=edition, rating=5)
+        self.urls = {
+            "ratings": reverse("work-ratings", args=[self.works[0].id]),
+            "also_loved": reverse("work-also-loved", args=[self.works[0].id]),
+            "other_also_loved": reverse("work-also-loved",
+                                        args=[self.works[2].id]),
+            "top_rated": reverse("work-top-rated-by-author")
+            + "?author=Cached&min_rating=1",
+        }
+
+    def get(self, name, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(self.urls[name])
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeats_are_served_from_the_cache(self):
+        for name in self.urls:
+            with self.subTest(name):
+                miss = self.client.get(self.urls[name])
+                hit = self.get(name, 0)
+                self.assertEqual(hit.content, miss.content)
+                # the cached ratings response still carries the work's ETag
+                self.assertEqual(hit.get("ETag"), miss.get("ETag"))
+        self.assertEqual(response_cache.stats(),
+                         {"hits": len(self.urls), "misses": len(self.urls)})
+
+    def test_parameters_are_normalized(self):
+        url = reverse("work-top-rated-by-author")
+        self.client.get(url + "?author=Cached&min_rating=1")
+        with self.assertNumQueries(0):
+            self.client.get(url + "?min_rating=1&author=Cached")
+        with self.assertNumQueries(3):  # the works and their prefetches
+            self.client.get(url + "?min_rating=2&author=Cached")
+
+    def test_rating_writes(self):
+        for name in self.urls:
+            self.client.get(self.urls[name])
+        # a new fan of work 0 who also loves work 3
+        RatingFactory(user_id=3, edition=self.editions[3], rating=5)
+        self.client.post(reverse("rating-list"), {
+            "user_id": 3, "edition": self.editions[0].id, "rating": 5},
+            format="json")
+        self.assertEqual(
+            self.get("ratings", 1).data["sample_total_ratings"], 2)
+        self.assertIn(self.works[3].id, [
+            work["id"] for work in self.get("also_loved", 2).data["results"]])
+        # ratings do not change what top_rated_by_author shows
+        self.get("top_rated", 0)
+
+    def test_unrelated_fans_keep_their_entries(self):
+        self.client.get(self.urls["other_also_loved"])
+        RatingFactory(user_id=4, edition=self.editions[0], rating=5)
+        RatingFactory(user_id=4, edition=self.editions[1], rating=5)
+        self.get("other_also_loved", 0)
+
+    def test_work_writes(self):
+        for name in self.urls:
+            self.client.get(self.urls[name])
+        self.client.patch(reverse("work-detail", args=[self.works[1].id]),
+                          {"title": "Renamed"}, format="json")
+        # work 0 lists work 1, work 2 does not
+        self.assertEqual(
+            self.get("also_loved", 2).data["results"][0]["title"], "Renamed")
+        self.get("other_also_loved", 0)
+        self.get("ratings", 0)
+        self.assertIn("Renamed", [
+            work["title"] for work in self.get("top_rated", 3).data])
+
+    def test_rebuilds_clear_everything(self):
+        for name in self.urls:
+            self.client.get(self.urls[name])
+        call_command("rebuild_also_loved", stdout=StringIO())
+        self.get("ratings", 1)
+        self.get("other_also_loved", 2)
+
+    def test_cache_stats_command(self):
+        self.client.get(self.urls["ratings"])
+        self.client.get(self.urls["ratings"])
+        out = StringIO()
+        call_command("cache_stats", "--reset", stdout=out)
+        self.assertIn("1 hits, 1 misses (50.0% hit rate)", out.getvalue())
+        self.assertEqual(response_cache.stats(), {"hits": 0, "misses": 0})
+
+    def test_counts_are_flushed_in_batches(self):
+        counters = caches[settings.RESPONSE_CACHE_ALIAS]
+        for _ in range(response_cache.FLUSH_EVERY - 1):
+            response_cache.lookup("missing")
+        self.assertIsNone(counters.get(response_cache.MISSES))
+        response_cache.lookup("missing")
+        self.assertEqual(counters.get(response_cache.MISSES),
+                         response_cache.FLUSH_EVERY)
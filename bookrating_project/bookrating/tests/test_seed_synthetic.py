@@ -0,0 +1,47 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import TestCase
+
+from bookrating.factories import WorkFactory
+from bookrating.models import Work, BookEdition, Author, WorkAuthor, Rating
+
+SMALL = ["--works", "50", "--editions-per-work", "2", "--authors", "20",
+         "--users", "40", "--ratings", "1000"]
+
+
+class SeedSyntheticTest(TestCase):
+    def seed(self, *extra):
+        call_command("seed_synthetic", *SMALL, *extra, stdout=StringIO())
+        return list(Rating.objects.order_by("id").values_list(
+            "user_id", "edition_id", "rating"))
+
+    def test_creates_requested_volumes(self):
+        self.seed()
+        self.assertEqual(Work.objects.count(), 50)
+        self.assertEqual(BookEdition.objects.count(), 100)
+        self.assertEqual(Author.objects.count(), 20)
+        self.assertEqual(Rating.objects.count(), 1000)
+        self.assertFalse(Work.objects.filter(authors=None).exists())
+        self.assertLessEqual(
+            Rating.objects.values("user_id").distinct().count(), 40)
+
+    def test_same_seed_same_data(self):
+        first = self.seed()
+        self.assertEqual(self.seed("--reset"), first)
+        self.assertNotEqual(self.seed("--reset", "--seed", "7"), first)
+
+    def test_counts_match_ratings(self):
+        self.seed()
+        counts = dict(Rating.objects.values("edition__work")
+                      .annotate(n=Count("id"))
+                      .values_list("edition__work", "n"))
+        for work in Work.objects.all():
+            self.assertEqual(work.ratings_count, counts.get(work.id, 0))
+
+    def test_refuses_to_mix_with_existing_books(self):
+        WorkFactory()
+        with self.assertRaises(CommandError):
+            self.seed()
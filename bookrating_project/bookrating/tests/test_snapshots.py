@@ -0,0 +1,67 @@
+import tempfile
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from bookrating.factories import BookEditionFactory
+from bookrating.models import Rating
+from bookrating.snapshots import read_snapshot
+
+
+class RatingSnapshotTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.edition = BookEditionFactory()
+        for user_id, rating in [(1, 5), (2, 0), (3, 4)]:
+            Rating.objects.create(
+                user_id=user_id, edition=self.edition, rating=rating)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_export_writes_columnar_arrays(self):
+        call_command("export_snapshot", self.tmp.name, stdout=StringIO())
+        manifest, columns = read_snapshot(self.tmp.name)
+        self.assertEqual(manifest["rows"], 3)
+        self.assertEqual(columns["rating"].dtype, np.uint8)
+        self.assertEqual(columns["user_id"].dtype, np.uint32)
+        self.assertEqual(columns["rating"].tolist(), [5, 0, 4])
+
+    def test_round_trip(self):
+        expected = set(Rating.objects.values_list(
+            "user_id", "edition_id", "rating"))
+        call_command("export_snapshot", self.tmp.name, stdout=StringIO())
+        Rating.objects.all().delete()
+
+        out = StringIO()
+        call_command("import_snapshot", self.tmp.name, stdout=out)
+        self.assertEqual(set(Rating.objects.values_list(
+            "user_id", "edition_id", "rating")), expected)
+        self.assertIn("Imported 3 of 3", out.getvalue())
+
+        # existing pairs are left alone on a second import
+        call_command("import_snapshot", self.tmp.name, stdout=out)
+        self.assertEqual(Rating.objects.count(), 3)
+
+    def test_missing_snapshot(self):
+        with self.assertRaises(CommandError):
+            call_command("import_snapshot", self.tmp.name, stdout=StringIO())
+
+    def test_sparse_edition_ids(self):
+        far = BookEditionFactory(id=4_000_000_000)
+        Rating.objects.create(user_id=1, edition=far, rating=3)
+        call_command("export_snapshot", self.tmp.name, stdout=StringIO())
+        Rating.objects.all().delete()
+        call_command("import_snapshot", self.tmp.name, stdout=StringIO())
+        self.assertEqual(Rating.objects.get(edition=far).work_id, far.work_id)
+        self.assertEqual(Rating.objects.count(), 4)
+
+    def test_unknown_editions(self):
+        call_command("export_snapshot", self.tmp.name, stdout=StringIO())
+        self.edition.delete()
+        with self.assertRaisesMessage(CommandError, "1 editions missing"):
+            call_command("import_snapshot", self.tmp.name, stdout=StringIO())
+        self.assertFalse(Rating.objects.exists())
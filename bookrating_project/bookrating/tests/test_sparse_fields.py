@@ -0,0 +1,94 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookrating.factories import (AuthorFactory, BookEditionFactory,
+                                  WorkFactory)
+from bookrating.models import Work
+
+
+class SparseFieldsTest(APITestCase):
+    def setUp(self):
+        self.work = WorkFactory()
+        self.authors = [AuthorFactory(), AuthorFactory()]
+        self.work.authors.set(self.authors)
+        self.editions = [BookEditionFactory(work=self.work) for _ in range(3)]
+        self.url = reverse("work-detail", args=[self.work.pk])
+
+    def test_relations_are_ids_by_default(self):
+        with self.assertNumQueries(3):  # the work, author ids, edition ids
+            response = self.client.get(self.url)
+        self.assertEqual(sorted(response.data["authors"]),
+                         sorted(author.id for author in self.authors))
+        self.assertEqual(sorted(response.data["editions"]),
+                         sorted(edition.id for edition in self.editions))
+
+    def test_fields(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"fields": "id,title"})
+        self.assertEqual(response.data, {"id": self.work.id,
+                                         "title": self.work.title})
+
+    def test_expand(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                self.url, {"fields": "title,authors,editions",
+                           "expand": "authors,editions"})
+        self.assertEqual({author["name"] for author in response.data["authors"]},
+                         {author.name for author in self.authors})
+        self.assertEqual(len(response.data["editions"]), 3)
+        self.assertIn("isbn13", response.data["editions"][0])
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                self.url, {"fields": "title,editions", "expand": "editions"})
+        self.assertEqual(set(response.data), {"title", "editions"})
+
+    def test_unknown_names(self):
+        response = self.client.get(self.url, {"fields": "title,isbn",
+                                              "expand": "ratings"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {"fields", "expand"})
+
+    def test_work_list(self):
+        WorkFactory()
+        with self.assertNumQueries(1):  # no author query without authors
+            response = self.client.get(reverse("work-list"),
+                                       {"fields": "id,title"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(response.data["results"], key=lambda work: work["id"]),
+            [{"id": work.id, "title": work.title}
+             for work in Work.objects.order_by("id")])
+        response = self.client.get(reverse("work-list"),
+                                   {"fields": "url,authors"})
+        self.assertEqual(set(response.data["results"][0]), {"url", "authors"})
+        self.assertEqual(len(response.data["results"][0]["authors"]) +
+                         len(response.data["results"][1]["authors"]), 2)
+        response = self.client.get(reverse("work-list"),
+                                   {"fields": "title,isbn"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {"fields"})
+
+    def test_author_and_edition_endpoints(self):
+        response = self.client.get(
+            reverse("author-detail", args=[self.authors[0].pk]),
+            {"expand": "works"})
+        self.assertEqual([work["title"] for work in response.data["works"]],
+                         [self.work.title])
+        with self.assertNumQueries(2):  # the count, then the page
+            response = self.client.get(reverse("author-list"),
+                                       {"fields": "name"})
+        self.assertEqual(set(response.data["results"][0]), {"name"})
+
+        response = self.client.get(
+            reverse("edition-detail", args=[self.editions[0].pk]),
+            {"fields": "isbn,work", "expand": "work"})
+        self.assertEqual(set(response.data), {"isbn", "work"})
+        self.assertEqual(response.data["work"]["title"], self.work.title)
+        self.assertEqual(len(response.data["work"]["authors"]), 2)
+
+    def test_writes_ignore_parameters(self):
+        response = self.client.patch(
+            self.url + "?fields=title", {"title": "Renamed"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["title"], "Renamed")
+        self.assertIn("editions", response.data)
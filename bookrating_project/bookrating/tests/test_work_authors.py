@@ -24,7 +24,7 @@ class WorkAuthorsTest(APITestCase):
     #test the GET on work detail returns list of correctly named authors
     def test_api_returns_all_authors(self):
         url = reverse("work-detail", args=[self.work.pk])
-        resp = self.client.get(url)
+        resp = self.client.get(url, {"expand": "authors"})
         self.assertEqual(resp.status_code, 200)
         names = {a["name"] for a in resp.data["authors"]}
         self.assertSetEqual(names, {"Author One", "Author Two"})
@@ -3,7 +3,8 @@ from .views_api import (WorkViewSet,
                         AuthorViewSet,
                         BookEditionViewSet,
                         WorkAuthorViewSet,
-                        RatingViewSet)
+                        RatingViewSet,
+                        UserViewSet)
 
 router = DefaultRouter()
 router.register(r'works', WorkViewSet, basename='work')
@@ -11,5 +12,6 @@ router.register(r'authors', AuthorViewSet, basename='author')
 router.register(r'editions', BookEditionViewSet, basename='edition')
 router.register(r'work-authors', WorkAuthorViewSet, basename='workauthor')
 router.register(r'ratings', RatingViewSet, basename='rating')
+router.register(r'users', UserViewSet, basename='user')
 
 urlpatterns = router.urls
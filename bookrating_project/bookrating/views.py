@@ -63,6 +63,8 @@ def api_index(request):
     if work:
         work_links = [
             ("Work Detail", "work-detail", [work.pk], ""),
+            ("Work Detail With Authors And Editions", "work-detail",
+             [work.pk], "expand=authors,editions"),
             ("Work Editions", "work-editions", [work.pk], ""),
             ("Work Also Loved", "work-also-loved", [work.pk], ""),
             ("Work Ratings", "work-ratings", [work.pk], ""),
@@ -1,36 +1,264 @@
-from django.db.models import Case, When, IntegerField, Value, Count, Avg
+from functools import wraps
 
-from rest_framework import viewsets
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Prefetch
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from rest_framework import generics, status, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from . import minhash, recommender, response_cache, stamps
+from .pagination import AlsoLovedPagination, KeysetPagination, WorkPagination
+from .renderers import ORJSONRenderer
 from .models import (Work,
                      Author,
                      BookEdition,
                      Rating,
-                     WorkAuthor)
+                     WorkAuthor,
+                     WorkCoLove,
+                     UserNeighbour)
 
 from .serializers import (WorkListSerializer,
                           WorkDetailSerializer,
                           AuthorSerializer,
                           BookEditionSerializer,
                           WorkWithFanCountSerializer,
+                          WorkSimilaritySerializer,
+                          WorkApproxSerializer,
+                          WorkRecommendationSerializer,
                           WorkAuthorSerializer,
-                          RatingSerializer)
+                          RatingSerializer,
+                          WorkListValuesSerializer,
+                          BookEditionValuesSerializer,
+                          RatingValuesSerializer,
+                          param_names)
+
+
+def int_param(request, name, default):
+    """Integer query parameter, or a 400 response if it is not one."""
+    try:
+        return int(request.query_params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: "Must be an integer."})
+
+
+CONDITIONAL_HEADERS = {"HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE"}
+
+
+def conditional(etag_func, last_modified_func=None):
+    """
+    Conditional GET for a detail action, like Django's condition() but
+    cheaper for plain requests: the validators are computed before the view
+    only when the request carries If-None-Match or If-Modified-Since (a
+    match returns 304 without running the view), and otherwise after it, so
+    the functions can reuse what the view loaded. They take (request, pk)
+    and return None when the object does not exist.
+    """
+    def decorator(view):
+        def validators(request, pk):
+            etag = etag_func(request, pk)
+            modified = last_modified_func and last_modified_func(request, pk)
+            return (etag and quote_etag(etag),
+                    modified and int(modified.timestamp()))
+
+        @wraps(view)
+        def wrapper(self, request, pk=None, **kwargs):
+            if CONDITIONAL_HEADERS & request.META.keys():
+                etag, modified = validators(request, pk)
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=modified)
+                if response is not None:
+                    return response
+            response = view(self, request, pk=pk, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                etag, modified = validators(request, pk)
+                if etag:
+                    response.headers["ETag"] = etag
+                if modified:
+                    response.headers["Last-Modified"] = http_date(modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def _work_stamp(request, pk):
+    """
+    (version, modified_at) of a work, or None if there is no such work;
+    read once per request, or stashed by a view that loaded the work.
+    """
+    if not hasattr(request, "_work_stamp"):
+        try:
+            request._work_stamp = (Work.objects.filter(pk=pk)
+                                   .values_list("version", "modified_at")
+                                   .first())
+        except (TypeError, ValueError, DjangoValidationError):
+            request._work_stamp = None
+    return request._work_stamp
+
+
+def _stash_stamp(request, work):
+    request._work_stamp = (work.version, work.modified_at)
+
+
+def work_etag(request, pk):
+    stamp = _work_stamp(request, pk)
+    if stamp is None:
+        return None  # the view 404s
+    return stamps.etag(request.get_full_path(), request.accepted_media_type,
+                       *stamp)
+
 
+def work_last_modified(request, pk):
+    stamp = _work_stamp(request, pk)
+    return stamp and stamp[1]
 
-class WorkViewSet(viewsets.ModelViewSet):
-    queryset = (Work.objects.all()
-                .prefetch_related("authors", "editions"))
+
+def author_works_etag(request, pk):
+    # the stamps of all the author's works; no Last-Modified, since a work
+    # leaving the list could move it back in time
+    if not hasattr(request, "_author_works_etag"):
+        try:
+            rows = sorted(Author.objects.filter(pk=pk)
+                          .values_list("works__id", "works__version"))
+        except (TypeError, ValueError, DjangoValidationError):
+            rows = None
+        request._author_works_etag = rows and stamps.etag(
+            request.get_full_path(), request.accepted_media_type, rows)
+    return request._author_works_etag
+
+
+# ETag and Last-Modified from the work's version stamp alone: a conditional
+# request costs one primary-key lookup, before the view's own queries
+work_condition = conditional(work_etag, work_last_modified)
+
+
+def cached_response(*generations):
+    """
+    Serve a read action from bookrating.response_cache. `generations` name
+    what its output depends on ("{pk}" is replaced by the work id); writes
+    bump them (see the module). Only 200 responses are stored, along with
+    the work's version stamp if the view read it, so a hit needs no query
+    even for the ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, pk=None, **kwargs):
+            key = response_cache.key(
+                request, view.__name__, pk,
+                [generation.format(pk=pk) for generation in generations])
+            entry = response_cache.lookup(key)
+            if entry is not None:
+                data, stamp = entry
+                if stamp is not None and not hasattr(request, "_work_stamp"):
+                    request._work_stamp = stamp
+                return Response(data)
+            response = view(self, request, pk=pk, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response_cache.store(
+                    key, (response.data, getattr(request, "_work_stamp", None)))
+            return response
+        return wrapper
+    return decorator
+
+
+class FastJSONMixin:
+    """
+    Render the actions in fast_json_actions, which return no floats, with
+    ORJSONRenderer in place of JSONRenderer.
+    """
+    fast_json_actions = ()
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action in self.fast_json_actions:
+            renderers = [ORJSONRenderer() if type(renderer) is JSONRenderer
+                         else renderer for renderer in renderers]
+        return renderers
+
+
+class PrefetchRequestedMixin:
+    """
+    Prefetch only the relations the serializer will render (see
+    SparseFieldsMixin). related_lookups maps each relation field to its
+    prefetch_related lookups when expanded and when not; relations left
+    out by ?fields= are not fetched at all. Applies to list and retrieve.
+    """
+    # {field name: (lookups when expanded, lookups otherwise)}
+    related_lookups = {}
+
+    def prefetch_requested(self, queryset):
+        only = expand = None
+        if self.request.method in SAFE_METHODS:
+            only = param_names(self.request, "fields")
+            expand = param_names(self.request, "expand")
+        for name, (expanded, collapsed) in self.related_lookups.items():
+            if only is None or name in only:
+                queryset = queryset.prefetch_related(
+                    *(expanded if name in (expand or ()) else collapsed))
+        return queryset
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            queryset = self.prefetch_requested(queryset)
+        return queryset
+
+
+class WorkViewSet(PrefetchRequestedMixin, FastJSONMixin,
+                  viewsets.ModelViewSet):
+    queryset = Work.objects.all()
+    # ids alone need only the id column of the related rows
+    related_lookups = {
+        "authors": (["authors"], [Prefetch(
+            "authors", queryset=Author.objects.only("id"))]),
+        "editions": (["editions"], [Prefetch(
+            "editions", queryset=BookEdition.objects.only("id", "work"))]),
+    }
+    pagination_class = WorkPagination
+    fast_json_actions = ("list", "editions")
 
     def get_serializer_class(self):
         if self.action == "list":
             return WorkListSerializer  # /api/works returns list
         return WorkDetailSerializer  # /api/works/<id> returns single work detail
 
+    def get_object(self):
+        work = super().get_object()
+        _stash_stamp(self.request, work)
+        return work
+
+    @work_condition
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        # rows rather than model instances; same output as WorkListSerializer,
+        # whose fields also check ?fields= (400 on unknown names)
+        fields = self.get_serializer().fields
+        names = None if param_names(request, "fields") is None else set(fields)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        # named rows, so the paginator can read the cursor fields
+        rows = queryset.values_list(*WorkListValuesSerializer.columns(names),
+                                    named=True)
+        page = self.paginate_queryset(rows)
+        serializer = WorkListValuesSerializer(
+            rows if page is None else page,
+            context=self.get_serializer_context(), names=names)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
     # custom endpoint to return ratings above an input level and author containing a specified string
     @action(detail=False, methods=["get"])
-    def top_rated_by_author(self, request):
+    @cached_response("catalog")
+    def top_rated_by_author(self, request, pk=None):
         author_query = request.query_params.get("author", "")
         min_rating = float(request.query_params.get("min_rating", 4.0))
 
@@ -38,6 +266,7 @@ class WorkViewSet(viewsets.ModelViewSet):
             avg_rating__gt=min_rating,
             authors__name__icontains=author_query
         ).order_by("-avg_rating").distinct()
+        works = self.prefetch_requested(works)
 
         serializer = self.get_serializer(
             works, many=True, context={'request': request})
@@ -46,124 +275,236 @@ class WorkViewSet(viewsets.ModelViewSet):
     # custom endpoint to show ratings info (bucket counts, average, total acount) for all editions of one work
 
     @action(detail=True, methods=["get"])
+    @work_condition
+    @cached_response("work:{pk}")
     def ratings(self, request, pk=None):
-        work = self.get_object()
-        # get all ratings for any edition of this work
-        ratings_qs = (
-            Rating.objects
-            .filter(edition__work=work)
-            .values_list("rating")
-        )
-        # Get average and total count
-        summary = ratings_qs.aggregate(
-            avg_rating=Avg("rating"),
-            total_ratings=Count("rating")
-        )
-        # Group by each rating value
-        buckets = (
-            ratings_qs.values("rating")
-            .annotate(count=Count("id"))
-            .order_by("rating")
-        )
+        # the histogram is kept per work in WorkRatingStats, so this is one
+        # primary-key lookup (joined to the work, to 404 on unknown ids)
+        work = get_object_or_404(
+            Work.objects.select_related("rating_stats"), pk=pk)
+        _stash_stamp(request, work)
+        stats = getattr(work, "rating_stats", None)
+        counts = stats.counts() if stats else [0] * 6
+        total = sum(counts)
 
-        # Format the bucket counts as a dict
-        distribution = {b["rating"]: b["count"] for b in buckets}
+        # Format the non-empty bucket counts as a dict
+        distribution = {value: count
+                        for value, count in enumerate(counts) if count}
 
         return Response({
-            "sample_average_rating": round(summary["avg_rating"], 2) if summary["avg_rating"] else None,
-            "sample_total_ratings": summary["total_ratings"],
+            "sample_average_rating": (round(stats.rating_sum / total, 2)
+                                      if total else None),
+            "sample_total_ratings": total,
             "distribution": distribution
         })
 
     # add custom endpoint to show all editions for one work
     @action(detail=True, methods=["get"])
     def editions(self, request, pk=None):
-        work = self.get_object()
-        editions = work.editions.all()
-        serializer = BookEditionSerializer(
-            editions, many=True, context={"request": request})
-        return Response(serializer.data)
+        work_id = generics.get_object_or_404(
+            Work.objects.values_list("id", flat=True), pk=pk)
+        editions = (BookEdition.objects.filter(work_id=work_id)
+                    .values_list(*BookEditionValuesSerializer.columns()))
+        return Response(BookEditionValuesSerializer(editions).data)
 
     # Custom endpoint for 'also-loved'
     @action(detail=True, methods=["get"])
+    @cached_response("also_loved:{pk}")
     def also_loved(self, request, pk=None):
         """
         Works whose editions received 5-star ratings from users
         who also gave this Work a 5-star rating, ranked by avg_rating, count.
+        With ?algo=cosine, ranked by the cosine similarity of the two works'
+        5-star fan sets instead, from the build_similarity artifact, and
+        with ?approx=1 by their Jaccard similarity estimated from MinHash
+        signatures (five_star_count is then an estimate too).
+        Returns a cursor page of ?limit= works (default 20, at most 100)
+        shared by at least ?min_count= fans (default 1).
         """
         target_work = self.get_object()
+        min_count = int_param(request, "min_count", 1)
+        paginator = AlsoLovedPagination()
+        algo = request.query_params.get("algo", "count")
+        if request.query_params.get("approx") in ("1", "true"):
+            if algo != "count":
+                raise ValidationError(
+                    {"approx": "Cannot be combined with algo."})
+            return self.also_loved_approx(
+                target_work, min_count, paginator.get_page_size(request))
+        if algo == "cosine":
+            return self.also_loved_cosine(
+                target_work, min_count, paginator.get_page_size(request))
+        if algo != "count":
+            raise ValidationError({"algo": "Must be 'count' or 'cosine'."})
 
-        # users who rated ANY edition of this work with 5
-        fan_user_ids = (
-            Rating.objects
-            .filter(edition__work=target_work, rating=5)
-            .values_list("user_id", flat=True)
+        # counts are precomputed per pair of works in WorkCoLove (kept up to
+        # date on rating writes), so this is one indexed lookup by work; the
+        # paginator adds ORDER BY and LIMIT, so only one page leaves the DB
+        pairs = (
+            WorkCoLove.objects
+            .filter(work=target_work, five_star_count__gte=min_count)
+            .select_related("other_work")
+            .annotate(avg_rating=F("other_work__avg_rating"))
         )
+        page = paginator.paginate_queryset(pairs, request, view=self)
+        works = []
+        for pair in page:
+            pair.other_work.five_star_count = pair.five_star_count
+            works.append(pair.other_work)
 
-        # 5-star ratings by those users on OTHER works
-        related_5s = (
-            Rating.objects
-            .filter(user_id__in=fan_user_ids, rating=5)
-            .exclude(edition__work=target_work)
-        )
+        data = WorkWithFanCountSerializer(works, many=True).data
+        return paginator.get_paginated_response(data)
 
-        # group by work and count DISTINCT users
-        work_counts = (
-            related_5s
-            .values("edition__work")
-            .annotate(five_star_count=Count("user_id", distinct=True))
-            .order_by("-five_star_count")
-        )
-
-        # fetch Work objects & attach the count
-        id_to_count = {w["edition__work"]: w["five_star_count"]
-                       for w in work_counts}
-
-        # annotate using a CASE expression (for static dict -> queryset mapping)
-        whens = [When(id=wid, then=Value(count))
-                 for wid, count in id_to_count.items()]
-        works = (
-            Work.objects
-            .filter(id__in=id_to_count.keys())
-            .annotate(five_star_count=Case(*whens, output_field=IntegerField()))
-            .order_by("-five_star_count")
-        )
+    def also_loved_cosine(self, target_work, min_count, limit):
+        neighbours = recommender.similar_works(target_work.pk)
+        if neighbours is None:
+            return Response(
+                {"detail": "Similarity data has not been built yet."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        # the artifact holds each work's top-k neighbours, best first
+        neighbours = [n for n in neighbours if n[2] >= min_count][:limit]
+        works = Work.objects.in_bulk([work_id for work_id, _, _ in neighbours])
+        ranked = []
+        for work_id, score, count in neighbours:
+            work = works.get(work_id)
+            if work is not None:  # deleted since the artifact was built
+                work.score = round(score, 4)
+                work.five_star_count = count
+                ranked.append(work)
+        return Response({
+            "next": None,
+            "previous": None,
+            "results": WorkSimilaritySerializer(ranked, many=True).data,
+        })
 
-        # final ordering by avg_rating, five_star_count
-        data = WorkWithFanCountSerializer(
-            works.order_by("-avg_rating", "-five_star_count"), many=True
-        ).data
-        return Response(data)
+    def also_loved_approx(self, target_work, min_count, limit):
+        estimates = minhash.similar_works(target_work.pk, limit, min_count)
+        works = Work.objects.in_bulk([work_id for work_id, *_ in estimates])
+        ranked = []
+        for work_id, jaccard, error, shared in estimates:
+            work = works.get(work_id)
+            if work is not None:
+                work.jaccard = round(jaccard, 4)
+                work.jaccard_error = round(error, 4)
+                work.five_star_count = shared
+                ranked.append(work)
+        return Response({
+            "next": None,
+            "previous": None,
+            # worst-case standard error of a Jaccard estimate (at J = 0.5)
+            "expected_error": round(0.5 / minhash.NUM_PERM ** 0.5, 4),
+            "results": WorkApproxSerializer(ranked, many=True).data,
+        })
 
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(PrefetchRequestedMixin, FastJSONMixin,
+                    viewsets.ModelViewSet):
     # use order_by to prevent pagination warning in tests
     queryset = Author.objects.all().order_by("id")
     serializer_class = AuthorSerializer
+    related_lookups = {"works": (["works", "works__authors"], [])}
+    fast_json_actions = ("works",)
     # create custom endpoint to show all works of a particular author
 
     @action(detail=True, methods=["get"])
+    @conditional(author_works_etag)
     def works(self, request, pk=None):
         author = self.get_object()
         # order by rating descending so that favourite works appear first
-        works = author.works.all().prefetch_related(
-            "authors", "editions").order_by("-avg_rating")
-        serializer = WorkListSerializer(
-            works, many=True, context={"request": request})
+        works = (author.works.all().order_by("-avg_rating")
+                 .values_list(*WorkListValuesSerializer.columns()))
+        serializer = WorkListValuesSerializer(
+            works, context={"request": request})
         return Response(serializer.data)
 
 
-class BookEditionViewSet(viewsets.ModelViewSet):
+class BookEditionViewSet(PrefetchRequestedMixin, viewsets.ModelViewSet):
     queryset = BookEdition.objects.all()
     serializer_class = BookEditionSerializer
+    related_lookups = {"work": (["work", "work__authors"], [])}
+    pagination_class = KeysetPagination
 
 
-class RatingViewSet(viewsets.ModelViewSet):
+class RatingViewSet(FastJSONMixin, viewsets.ModelViewSet):
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
+    # keyset pages on id: no COUNT(*), constant cost at any depth
+    pagination_class = KeysetPagination
+    fast_json_actions = ("list",)
+
+    def list(self, request, *args, **kwargs):
+        # rows rather than model instances; same output as RatingSerializer
+        rows = self.filter_queryset(self.get_queryset()).values_list(
+            *RatingValuesSerializer.columns(), named=True)
+        page = self.paginate_queryset(rows)
+        data = RatingValuesSerializer(rows if page is None else page).data
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
 
 
 class WorkAuthorViewSet(viewsets.ModelViewSet):
     # use order_by to prevent pagination warning in tests
     queryset = WorkAuthor.objects.all().order_by("id")
     serializer_class = WorkAuthorSerializer
+
+
+class UserViewSet(viewsets.ViewSet):
+    # users are only the plain user_id integers on Rating, so this viewset
+    # has no model or list view, just per-user actions
+    lookup_value_regex = r"\d+"
+
+    @action(detail=True, methods=["get"])
+    def recommendations(self, request, pk=None):
+        """
+        Up to ?limit= works (default 20, at most 100) the user has not rated,
+        ranked by the rating the train_recs model predicts for them.
+        """
+        user_id = int(pk)
+        limit = min(max(int_param(request, "limit", 20), 1), 100)
+        rated = set(Rating.objects.filter(user_id=user_id)
+                    .values_list("work_id", flat=True))
+        ranked = recommender.recommend_for_user(user_id, limit, rated)
+        if ranked is None:
+            return Response(
+                {"detail": "The recommendation model has not been trained yet."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if not ranked:
+            raise Http404("No recommendations for this user.")
+        works = Work.objects.in_bulk([work_id for work_id, _ in ranked])
+        results = []
+        for work_id, predicted in ranked:
+            work = works.get(work_id)
+            if work is not None:
+                work.predicted_rating = round(predicted, 2)
+                results.append(work)
+        return Response({
+            "user_id": user_id,
+            "results": WorkRecommendationSerializer(results, many=True).data,
+        })
+
+    @action(detail=True, methods=["get"])
+    def similar(self, request, pk=None):
+        """
+        The ?limit= raters (default 20) most similar to this user by
+        ?metric=cosine (default) or pearson over co-rated works, read from
+        the neighbour lists precomputed by build_neighbours.
+        """
+        user_id = int(pk)
+        metric = request.query_params.get("metric", "cosine")
+        if metric not in dict(UserNeighbour.METRICS):
+            raise ValidationError({"metric": "Must be 'cosine' or 'pearson'."})
+        limit = max(int_param(request, "limit", 20), 1)
+        rows = list(UserNeighbour.objects
+                    .filter(user_id=user_id, metric=metric)
+                    .order_by("-score")
+                    .values("neighbour_id", "score", "common")[:limit])
+        if not rows:
+            raise Http404("No similar users for this user.")
+        return Response({
+            "user_id": user_id,
+            "metric": metric,
+            "results": [{"user_id": row["neighbour_id"],
+                         "score": round(row["score"], 4),
+                         "common": row["common"]} for row in rows],
+        })
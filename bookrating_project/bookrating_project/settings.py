@@ -95,6 +95,34 @@ DATABASES = {
     }
 }
 
+# Precomputed recommendation artifacts (.npy files memory-mapped by every
+# worker), written by build_similarity
+RECOMMENDER_DIR = BASE_DIR / 'recommender'
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'responses' holds the cached responses of WorkViewSet's read actions
+# (bookrating.response_cache); TIMEOUT is their time to live. It is a
+# FileBasedCache so that every worker process, and the management commands
+# that invalidate it, share one cache; Memcached or Redis work as well.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+# runs the tests against a temporary response cache
+TEST_RUNNER = 'bookrating.test_runner.TestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators